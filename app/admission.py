@@ -0,0 +1,219 @@
+"""
+Per-client admission control for frame inference.
+Each client gets a token-bucket rate limit and at most one queued frame;
+a newer frame replaces the queued one (latest frame wins). Inference
+slots are handed to waiting clients round-robin so a fast client cannot
+starve the others.
+
+Client IDs come partly from a request header, so each host only gets a
+few distinct IDs (one per browser tab). Further IDs from that host share
+a single overflow client: rotating the header on every frame cannot buy
+extra token buckets, queued frames or round-robin turns.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """Frame was not admitted (rate limited or replaced by a newer frame)."""
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ClientState:
+    """Token bucket, pending frame and counters for one client."""
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.last_seen = now
+        self.host = None
+        self.waiter = None  # Future of the queued frame, if any
+        self.running = 0
+        self.admitted = 0
+        self.completed = 0
+        self.throttled = 0
+        self.dropped = 0
+
+    def info(self) -> Dict:
+        return {
+            'admitted': self.admitted,
+            'completed': self.completed,
+            'throttled': self.throttled,
+            'dropped': self.dropped,
+            'running': self.running,
+            'queued': self.waiter is not None,
+            'idle_s': round(time.monotonic() - self.last_seen, 1)
+        }
+
+
+class AdmissionController:
+    """Rate limits, latest-frame-wins queueing and fair slot scheduling."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        slots: int = 1,
+        idle_ttl: float = 600.0,
+        max_clients_per_host: int = 4
+    ):
+        """
+        Args:
+            rate: Sustained frames per second allowed per client
+            burst: Token bucket size (frames allowed back to back)
+            slots: Frames processed concurrently across all clients
+            idle_ttl: Seconds after which an idle client's state is dropped
+            max_clients_per_host: Distinct client IDs per host before
+                further IDs share the host's overflow client
+        """
+        self.rate = rate
+        self.burst = burst
+        self.slots = slots
+        self.idle_ttl = idle_ttl
+        self.max_clients_per_host = max_clients_per_host
+        self._clients = {}
+        self._host_clients = {}  # host -> client IDs counted against its cap
+        self._ready = deque()  # Client IDs with a queued frame, in turn order
+        self._free = slots
+        self._last_cleanup = time.monotonic()
+
+    def _take_token(self, client: _ClientState, now: float) -> float:
+        """Consume one token; return 0 on success or seconds until one is available."""
+        client.tokens = min(self.burst, client.tokens + (now - client.updated) * self.rate)
+        client.updated = now
+        if client.tokens >= 1:
+            client.tokens -= 1
+            return 0.0
+        return (1 - client.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def _get_client(self, client_id: str, host: Optional[str], now: float):
+        """Client state for an ID, folding IDs beyond the host's cap into its overflow client."""
+        client = self._clients.get(client_id)
+        if client is not None:
+            return client_id, client
+        if host is not None:
+            ids = self._host_clients.setdefault(host, set())
+            if len(ids) >= self.max_clients_per_host:
+                client_id = f"{host}/*"
+                client = self._clients.get(client_id)
+                if client is not None:
+                    return client_id, client
+            else:
+                ids.add(client_id)
+        client = self._clients[client_id] = _ClientState(self.burst, now)
+        client.host = host
+        return client_id, client
+
+    @asynccontextmanager
+    async def slot(self, client_id: str, host: Optional[str] = None):
+        """
+        Wait for an inference slot for this client's frame.
+        Must be used from the event loop thread.
+
+        Args:
+            client_id: Stable client identifier
+            host: Client address the ID belongs to; caps the distinct IDs
+                it can use (None: no cap, e.g. IDs not taken from headers)
+
+        Raises:
+            AdmissionRejected: 'throttled' if over the rate limit, or
+                'superseded' if a newer frame from the same client replaced
+                this one while it was queued
+        """
+        now = time.monotonic()
+        self._cleanup(now)
+        client_id, client = self._get_client(client_id, host, now)
+        client.last_seen = now
+
+        wait = self._take_token(client, now)
+        if wait > 0:
+            client.throttled += 1
+            raise AdmissionRejected('throttled', wait)
+
+        if self._free > 0 and not self._ready:
+            self._free -= 1
+        else:
+            if client.waiter is not None:
+                # Latest frame wins: the queued frame is stale now
+                client.dropped += 1
+                client.waiter.set_exception(AdmissionRejected('superseded'))
+            else:
+                self._ready.append(client_id)
+            waiter = asyncio.get_running_loop().create_future()
+            client.waiter = waiter
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                    # Slot was handed over just as the request was cancelled
+                    self._release()
+                elif client.waiter is waiter:
+                    client.waiter = None
+                    self._ready.remove(client_id)
+                raise
+
+        client.admitted += 1
+        client.running += 1
+        try:
+            yield
+        finally:
+            client.running -= 1
+            client.completed += 1
+            self._release()
+
+    def _release(self):
+        """Hand the freed slot to the next client in turn, or return it to the pool."""
+        while self._ready:
+            client = self._clients.get(self._ready.popleft())
+            if client is None or client.waiter is None:
+                continue
+            waiter, client.waiter = client.waiter, None
+            waiter.set_result(None)
+            return
+        self._free += 1
+
+    def _cleanup(self, now: float):
+        """Forget clients idle for longer than idle_ttl (checked at most once a minute)."""
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        for client_id in [
+            cid for cid, c in self._clients.items()
+            if now - c.last_seen > self.idle_ttl and c.waiter is None and c.running == 0
+        ]:
+            client = self._clients.pop(client_id)
+            ids = self._host_clients.get(client.host)
+            if ids is not None:
+                ids.discard(client_id)
+                if not ids:
+                    del self._host_clients[client.host]
+
+    def stats(self, client_id: Optional[str] = None) -> Dict:
+        """
+        Admission statistics.
+
+        Args:
+            client_id: Only this client (default: all clients)
+
+        Returns:
+            Global settings and per-client counters
+        """
+        clients = self._clients
+        if client_id is not None:
+            clients = {client_id: clients[client_id]} if client_id in clients else {}
+        return {
+            'rate_fps': self.rate,
+            'burst': self.burst,
+            'max_clients_per_host': self.max_clients_per_host,
+            'slots': self.slots,
+            'free_slots': self._free,
+            'queued': len(self._ready),
+            'clients': {cid: c.info() for cid, c in clients.items()}
+        }
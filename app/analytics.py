@@ -0,0 +1,379 @@
+"""
+Incremental disease analytics over the capture history.
+Keeps per-day and per-week rollups of detections per class with
+confidence histograms, updated as captures are saved, so queries never
+re-read capture files.
+
+Several server processes (uvicorn/gunicorn workers) record captures at
+once, so saves never rewrite shared state: each capture is one appended
+line in an event log, and every process merges lines it hasn't seen yet
+into its in-memory rollup before answering a query. The JSON snapshot is
+only rewritten by a backfill, which starts a new log generation.
+
+Two lock files coordinate the processes. <stem>.backfill.lock is held
+for a whole backfill, so only one runs at a time. <stem>.lock is taken
+shared by every append and exclusively while a backfill merges the log
+and swaps generations, so no append lands in a log being retired.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+
+CONFIDENCE_BINS = 10  # Histogram bins over [0, 1]
+BACKFILL_CHUNK_SIZE = 500
+
+
+def _day_key(d: date) -> str:
+    return d.isoformat()
+
+
+def _week_key(d: date) -> str:
+    year, week, _ = d.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _empty_class_stats() -> Dict:
+    return {'count': 0, 'confidence_sum': 0.0, 'confidence_hist': [0] * CONFIDENCE_BINS}
+
+
+def _empty_bucket() -> Dict:
+    return {'captures': 0, 'captures_with_detections': 0, 'classes': {}}
+
+
+def rollup_capture(capture_data: Dict) -> Dict:
+    """
+    Build a rollup containing a single capture.
+
+    Args:
+        capture_data: Capture JSON as written by /capture
+
+    Returns:
+        Rollup dictionary {'day': {...}, 'week': {...}}
+    """
+    captured_on = datetime.fromisoformat(capture_data['timestamp']).date()
+    detections = capture_data.get('detections', [])
+
+    rollup = {'day': {}, 'week': {}}
+    for granularity, key in (('day', _day_key(captured_on)), ('week', _week_key(captured_on))):
+        bucket = rollup[granularity].setdefault(key, _empty_bucket())
+        bucket['captures'] += 1
+        if detections:
+            bucket['captures_with_detections'] += 1
+        for det in detections:
+            stats = bucket['classes'].setdefault(det['class_name'], _empty_class_stats())
+            conf = float(det['confidence'])
+            stats['count'] += 1
+            stats['confidence_sum'] += conf
+            stats['confidence_hist'][min(int(conf * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)] += 1
+    return rollup
+
+
+def merge_rollups(target: Dict, source: Dict) -> Dict:
+    """
+    Add source rollup counters into target in place.
+
+    Args:
+        target: Rollup to update
+        source: Rollup to add
+
+    Returns:
+        Updated target
+    """
+    for granularity in ('day', 'week'):
+        for key, src_bucket in source.get(granularity, {}).items():
+            _merge_bucket(target.setdefault(granularity, {}).setdefault(key, _empty_bucket()), src_bucket)
+    return target
+
+
+def _merge_bucket(bucket: Dict, src_bucket: Dict):
+    """Add one period bucket into another in place."""
+    bucket['captures'] += src_bucket['captures']
+    bucket['captures_with_detections'] += src_bucket['captures_with_detections']
+    for class_name, src_stats in src_bucket['classes'].items():
+        stats = bucket['classes'].setdefault(class_name, _empty_class_stats())
+        stats['count'] += src_stats['count']
+        stats['confidence_sum'] += src_stats['confidence_sum']
+        stats['confidence_hist'] = [
+            a + b for a, b in zip(stats['confidence_hist'], src_stats['confidence_hist'])
+        ]
+
+
+def _rollup_files(paths: List[str]) -> Dict:
+    """Process-pool worker: rollup a chunk of capture JSON files."""
+    rollup = {'day': {}, 'week': {}}
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                merge_rollups(rollup, rollup_capture(json.load(f)))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping {path} in analytics backfill: {e}")
+    return rollup
+
+
+class AnalyticsStore:
+    """Rollup counters from a snapshot plus an append-only log shared by processes."""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: JSON snapshot of the rollups; the event logs live next to
+                it as <stem>.<generation>.log
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._rollup = {'day': {}, 'week': {}}
+        self._generation = 0
+        self._snapshot_mtime = None
+        self._log_offset = 0
+
+    def exists(self) -> bool:
+        """Check if rollups have been persisted (i.e. backfill has run)."""
+        return self.path.exists()
+
+    def record_capture(self, capture_data: Dict):
+        """
+        Add a newly saved capture to the rollups.
+
+        Args:
+            capture_data: Capture JSON as written by /capture
+        """
+        rollup = rollup_capture(capture_data)
+        event = {
+            'capture_id': capture_data['capture_id'],
+            'timestamp': capture_data['timestamp'],
+            'detections': [
+                {'class_name': d['class_name'], 'confidence': d['confidence']}
+                for d in capture_data.get('detections', [])
+            ]
+        }
+        line = (json.dumps(event, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock, self._file_lock('lock', exclusive=False):
+            self._sync_locked()
+            # One O_APPEND write per capture: lines from other processes never interleave
+            fd = os.open(self._log_path(self._generation), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            # Merged (with any lines other processes appended) by reading the log
+            self._sync_locked()
+
+    def backfill(self, captures_dir: Path, workers: Optional[int] = None,
+                 only_if_missing: bool = False) -> Optional[Dict]:
+        """
+        Rebuild rollups from all capture JSON files using a process pool.
+
+        Args:
+            captures_dir: Directory with capture_*_data.json files
+            workers: Process count (default: CPU count)
+            only_if_missing: Skip if rollups already exist or another
+                process is backfilling (startup: run once per deployment)
+
+        Returns:
+            Summary with number of files scanned, or None if skipped
+        """
+        with self._file_lock('backfill.lock', exclusive=True, blocking=not only_if_missing) as acquired:
+            if not acquired or (only_if_missing and self.exists()):
+                return None
+
+            paths = sorted(str(p) for p in captures_dir.glob("capture_*_data.json"))
+            chunks = [paths[i:i + BACKFILL_CHUNK_SIZE] for i in range(0, len(paths), BACKFILL_CHUNK_SIZE)]
+
+            scanned = {'day': {}, 'week': {}}
+            if chunks:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    for partial in pool.map(_rollup_files, chunks):
+                        merge_rollups(scanned, partial)
+
+            with self._lock, self._file_lock('lock', exclusive=True):
+                self._sync_locked()
+                # Captures saved (by any process) during the scan that the
+                # scan didn't see are only in the log generation being retired
+                scanned_ids = {Path(p).name[:-len("_data.json")] for p in paths}
+                for event in self._read_log(self._generation):
+                    if event.get('capture_id') in scanned_ids:
+                        continue
+                    try:
+                        merge_rollups(scanned, rollup_capture(event))
+                    except (ValueError, KeyError):
+                        continue
+                self._save_snapshot_locked(scanned)
+
+        return {'files_scanned': len(paths)}
+
+    def query(
+        self,
+        start: date,
+        end: date,
+        granularity: str = 'day',
+        class_names: Optional[Iterable[str]] = None
+    ) -> Dict:
+        """
+        Query rollups over a date range. Cost depends on the number of
+        periods in the range, not on the number of captures.
+
+        Args:
+            start: First day (inclusive)
+            end: Last day (inclusive)
+            granularity: 'day' or 'week'
+            class_names: Only include these classes (default: all)
+
+        Returns:
+            Per-period buckets and range totals per class
+        """
+        if granularity not in ('day', 'week'):
+            raise ValueError("granularity must be 'day' or 'week'")
+        wanted = set(class_names) if class_names else None
+
+        keys = []
+        step = timedelta(days=1 if granularity == 'day' else 7)
+        current = start if granularity == 'day' else start - timedelta(days=start.weekday())
+        while current <= end:
+            keys.append(_day_key(current) if granularity == 'day' else _week_key(current))
+            current += step
+
+        buckets = []
+        total_bucket = _empty_bucket()
+        with self._lock:
+            self._sync_locked()
+            source = self._rollup.get(granularity, {})
+            for key in keys:
+                bucket = source.get(key)
+                if bucket is None:
+                    continue
+                classes = {
+                    name: stats for name, stats in bucket['classes'].items()
+                    if wanted is None or name in wanted
+                }
+                entry = {
+                    'period': key,
+                    'captures': bucket['captures'],
+                    'captures_with_detections': bucket['captures_with_detections'],
+                    'classes': {name: self._with_mean(stats) for name, stats in classes.items()}
+                }
+                buckets.append(entry)
+                _merge_bucket(total_bucket, {**bucket, 'classes': classes})
+
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'granularity': granularity,
+            'confidence_bins': CONFIDENCE_BINS,
+            'buckets': buckets,
+            'totals': {
+                'captures': total_bucket['captures'],
+                'captures_with_detections': total_bucket['captures_with_detections'],
+                'classes': {name: self._with_mean(s) for name, s in total_bucket['classes'].items()}
+            }
+        }
+
+    @staticmethod
+    def _with_mean(stats: Dict) -> Dict:
+        mean = stats['confidence_sum'] / stats['count'] if stats['count'] else 0.0
+        return {
+            'count': stats['count'],
+            'mean_confidence': mean,
+            'confidence_hist': list(stats['confidence_hist'])
+        }
+
+    def _log_path(self, generation: int) -> Path:
+        return self.path.with_name(f"{self.path.stem}.{generation}.log")
+
+    @contextmanager
+    def _file_lock(self, suffix: str, exclusive: bool, blocking: bool = True):
+        """
+        flock on <stem>.<suffix>, shared by every process using this store.
+        Yields False if non-blocking and another process holds it.
+        """
+        if fcntl is None:
+            yield True
+            return
+        with open(self.path.with_name(f"{self.path.stem}.{suffix}"), 'a') as lock_file:
+            mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            try:
+                fcntl.flock(lock_file, mode if blocking else mode | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_log(self, generation: int) -> List[Dict]:
+        """All complete events in a log generation."""
+        try:
+            with open(self._log_path(generation), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        events = []
+        for line in data[:data.rfind(b'\n') + 1].splitlines():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+        return events
+
+    def _sync_locked(self):
+        """
+        Reload the snapshot if a backfill (in any process) replaced it, then
+        merge log lines appended since the last sync. Caller holds the lock.
+        """
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._snapshot_mtime:
+            self._snapshot_mtime = mtime
+            self._rollup, self._generation = {'day': {}, 'week': {}}, 0
+            if mtime is not None:
+                with open(self.path, 'r') as f:
+                    snapshot = json.load(f)
+                if 'rollup' in snapshot:
+                    self._rollup, self._generation = snapshot['rollup'], snapshot['generation']
+                else:
+                    # Snapshot written before the event log: a bare rollup
+                    self._rollup = snapshot
+            self._log_offset = 0
+
+        try:
+            with open(self._log_path(self._generation), 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Only complete lines; a line being written is picked up next time
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                merge_rollups(self._rollup, rollup_capture(json.loads(line)))
+            except (ValueError, KeyError):
+                continue
+        self._log_offset += end
+
+    def _save_snapshot_locked(self, rollup: Dict):
+        """
+        Persist rollups as a new snapshot with an empty log generation and
+        drop the old log. Caller holds the lock.
+        """
+        old_log = self._log_path(self._generation)
+        generation = self._generation + 1
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'generation': generation, 'rollup': rollup}, f)
+        os.replace(tmp_path, self.path)
+        old_log.unlink(missing_ok=True)
+        self._rollup, self._generation, self._log_offset = rollup, generation, 0
+        self._snapshot_mtime = self.path.stat().st_mtime_ns
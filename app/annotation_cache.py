@@ -0,0 +1,129 @@
+"""
+On-demand rendering of annotated capture images.
+Captures persist only the original JPEG and detection JSON; the annotated
+image is drawn from those when first requested and kept in a size-bounded
+disk cache.
+
+Recency for eviction is tracked in memory: cached files are never touched
+after they are written, so their mtime (and with it the ETag and
+Last-Modified served for them) stays stable and clients get 304s.
+"""
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app import utils
+from app.yolo_infer import YOLODetector
+
+
+ANNOTATED_SUFFIX = "_detected.jpg"
+
+
+class AnnotationCache:
+    """Size-bounded disk cache of rendered annotated captures (oldest-use eviction)."""
+
+    def __init__(self, captures_dir: Path, cache_dir: Path, max_bytes: int, quality: int = 90):
+        """
+        Args:
+            captures_dir: Directory holding capture originals and JSON data
+            cache_dir: Directory for rendered annotated images
+            max_bytes: Maximum total size of cached images
+            quality: JPEG quality for rendered images
+        """
+        self.captures_dir = captures_dir
+        self.cache_dir = utils.ensure_dir(cache_dir)
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._lock = threading.Lock()
+        # filename -> size, least recently used first (file age on startup)
+        existing = sorted((p.stat().st_mtime, p.name, p.stat().st_size)
+                          for p in self.cache_dir.glob(f"*{ANNOTATED_SUFFIX}"))
+        self._sizes = OrderedDict((name, size) for _, name, size in existing)
+        self._total = sum(self._sizes.values())
+
+    @staticmethod
+    def capture_id_from_filename(filename: str) -> Optional[str]:
+        """Get capture ID from an annotated filename, or None if not one."""
+        if not filename.startswith("capture_") or not filename.endswith(ANNOTATED_SUFFIX):
+            return None
+        capture_id = filename[:-len(ANNOTATED_SUFFIX)]
+        # Reject anything that could escape the captures directory
+        if '/' in capture_id or '\\' in capture_id or '..' in capture_id:
+            return None
+        return capture_id
+
+    def get_or_render(self, capture_id: str) -> Optional[Path]:
+        """
+        Get the annotated image for a capture, rendering it on a cache miss.
+
+        Args:
+            capture_id: Capture ID (e.g. "capture_20231228_143052_123456")
+
+        Returns:
+            Path to the annotated JPEG, or None if the capture doesn't exist
+        """
+        filename = f"{capture_id}{ANNOTATED_SUFFIX}"
+        cached = self.cache_dir / filename
+        if cached.exists():
+            with self._lock:
+                if filename in self._sizes:
+                    self._sizes.move_to_end(filename)
+            return cached
+
+        data_path = self.captures_dir / f"{capture_id}_data.json"
+        if not data_path.exists():
+            return None
+        with open(data_path, 'r') as f:
+            capture_data = json.load(f)
+        detections = capture_data.get('detections', [])
+        # Retention may have recompressed the original to another format
+        original_path = self.captures_dir / capture_data.get('original_image', f"{capture_id}_original.jpg")
+        if original_path.parent != self.captures_dir or not original_path.exists():
+            return None
+        image_bgr = utils.decode_image_bytes(original_path.read_bytes())
+        annotated = YOLODetector.draw_detections(image_bgr, detections)
+        jpeg = utils.encode_image_to_jpeg(annotated, quality=self.quality)
+
+        # Write atomically so concurrent readers never see a partial file; a
+        # unique temp name lets concurrent first requests render side by side
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{capture_id}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(jpeg)
+            os.replace(tmp_name, cached)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._total += len(jpeg) - self._sizes.get(filename, 0)
+            self._sizes[filename] = len(jpeg)
+            self._sizes.move_to_end(filename)
+            self._evict_locked(keep=filename)
+        return cached
+
+    def invalidate(self, capture_id: str):
+        """Drop a capture's rendered image (e.g. when the capture is deleted)."""
+        filename = f"{capture_id}{ANNOTATED_SUFFIX}"
+        with self._lock:
+            self._total -= self._sizes.pop(filename, 0)
+        (self.cache_dir / filename).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """Cache usage statistics."""
+        with self._lock:
+            return {'entries': len(self._sizes), 'bytes': self._total, 'max_bytes': self.max_bytes}
+
+    def _evict_locked(self, keep: str):
+        """Delete least recently used images until under max_bytes. Caller holds the lock."""
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            filename = next(iter(self._sizes))
+            if filename == keep:
+                self._sizes.move_to_end(filename)
+                continue
+            self._total -= self._sizes.pop(filename)
+            (self.cache_dir / filename).unlink(missing_ok=True)
@@ -0,0 +1,188 @@
+"""
+Fan-out of one camera's annotated stream to many viewers.
+
+The source camera keeps running its normal /detect loop with
+?broadcast=<channel>. Each frame is inferred and its annotated JPEG
+encoded once; publish() then builds the multipart/x-mixed-replace part
+and the WebSocket metadata message once and hands the same bytes objects
+to every viewer.
+
+Every viewer has a small bounded queue. When a slow viewer's queue is
+full its oldest frame is dropped, so a stalled connection costs at most
+buffer_size frames of memory and never slows the source or other
+viewers.
+
+Channels live in this process only: with several uvicorn workers the
+source and its viewers must reach the same worker.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Dict, List, Optional
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_MEDIA_TYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+CHANNEL_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Channels without viewers are forgotten after this long without a frame
+CHANNEL_IDLE_S = 300
+
+
+class BroadcastFrame:
+    """One published frame, encoded once for every transport."""
+
+    __slots__ = ('seq', 'jpeg', 'mjpeg_part', 'meta_json', 'published_at')
+
+    def __init__(self, seq: int, jpeg: bytes, meta: Dict):
+        self.seq = seq
+        self.jpeg = jpeg
+        self.mjpeg_part = (
+            f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+            f"Content-Length: {len(jpeg)}\r\n\r\n".encode('ascii') + jpeg + b"\r\n"
+        )
+        self.meta_json = json.dumps({'seq': seq, **meta})
+        self.published_at = time.time()
+
+
+class Viewer:
+    """Bounded frame queue for one connected viewer; oldest frames drop first."""
+
+    def __init__(self, buffer_size: int):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.sent = 0
+        self.dropped = 0
+        self.connected_at = time.time()
+
+    def offer(self, frame: Optional[BroadcastFrame]):
+        """Queue a frame (None closes the viewer). Never blocks."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    async def next_frame(self) -> Optional[BroadcastFrame]:
+        frame = await self.queue.get()
+        if frame is not None:
+            self.sent += 1
+        return frame
+
+
+class _Channel:
+    def __init__(self):
+        self.viewers = set()
+        self.latest = None
+        self.seq = 0
+        self.published = 0
+        self.encoded_bytes = 0
+        self.sent = 0
+        self.dropped = 0
+        self.last_activity = time.time()
+
+
+class BroadcastHub:
+    """Named channels of annotated frames; all methods run on the event loop."""
+
+    def __init__(self, buffer_size: int = 2, max_viewers: int = 32, max_channels: int = 16):
+        """
+        Args:
+            buffer_size: Frames queued per viewer before the oldest is dropped
+            max_viewers: Viewers allowed per channel
+            max_channels: Channels allowed at once
+        """
+        self.buffer_size = buffer_size
+        self.max_viewers = max_viewers
+        self.max_channels = max_channels
+        self._channels = {}
+
+    @staticmethod
+    def validate_name(channel: str):
+        if not CHANNEL_NAME.match(channel):
+            raise ValueError("Channel names are 1-64 letters, digits, '_' or '-'")
+
+    def publish(self, channel: str, jpeg: bytes, meta: Dict) -> int:
+        """
+        Publish an annotated frame to every viewer of a channel.
+
+        Args:
+            channel: Channel name
+            jpeg: Annotated frame, already JPEG-encoded
+            meta: Small JSON-serializable summary sent to WebSocket viewers
+
+        Returns:
+            Number of viewers the frame was handed to
+        """
+        state = self._get_channel(channel)
+        state.seq += 1
+        frame = BroadcastFrame(state.seq, jpeg, meta)
+        state.latest = frame
+        state.published += 1
+        state.encoded_bytes += len(frame.mjpeg_part)
+        state.last_activity = frame.published_at
+        for viewer in state.viewers:
+            viewer.offer(frame)
+        return len(state.viewers)
+
+    def subscribe(self, channel: str) -> Viewer:
+        """
+        Add a viewer. The channel's latest frame, if any, is queued first
+        so a new viewer doesn't wait for the next publish.
+
+        Raises:
+            ValueError: Invalid channel name
+            OverflowError: Channel or viewer limit reached
+        """
+        state = self._get_channel(channel)
+        if len(state.viewers) >= self.max_viewers:
+            raise OverflowError(f"Channel {channel} already has {self.max_viewers} viewers")
+        viewer = Viewer(self.buffer_size)
+        if state.latest is not None:
+            viewer.offer(state.latest)
+        state.viewers.add(viewer)
+        state.last_activity = time.time()
+        return viewer
+
+    def unsubscribe(self, channel: str, viewer: Viewer):
+        state = self._channels.get(channel)
+        if state is not None and viewer in state.viewers:
+            state.viewers.discard(viewer)
+            state.sent += viewer.sent
+            state.dropped += viewer.dropped
+            state.last_activity = time.time()
+
+    def close(self):
+        """End every viewer's stream (server shutdown)."""
+        for state in self._channels.values():
+            for viewer in state.viewers:
+                viewer.offer(None)
+
+    def stats(self) -> List[Dict]:
+        self._prune()
+        now = time.time()
+        return [
+            {
+                'channel': name,
+                'viewers': len(state.viewers),
+                'published': state.published,
+                'encoded_bytes': state.encoded_bytes,
+                'last_frame_age_s': round(now - state.latest.published_at, 1) if state.latest else None,
+                'viewer_frames_dropped': state.dropped + sum(v.dropped for v in state.viewers),
+                'viewer_frames_sent': state.sent + sum(v.sent for v in state.viewers)
+            }
+            for name, state in self._channels.items()
+        ]
+
+    def _get_channel(self, channel: str) -> _Channel:
+        state = self._channels.get(channel)
+        if state is None:
+            self.validate_name(channel)
+            self._prune()
+            if len(self._channels) >= self.max_channels:
+                raise OverflowError(f"Broadcast channel limit ({self.max_channels}) reached")
+            state = self._channels[channel] = _Channel()
+        return state
+
+    def _prune(self):
+        cutoff = time.time() - CHANNEL_IDLE_S
+        for name in [name for name, state in self._channels.items()
+                     if not state.viewers and state.last_activity < cutoff]:
+            del self._channels[name]
@@ -0,0 +1,251 @@
+"""
+Streaming export of captures as a YOLO dataset (ZIP or tar).
+
+The archive is written into a small in-memory sink that is drained after
+every file, so only one image is held at a time and memory use does not
+grow with the number of captures. Layout matches what the training
+notebook expects:
+
+    images/{train,val}/<capture_id>.jpg
+    labels/{train,val}/<capture_id>.txt   (class x_center y_center width height, normalized)
+    data.yaml                             (written last, once all class names are known)
+
+Boxes are normalized by the original image size, so they stay valid when
+images are downscaled on the fly (aspect ratio is preserved).
+
+tar output is fully constant-memory. ZIP has to keep a small entry per
+file until it writes the central directory at the end (about 2 KB per
+capture), so prefer tar for very large exports.
+"""
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import cv2
+
+from app import utils
+
+FORMATS = ('zip', 'tar')
+CAPTURE_PREFIX = "capture_"
+DATA_SUFFIX = "_data.json"
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only, non-seekable file object whose contents are drained by the caller."""
+
+    def __init__(self):
+        self._chunks = []
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self.bytes_written += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def select_captures(
+    captures_dir: Path,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    class_names: Optional[Set[str]] = None,
+    min_confidence: float = 0.0,
+    include_empty: bool = True,
+    limit: int = 0
+) -> Iterator[Dict]:
+    """
+    Yield capture data (oldest first) matching the filters, one JSON at a time.
+
+    Args:
+        captures_dir: Directory holding capture files
+        start: First capture day (inclusive)
+        end: Last capture day (inclusive)
+        class_names: Keep captures with at least one detection of these classes
+        min_confidence: Drop detections below this confidence
+        include_empty: Keep captures without detections (background images)
+        limit: Stop after this many captures (0: no limit)
+    """
+    # Only names are held in memory; capture IDs sort chronologically
+    ids = sorted(
+        entry.name[:-len(DATA_SUFFIX)]
+        for entry in os.scandir(captures_dir)
+        if entry.name.startswith(CAPTURE_PREFIX) and entry.name.endswith(DATA_SUFFIX)
+    )
+    count = 0
+    for capture_id in ids:
+        if start or end:
+            try:
+                day = datetime.strptime(capture_id[len(CAPTURE_PREFIX):][:8], "%Y%m%d").date()
+            except ValueError:
+                continue
+            if (start and day < start) or (end and day > end):
+                continue
+        try:
+            with open(captures_dir / f"{capture_id}{DATA_SUFFIX}", 'r') as f:
+                capture_data = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        detections = [d for d in capture_data.get('detections', []) if d.get('confidence', 1.0) >= min_confidence]
+        if class_names is not None and not any(d['class_name'] in class_names for d in detections):
+            continue
+        if not detections and not include_empty:
+            continue
+        capture_data['detections'] = detections
+        yield capture_data
+        count += 1
+        if limit and count >= limit:
+            return
+
+
+def yolo_label(detections: List[Dict], width: int, height: int) -> str:
+    """YOLO label file content for detections in pixel xyxy coordinates."""
+    lines = []
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox_xyxy']
+        x1, x2 = max(0.0, min(x1, width)), max(0.0, min(x2, width))
+        y1, y2 = max(0.0, min(y1, height)), max(0.0, min(y2, height))
+        if x2 <= x1 or y2 <= y1:
+            continue
+        lines.append(f"{det['class_id']} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                     f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def split_for(capture_id: str, val_fraction: float) -> str:
+    """Deterministic train/val assignment, stable across exports."""
+    bucket = int.from_bytes(hashlib.sha1(capture_id.encode('utf-8')).digest()[:4], 'big') / 2**32
+    return 'val' if bucket < val_fraction else 'train'
+
+
+def _image_for_export(captures_dir: Path, capture_data: Dict, max_side: int, quality: int):
+    """(image bytes, extension, width, height) of a capture's original, resized if needed."""
+    capture_id = capture_data['capture_id']
+    path = captures_dir / capture_data.get('original_image', f"{capture_id}_original.jpg")
+    data = path.read_bytes()
+    metrics = capture_data.get('quality_metrics') or {}
+    width, height = metrics.get('width'), metrics.get('height')
+
+    if not max_side and not quality and width and height:
+        # Fast path: stored file as-is, no decode
+        return data, path.suffix, width, height
+
+    image_bgr = utils.decode_image_bytes(data)
+    height, width = image_bgr.shape[:2]
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        image_bgr = cv2.resize(image_bgr, (round(width * scale), round(height * scale)),
+                               interpolation=cv2.INTER_AREA)
+    return utils.encode_image_to_jpeg(image_bgr, quality=quality or 95), '.jpg', width, height
+
+
+def data_yaml(class_names: Dict[int, str]) -> str:
+    names = [class_names.get(i, str(i)) for i in range(max(class_names) + 1)] if class_names else []
+    lines = ["path: .", "train: images/train", "val: images/val", f"nc: {len(names)}", "names:"]
+    lines += [f"  {i}: {json.dumps(name)}" for i, name in enumerate(names)]
+    return '\n'.join(lines) + '\n'
+
+
+class DatasetExporter:
+    """Streams captures into a ZIP or tar YOLO dataset archive."""
+
+    def __init__(
+        self,
+        captures_dir: Path,
+        fmt: str = 'zip',
+        max_side: int = 0,
+        quality: int = 0,
+        val_fraction: float = 0.1,
+        class_names: Optional[Dict[int, str]] = None
+    ):
+        """
+        Args:
+            captures_dir: Directory holding capture files
+            fmt: 'zip' or 'tar'
+            max_side: Downscale images whose longer side exceeds this (0: keep size)
+            quality: Re-encode images as JPEG at this quality (0: keep the
+                stored file unless resizing)
+            val_fraction: Share of captures placed in the val split
+            class_names: Model class names for data.yaml (names seen in
+                capture JSON fill any gaps)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if not 0 <= val_fraction < 1 or max_side < 0 or not 0 <= quality <= 100:
+            raise ValueError("val_fraction must be in [0, 1), max_side >= 0, quality in [0, 100]")
+        self.captures_dir = captures_dir
+        self.fmt = fmt
+        self.max_side = max_side
+        self.quality = quality
+        self.val_fraction = val_fraction
+        self.class_names = dict(class_names or {})
+        self.stats = {'captures': 0, 'labels': 0, 'skipped': 0, 'bytes': 0}
+
+    def stream(self, captures: Iterable[Dict]) -> Iterator[bytes]:
+        """
+        Archive chunks, one or more per capture; memory stays bounded by
+        the largest single image.
+
+        Args:
+            captures: Capture data dicts, e.g. from select_captures()
+        """
+        sink = _StreamSink()
+        archive = (zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) if self.fmt == 'zip'
+                   else tarfile.open(fileobj=sink, mode='w|'))
+        try:
+            for capture_data in captures:
+                try:
+                    image, extension, width, height = _image_for_export(
+                        self.captures_dir, capture_data, self.max_side, self.quality)
+                except (OSError, ValueError):
+                    self.stats['skipped'] += 1
+                    continue
+                capture_id = capture_data['capture_id']
+                split = split_for(capture_id, self.val_fraction)
+                for det in capture_data['detections']:
+                    self.class_names.setdefault(det['class_id'], det['class_name'])
+                label = yolo_label(capture_data['detections'], width, height)
+
+                self._add(archive, f"images/{split}/{capture_id}{extension}", image, compress=False)
+                self._add(archive, f"labels/{split}/{capture_id}.txt", label.encode('utf-8'), compress=True)
+                self.stats['captures'] += 1
+                self.stats['labels'] += label.count('\n')
+                chunk = sink.drain()
+                self.stats['bytes'] += len(chunk)
+                yield chunk
+
+            self._add(archive, "data.yaml", data_yaml(self.class_names).encode('utf-8'), compress=True)
+        finally:
+            archive.close()
+        chunk = sink.drain()
+        self.stats['bytes'] += len(chunk)
+        yield chunk
+
+    def _add(self, archive, name: str, data: bytes, compress: bool):
+        if self.fmt == 'zip':
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            # Images are already compressed; only labels and data.yaml are deflated
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+            # Stream mode never reads members back; don't keep one per file
+            archive.members.clear()
@@ -0,0 +1,524 @@
+"""
+Split deployment: API processes push inference jobs through a TCP broker
+to separate inference worker processes (app/inference_worker.py).
+
+Wire format: every message is an 8-byte prefix (header length, payload
+length, big-endian uint32), a JSON header and an optional binary payload
+(the image or annotated JPEG).
+
+On connect the broker sends a random nonce. Workers and API clients
+answer with HMAC-SHA256(INFERENCE_BROKER_SECRET, nonce) in their
+register/hello message, and the broker drops connections that fail the
+check. The secret itself is never sent. Without a secret anyone who can
+reach the port can submit jobs or register as a worker, so the broker
+binds to 127.0.0.1 by default.
+
+Workers register on connect and deregister on disconnect or 'bye'. The
+broker hands each job to the least-loaded worker with free capacity and
+requeues the in-flight jobs of a worker that disconnects or stops sending
+heartbeats, up to max_retries attempts.
+
+The broker can run embedded in the API process (INFERENCE_BROKER_BIND) or
+standalone when several API processes share one worker pool:
+    python -m app.distributed                      # 127.0.0.1:5555
+    INFERENCE_BROKER_SECRET=... python -m app.distributed --bind 0.0.0.0:5555
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import json
+import os
+import secrets
+import struct
+import time
+from collections import deque
+from typing import Dict, Optional, Set, Tuple
+
+
+_PREFIX = struct.Struct('!II')
+MAX_HEADER_BYTES = 1 << 20
+MAX_PAYLOAD_BYTES = 64 << 20
+# Seconds a new connection has to complete the handshake
+HANDSHAKE_TIMEOUT_S = 10.0
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Split "host:port" (host defaults to 127.0.0.1)."""
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def auth_token(secret: str, nonce: str) -> str:
+    """Handshake answer proving knowledge of the shared secret."""
+    return hmac.new(secret.encode('utf-8'), nonce.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def write_message(writer: asyncio.StreamWriter, header: Dict, payload: bytes = b''):
+    """
+    Queue one message on the transport without waiting for it to drain.
+    Only for synchronous callers whose output is bounded; otherwise use
+    send_message() so a slow peer applies backpressure.
+    """
+    data = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    writer.write(_PREFIX.pack(len(data), len(payload)) + data)
+    if payload:
+        writer.write(payload)
+
+
+async def send_message(writer: asyncio.StreamWriter, header: Dict, payload: bytes = b''):
+    """Write one message and wait for the transport buffer to drain."""
+    write_message(writer, header, payload)
+    await writer.drain()
+
+
+async def drain(writer: asyncio.StreamWriter):
+    """Wait for the transport buffer to drain; a lost connection is left to its reader."""
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+
+
+async def recv_message(reader: asyncio.StreamReader, max_payload_bytes: int = MAX_PAYLOAD_BYTES) -> Tuple[Dict, bytes]:
+    """
+    Read one message.
+
+    Args:
+        reader: Stream to read from
+        max_payload_bytes: Largest accepted payload
+
+    Raises:
+        asyncio.IncompleteReadError: Connection closed
+        ValueError: Oversized or malformed message
+    """
+    header_len, payload_len = _PREFIX.unpack(await reader.readexactly(_PREFIX.size))
+    if header_len > MAX_HEADER_BYTES or payload_len > max_payload_bytes:
+        raise ValueError(f"Message too large ({header_len} + {payload_len} bytes)")
+    header = json.loads(await reader.readexactly(header_len))
+    payload = await reader.readexactly(payload_len) if payload_len else b''
+    return header, payload
+
+
+async def handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    header: Dict, secret: Optional[str]) -> Dict:
+    """
+    Answer the broker's challenge with a register/hello message.
+
+    Args:
+        reader: Broker connection reader
+        writer: Broker connection writer
+        header: register or hello message
+        secret: Shared secret (INFERENCE_BROKER_SECRET), if any
+
+    Returns:
+        The broker's reply
+
+    Raises:
+        ConnectionError: Broker rejected the handshake
+    """
+    challenge, _ = await recv_message(reader, max_payload_bytes=0)
+    nonce = str(challenge.get('nonce', ''))
+    await send_message(writer, {**header, 'auth': auth_token(secret, nonce) if secret else ''})
+    reply, _ = await recv_message(reader, max_payload_bytes=0)
+    if reply.get('type') == 'error':
+        raise ConnectionError(f"Inference broker refused connection: {reply.get('error')}")
+    return reply
+
+
+class _Job:
+    __slots__ = ('job_id', 'client', 'client_job_id', 'params', 'payload', 'attempts', 'expires')
+
+    def __init__(self, job_id: int, client: '_Peer', client_job_id, params: Dict, payload: bytes, timeout: float):
+        self.job_id = job_id
+        self.client = client
+        self.client_job_id = client_job_id
+        self.params = params
+        self.payload = payload
+        self.attempts = 0
+        # The client stops waiting after its timeout; don't run the job after that
+        self.expires = time.monotonic() + timeout
+
+
+class _Peer:
+    """A connected worker or API client."""
+
+    def __init__(self, writer: asyncio.StreamWriter, peer_id: str, capacity: int = 0, info: Optional[Dict] = None):
+        self.writer = writer
+        self.peer_id = peer_id
+        self.capacity = capacity
+        self.info = info or {}
+        self.inflight = {}
+        self.last_seen = time.monotonic()
+        self.completed = 0
+        self.draining = False
+        self.closed = False
+
+
+class InferenceBroker:
+    """Job queue between API clients and inference workers."""
+
+    def __init__(self, heartbeat_timeout: float = 10.0, max_retries: int = 2, secret: Optional[str] = None):
+        """
+        Args:
+            heartbeat_timeout: Seconds without a message before a worker is declared dead
+            max_retries: Times a job is requeued after its worker died
+            secret: Shared secret peers must prove in the handshake (None: no check)
+        """
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.secret = secret
+        self._workers = {}
+        self._pending = deque()
+        self._job_ids = itertools.count(1)
+        self._server = None
+        self._watchdog = None
+        self._writers = set()
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self, host: str, port: int) -> int:
+        """
+        Start listening.
+
+        Returns:
+            Bound port (useful with port 0)
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self._watchdog = asyncio.get_running_loop().create_task(self._watch())
+        bound_port = self._server.sockets[0].getsockname()[1]
+        print(f"Inference broker listening on {host}:{bound_port}")
+        if not self.secret and not _is_loopback(host):
+            print("Warning: inference broker reachable from the network without INFERENCE_BROKER_SECRET")
+        return bound_port
+
+    async def close(self):
+        """Stop accepting connections and drop all peers."""
+        if self._watchdog:
+            self._watchdog.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        # Close every connection so handlers finish instead of being cancelled
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            nonce = secrets.token_hex(16)
+            write_message(writer, {'type': 'challenge', 'nonce': nonce})
+            header, _ = await asyncio.wait_for(recv_message(reader, max_payload_bytes=0), HANDSHAKE_TIMEOUT_S)
+            if self.secret and not hmac.compare_digest(
+                    str(header.get('auth', '')).encode('utf-8'), auth_token(self.secret, nonce).encode('utf-8')):
+                peer = writer.get_extra_info('peername')
+                print(f"Inference broker: rejected {peer} (bad or missing secret)")
+                await send_message(writer, {'type': 'error', 'error': 'authentication failed'})
+                return
+            if header.get('type') == 'register':
+                await self._serve_worker(header, reader, writer)
+            elif header.get('type') == 'hello':
+                await self._serve_client(reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_worker(self, header: Dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker_id = str(header['worker_id'])
+        previous = self._workers.get(worker_id)
+        if previous is not None:
+            # Same worker reconnecting: its old connection is gone
+            self._remove_worker(previous, 'replaced by new connection')
+
+        worker = _Peer(writer, worker_id, max(1, int(header.get('capacity', 1))), {
+            'model_name': header.get('model_name'),
+            'host': header.get('host'),
+            'pid': header.get('pid'),
+            'class_names': header.get('class_names')
+        })
+        self._workers[worker_id] = worker
+        print(f"Worker {worker_id} registered (capacity {worker.capacity})")
+        await send_message(writer, {'type': 'registered'})
+        self._dispatch()
+
+        reason = 'disconnected'
+        try:
+            while True:
+                header, payload = await recv_message(reader)
+                worker.last_seen = time.monotonic()
+                kind = header.get('type')
+                if kind == 'result':
+                    job = worker.inflight.pop(header.get('job_id'), None)
+                    if job is not None:
+                        worker.completed += 1
+                        self.completed += 1
+                        self._reply(job, header, payload)
+                        # Stop reading results while the client can't keep up
+                        await drain(job.client.writer)
+                    await self._flush(self._dispatch())
+                elif kind == 'bye':
+                    # Graceful deregistration: finish in-flight jobs, take no new ones
+                    worker.draining = True
+                    reason = 'deregistered'
+                    if not worker.inflight:
+                        break
+                    await self._flush(self._dispatch())
+                if worker.draining and not worker.inflight:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._remove_worker(worker, reason)
+
+    def _remove_worker(self, worker: _Peer, reason: str):
+        if worker.closed:
+            return
+        worker.closed = True
+        if self._workers.get(worker.peer_id) is worker:
+            del self._workers[worker.peer_id]
+        worker.writer.close()
+        jobs = list(worker.inflight.values())
+        worker.inflight.clear()
+        print(f"Worker {worker.peer_id} removed ({reason}); requeueing {len(jobs)} job(s)")
+        # Retried jobs go to the front so they don't wait behind newer frames
+        for job in reversed(jobs):
+            job.attempts += 1
+            if job.attempts > self.max_retries:
+                self.failed += 1
+                self._reply(job, {'ok': False, 'status': 503,
+                                  'error': f"Inference worker failed {job.attempts} time(s)"})
+            else:
+                self.retried += 1
+                self._pending.appendleft(job)
+        self._dispatch()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _Peer(writer, f"client-{id(writer):x}")
+        await send_message(writer, {'type': 'welcome'})
+        try:
+            while True:
+                header, payload = await recv_message(reader)
+                kind = header.get('type')
+                if kind == 'submit':
+                    self._pending.append(_Job(
+                        next(self._job_ids), client, header.get('job_id'), header.get('params', {}), payload,
+                        float(header.get('timeout', 60))))
+                    await self._flush(self._dispatch())
+                elif kind == 'stats':
+                    await send_message(writer, {'type': 'stats', 'job_id': header.get('job_id'), **self.stats()})
+        finally:
+            client.closed = True
+
+    def _reply(self, job: _Job, header: Dict, payload: bytes = b''):
+        if job.client.closed:
+            return
+        write_message(job.client.writer, {**header, 'type': 'result', 'job_id': job.client_job_id}, payload)
+
+    def _dispatch(self) -> Set[asyncio.StreamWriter]:
+        """
+        Assign pending jobs to the least-loaded workers with free capacity.
+        Writes are bounded by worker capacity; async callers pass the
+        returned writers to _flush().
+
+        Returns:
+            Writers of the workers that were sent a job
+        """
+        sent = set()
+        while self._pending:
+            available = [
+                w for w in self._workers.values()
+                if not w.draining and len(w.inflight) < w.capacity
+            ]
+            if not available:
+                break
+            job = self._pending.popleft()
+            if job.client.closed or job.expires < time.monotonic():
+                continue
+            worker = min(available, key=lambda w: (len(w.inflight) / w.capacity, w.completed))
+            worker.inflight[job.job_id] = job
+            write_message(worker.writer, {'type': 'job', 'job_id': job.job_id, 'params': job.params}, job.payload)
+            sent.add(worker.writer)
+        return sent
+
+    @staticmethod
+    async def _flush(writers: Set[asyncio.StreamWriter]):
+        for writer in writers:
+            await drain(writer)
+
+    async def _watch(self):
+        """Declare workers dead when their heartbeats stop."""
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 2)
+            now = time.monotonic()
+            for worker in list(self._workers.values()):
+                if now - worker.last_seen > self.heartbeat_timeout:
+                    self._remove_worker(worker, f"no heartbeat for {now - worker.last_seen:.0f} s")
+
+    def stats(self) -> Dict:
+        """Worker pool and queue statistics."""
+        now = time.monotonic()
+        return {
+            'workers': [
+                {
+                    'worker_id': w.peer_id,
+                    'capacity': w.capacity,
+                    'inflight': len(w.inflight),
+                    'completed': w.completed,
+                    'draining': w.draining,
+                    'last_seen_s': round(now - w.last_seen, 1),
+                    **{k: v for k, v in w.info.items() if k != 'class_names'}
+                }
+                for w in self._workers.values()
+            ],
+            'pending': len(self._pending),
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed
+        }
+
+
+class RemoteInferenceError(Exception):
+    """A job failed on the worker side (or no worker could finish it)."""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+class BrokerClient:
+    """API-side connection to the broker; many concurrent jobs share it."""
+
+    def __init__(self, host: str, port: int, timeout: float = 30.0, secret: Optional[str] = None):
+        """
+        Args:
+            host: Broker host
+            port: Broker port
+            timeout: Default seconds to wait for a job result
+            secret: Shared secret for the broker handshake
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.secret = secret
+        self._writer = None
+        self._reader_task = None
+        self._futures = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = None
+
+    async def _ensure_connected(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                await handshake(reader, writer, {'type': 'hello'}, self.secret)
+            except BaseException:
+                writer.close()
+                raise
+            self._writer = writer
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_loop(reader, writer))
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, payload = await recv_message(reader)
+                future = self._futures.pop(header.get('job_id'), None)
+                if future is not None and not future.done():
+                    future.set_result((header, payload))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            # Jobs on this connection can't be answered anymore
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Lost connection to inference broker"))
+            self._futures.clear()
+
+    async def _request(self, header: Dict, payload: bytes, timeout: Optional[float]) -> Tuple[Dict, bytes]:
+        await self._ensure_connected()
+        job_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[job_id] = future
+        try:
+            timeout = timeout or self.timeout
+            await send_message(self._writer, {**header, 'job_id': job_id, 'timeout': timeout}, payload)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._futures.pop(job_id, None)
+
+    async def submit(self, params: Dict, payload: bytes, timeout: Optional[float] = None) -> Tuple[Dict, bytes]:
+        """
+        Run one inference job on a worker.
+
+        Args:
+            params: Job parameters (see inference_worker.process_job)
+            payload: Encoded image bytes
+            timeout: Seconds to wait (default: client timeout)
+
+        Returns:
+            (result header, annotated JPEG bytes or b'')
+
+        Raises:
+            RemoteInferenceError: Worker reported an error or all attempts failed
+            ConnectionError / OSError: Broker unreachable
+            asyncio.TimeoutError: No result in time
+        """
+        header, result_payload = await self._request({'type': 'submit', 'params': params}, payload, timeout)
+        if not header.get('ok'):
+            raise RemoteInferenceError(header.get('error', 'Inference failed'), header.get('status', 500))
+        return header, result_payload
+
+    async def stats(self) -> Dict:
+        """Broker worker pool and queue statistics."""
+        header, _ = await self._request({'type': 'stats'}, b'', 5.0)
+        header.pop('type', None)
+        header.pop('job_id', None)
+        return header
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone inference broker")
+    parser.add_argument('--bind', default='127.0.0.1:5555',
+                        help='host:port to listen on (set INFERENCE_BROKER_SECRET before binding 0.0.0.0)')
+    parser.add_argument('--heartbeat-timeout', type=float, default=10.0)
+    parser.add_argument('--max-retries', type=int, default=2)
+    args = parser.parse_args()
+
+    async def _run():
+        broker = InferenceBroker(args.heartbeat_timeout, args.max_retries,
+                                 secret=os.environ.get('INFERENCE_BROKER_SECRET') or None)
+        await broker.start(*parse_address(args.bind))
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
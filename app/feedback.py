@@ -177,46 +177,147 @@ DISEASE_SUGGESTIONS = {
 }
 
 
-def get_disease_suggestions(class_name: str) -> List[str]:
+# Saran cadangan bila kelas tidak ada di DISEASE_SUGGESTIONS
+GENERIC_HEALTHY_ID = 'generic_healthy'
+GENERIC_UNKNOWN_ID = 'generic_unknown'
+GENERIC_SUGGESTIONS = {
+    GENERIC_HEALTHY_ID: ["Daun tampak sehat", "Lanjutkan praktik perawatan saat ini"],
+    GENERIC_UNKNOWN_ID: [
+        "Konsultasikan dengan layanan penyuluhan pertanian atau patolog tanaman",
+        "Dokumentasikan gejala dengan foto yang jelas",
+        "Pantau perkembangan penyakit",
+        "Pertimbangkan pengujian laboratorium untuk diagnosis akurat"
+    ],
+}
+
+# Penafian statis; dikirim sekali lewat /feedback/static dan dirujuk dengan ID
+DISCLAIMER_ID = 'disclaimer_v1'
+DISCLAIMER = (
+    "⚠️ PENAFIAN PENTING: Sistem ini hanya menyediakan dukungan keputusan dan BUKAN "
+    "pengganti diagnosis profesional. Untuk identifikasi penyakit yang akurat dan "
+    "rekomendasi perawatan, silakan berkonsultasi dengan:\n"
+    "  • Layanan penyuluhan pertanian\n"
+    "  • Patolog tanaman bersertifikat\n"
+    "  • Agronom profesional\n\n"
+    "Selalu konfirmasi penyakit yang dicurigai melalui pengujian laboratorium bila memungkinkan. "
+    "Saran yang diberikan adalah praktik budidaya umum dan harus disesuaikan "
+    "dengan kondisi pertumbuhan spesifik Anda, peraturan lokal, dan panduan ahli."
+)
+
+# Indeks nama kelas -> ID saran, diisi sekali saat model dimuat
+_suggestion_index: Dict[str, str] = {}
+
+
+def resolve_suggestion_id(class_name: str) -> str:
     """
-    Dapatkan saran umum untuk kelas penyakit.
-    Kembali ke saran generik jika kelas tidak ditemukan.
+    Cari ID saran untuk nama kelas (kunci DISEASE_SUGGESTIONS atau ID generik).
 
     Args:
         class_name: Nama kelas penyakit
 
     Returns:
-        Daftar string saran
+        ID saran
     """
     # Normalisasi nama kelas (huruf kecil, ganti spasi/garis bawah)
     normalized = class_name.lower().replace(' ', '_').replace('-', '_')
 
     # Coba kecocokan tepat terlebih dahulu
     if normalized in DISEASE_SUGGESTIONS:
-        return DISEASE_SUGGESTIONS[normalized]
+        return normalized
 
     # Coba kecocokan parsial
     for key in DISEASE_SUGGESTIONS:
         if key in normalized or normalized in key:
-            return DISEASE_SUGGESTIONS[key]
+            return key
 
     # Fallback generik
     if 'healthy' in normalized:
-        return ["Daun tampak sehat", "Lanjutkan praktik perawatan saat ini"]
-    else:
-        return [
-            "Konsultasikan dengan layanan penyuluhan pertanian atau patolog tanaman",
-            "Dokumentasikan gejala dengan foto yang jelas",
-            "Pantau perkembangan penyakit",
-            "Pertimbangkan pengujian laboratorium untuk diagnosis akurat"
-        ]
+        return GENERIC_HEALTHY_ID
+    return GENERIC_UNKNOWN_ID
+
+
+def build_suggestion_index(class_names: Dict[int, str]) -> Dict[str, str]:
+    """
+    Hitung pemetaan kelas ke ID saran sekali untuk nama kelas model.
+    Dipanggil saat model dimuat agar tidak ada pencarian linear per frame.
+
+    Args:
+        class_names: Kamus names dari model (id -> nama kelas)
+
+    Returns:
+        Indeks nama kelas -> ID saran
+    """
+    for class_name in class_names.values():
+        _suggestion_index[class_name] = resolve_suggestion_id(class_name)
+    return dict(_suggestion_index)
+
+
+def get_suggestion_id(class_name: str) -> str:
+    """
+    Dapatkan ID saran dari indeks, hitung dan simpan jika belum ada.
+
+    Args:
+        class_name: Nama kelas penyakit
+
+    Returns:
+        ID saran
+    """
+    suggestion_id = _suggestion_index.get(class_name)
+    if suggestion_id is None:
+        suggestion_id = resolve_suggestion_id(class_name)
+        _suggestion_index[class_name] = suggestion_id
+    return suggestion_id
+
+
+def get_suggestions_by_id(suggestion_id: str) -> List[str]:
+    """
+    Dapatkan daftar saran untuk ID saran.
+
+    Args:
+        suggestion_id: Kunci DISEASE_SUGGESTIONS atau ID generik
+
+    Returns:
+        Daftar string saran
+    """
+    if suggestion_id in DISEASE_SUGGESTIONS:
+        return DISEASE_SUGGESTIONS[suggestion_id]
+    return GENERIC_SUGGESTIONS.get(suggestion_id, GENERIC_SUGGESTIONS[GENERIC_UNKNOWN_ID])
+
+
+def get_disease_suggestions(class_name: str) -> List[str]:
+    """
+    Dapatkan saran umum untuk kelas penyakit.
+    Kembali ke saran generik jika kelas tidak ditemukan.
+
+    Args:
+        class_name: Nama kelas penyakit
+
+    Returns:
+        Daftar string saran
+    """
+    return get_suggestions_by_id(get_suggestion_id(class_name))
+
+
+def get_static_payload() -> Dict:
+    """
+    Teks statis (penafian, saran per kelas) untuk disajikan sekali dan di-cache klien.
+
+    Returns:
+        Kamus dengan penafian, saran per ID, dan indeks kelas
+    """
+    return {
+        'disclaimer': {'id': DISCLAIMER_ID, 'text': DISCLAIMER},
+        'suggestions': {**DISEASE_SUGGESTIONS, **GENERIC_SUGGESTIONS},
+        'class_index': dict(_suggestion_index)
+    }
 
 
 def generate_feedback(
     detections: List[Dict],
     quality_metrics: Dict,
     image_width: int,
-    image_height: int
+    image_height: int,
+    compact: bool = False
 ) -> Dict:
     """
     Hasilkan umpan balik AI berdasarkan deteksi dan kualitas gambar.
@@ -226,12 +327,17 @@ def generate_feedback(
         quality_metrics: Kamus dengan kecerahan, blur_metric, dll.
         image_width: Lebar gambar dalam piksel
         image_height: Tinggi gambar dalam piksel
+        compact: Rujuk penafian dan saran per kelas dengan ID alih-alih teks
+            lengkap (teks tersedia di get_static_payload())
 
     Returns:
-        Kamus dengan kritik, saran, dan penafian
+        Kamus dengan kritik, saran, dan penafian (atau ID-nya jika compact)
     """
     critique = []
     suggestions = []
+    suggestion_refs = {}
+    # Posisi saran per kelas di dalam 'suggestions' (mode compact)
+    suggestion_refs_at = 0
 
     brightness = quality_metrics.get('brightness', 128)
     blur_metric = quality_metrics.get('blur_metric', 100)
@@ -327,9 +433,13 @@ def generate_feedback(
 
         # Tambahkan saran khusus penyakit
         for class_name in unique_classes:
-            disease_suggestions = get_disease_suggestions(class_name)
+            suggestion_id = get_suggestion_id(class_name)
+            if compact:
+                suggestion_refs[class_name] = suggestion_id
+                continue
             suggestions.append(f"\n📋 Untuk {class_name}:")
-            suggestions.extend([f"  • {s}" for s in disease_suggestions])
+            suggestions.extend([f"  • {s}" for s in get_suggestions_by_id(suggestion_id)])
+        suggestion_refs_at = len(suggestions)
 
     # 4) Pemeriksaan resolusi gambar
     if image_width < 400 or image_height < 400:
@@ -337,23 +447,9 @@ def generate_feedback(
         suggestions.append(
             "Gunakan resolusi kamera lebih tinggi jika tersedia")
 
-    # Hasilkan penafian
-    disclaimer = (
-        "⚠️ PENAFIAN PENTING: Sistem ini hanya menyediakan dukungan keputusan dan BUKAN "
-        "pengganti diagnosis profesional. Untuk identifikasi penyakit yang akurat dan "
-        "rekomendasi perawatan, silakan berkonsultasi dengan:\n"
-        "  • Layanan penyuluhan pertanian\n"
-        "  • Patolog tanaman bersertifikat\n"
-        "  • Agronom profesional\n\n"
-        "Selalu konfirmasi penyakit yang dicurigai melalui pengujian laboratorium bila memungkinkan. "
-        "Saran yang diberikan adalah praktik budidaya umum dan harus disesuaikan "
-        "dengan kondisi pertumbuhan spesifik Anda, peraturan lokal, dan panduan ahli."
-    )
-
-    return {
+    result = {
         'critique': critique,
         'suggestions': suggestions,
-        'disclaimer': disclaimer,
         'summary': {
             'detections_count': len(detections),
             'unique_diseases': len(set(d['class_name'] for d in detections)) if detections else 0,
@@ -362,6 +458,16 @@ def generate_feedback(
         }
     }
 
+    if compact:
+        result['suggestion_refs'] = suggestion_refs
+        # Klien menyisipkan saran per kelas di indeks ini, sama seperti mode lengkap
+        result['suggestion_refs_at'] = suggestion_refs_at
+        result['disclaimer_id'] = DISCLAIMER_ID
+    else:
+        result['disclaimer'] = DISCLAIMER
+
+    return result
+
 
 def _compute_quality_score(brightness: float, blur_metric: float, detections: List[Dict]) -> str:
     """
@@ -0,0 +1,256 @@
+"""
+Background collection of hard examples for retraining.
+
+Frames from the live loop whose top confidence falls inside a band are
+queued from /detect and handled by one background thread: a 64-bit
+difference hash of a 9x8 thumbnail is checked against an in-memory
+BK-tree of recently saved hashes, and only frames farther than
+max_distance bits from all of them are written to a YOLO-style dataset
+folder (images/ plus labels/ holding the model's boxes as
+pre-annotations). The folder is capped in size; the oldest examples are
+evicted first.
+
+/detect only does the band check and a non-blocking queue put; a full
+queue drops the frame.
+"""
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app import utils
+
+
+def dhash(image_bgr: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Difference hash: sign of horizontal gradients on a tiny grayscale
+    thumbnail. Robust to scaling, JPEG noise and small exposure changes.
+
+    Args:
+        image_bgr: Input image in BGR format
+        hash_size: Hash is hash_size x hash_size bits
+
+    Returns:
+        Hash as an integer
+    """
+    thumb = cv2.resize(image_bgr, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    bits = gray[:, 1:] > gray[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """BK-tree over Hamming distance for near-duplicate lookup."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                return
+            node = child
+
+    def contains_within(self, value: int, max_distance: int) -> bool:
+        """True if any stored hash is within max_distance bits of value."""
+        if self.root is None:
+            return False
+        stack = [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                return True
+            # Triangle inequality: only subtrees at distance d +/- max_distance can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return False
+
+
+class HardExampleCollector:
+    """Saves unique frames in a confidence band to a capped dataset folder."""
+
+    def __init__(
+        self,
+        root: Path,
+        band: Tuple[float, float] = (0.35, 0.6),
+        max_bytes: int = 2 * 2**30,
+        max_distance: int = 6,
+        index_size: int = 5000,
+        queue_size: int = 16
+    ):
+        """
+        Args:
+            root: Dataset folder (images/ and labels/ are created inside)
+            band: (low, high) top detection confidence to collect
+            max_bytes: Folder size cap; oldest examples are evicted
+            max_distance: Hashes within this many bits count as duplicates
+            index_size: Recent hashes kept in memory for duplicate checks
+            queue_size: Frames waiting to be processed before new ones are dropped
+        """
+        self.root = Path(root)
+        self.images_dir = self.root / "images"
+        self.labels_dir = self.root / "labels"
+        self.band = band
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self.index_size = index_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        # Two generations bound memory: when the current tree fills, it
+        # becomes the previous one and the oldest generation is dropped
+        self._current = BKTree()
+        self._previous = BKTree()
+        self._files = deque()  # (stem, bytes), oldest first
+        self._bytes = 0
+        self._stats = {'candidates': 0, 'saved': 0, 'duplicates': 0, 'dropped': 0, 'evicted': 0, 'errors': 0}
+
+    def start(self):
+        """Scan the existing folder, seed the hash index and start the writer thread."""
+        utils.ensure_dir(self.images_dir)
+        utils.ensure_dir(self.labels_dir)
+        for image_path in sorted(self.images_dir.glob("*.jpg")):
+            size = image_path.stat().st_size
+            label_path = self.labels_dir / f"{image_path.stem}.txt"
+            if label_path.exists():
+                size += label_path.stat().st_size
+            self._files.append((image_path.stem, size))
+            self._bytes += size
+        for stem, _ in list(self._files)[-self.index_size:]:
+            # File names end in the hash, so the index survives restarts
+            try:
+                self._remember(int(stem.rsplit('_', 1)[-1], 16))
+            except ValueError:
+                pass
+        self._thread = threading.Thread(target=self._run, name='hard-examples', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Finish queued frames and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(
+        self,
+        detections: List[Dict],
+        image_bytes: bytes,
+        image_bgr: Optional[np.ndarray] = None
+    ) -> bool:
+        """
+        Queue a frame if its top confidence is inside the band. Never blocks.
+
+        Args:
+            detections: Detections for the frame (boxes become pre-annotations)
+            image_bytes: Encoded frame as received (written unchanged; bytes-like)
+            image_bgr: Decoded frame, if already available
+
+        Returns:
+            True if the frame was queued
+        """
+        if self._thread is None or not detections:
+            return False
+        top = max(d['confidence'] for d in detections)
+        if not self.band[0] <= top <= self.band[1]:
+            return False
+        self._stats['candidates'] += 1
+        try:
+            # bytes() copies views of pooled upload buffers, which are reused after the request
+            self._queue.put_nowait((detections, bytes(image_bytes), image_bgr, top))
+            return True
+        except queue.Full:
+            self._stats['dropped'] += 1
+            return False
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            'band': list(self.band),
+            'files': len(self._files),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'index_size': self._current.size + self._previous.size,
+            'queued': self._queue.qsize()
+        }
+
+    def _remember(self, value: int):
+        if self._current.size >= self.index_size // 2:
+            self._previous, self._current = self._current, BKTree()
+        self._current.add(value)
+
+    def _is_duplicate(self, value: int) -> bool:
+        return (self._current.contains_within(value, self.max_distance) or
+                self._previous.contains_within(value, self.max_distance))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._process(*item)
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"Error saving hard example: {e}")
+
+    def _process(self, detections: List[Dict], image_bytes: bytes, image_bgr: Optional[np.ndarray], top: float):
+        if image_bgr is None:
+            image_bgr = utils.decode_image_bytes(image_bytes)
+        value = dhash(image_bgr)
+        if self._is_duplicate(value):
+            self._stats['duplicates'] += 1
+            return
+        self._remember(value)
+
+        height, width = image_bgr.shape[:2]
+        stem = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_c{int(top * 100):02d}_{value:016x}"
+        lines = []
+        for det in detections:
+            x1, y1, x2, y2 = det['bbox_xyxy']
+            lines.append(f"{det['class_id']} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                         f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+        label = ('\n'.join(lines) + '\n').encode('utf-8')
+        if not image_bytes.startswith(b'\xff\xd8'):
+            image_bytes = utils.encode_image_to_jpeg(image_bgr, quality=95)
+        with open(self.images_dir / f"{stem}.jpg", 'wb') as f:
+            f.write(image_bytes)
+        with open(self.labels_dir / f"{stem}.txt", 'wb') as f:
+            f.write(label)
+
+        size = len(image_bytes) + len(label)
+        self._files.append((stem, size))
+        self._bytes += size
+        self._stats['saved'] += 1
+        self._evict()
+
+    def _evict(self):
+        """Delete the oldest examples until the folder is under its cap."""
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            stem, size = self._files.popleft()
+            for path in (self.images_dir / f"{stem}.jpg", self.labels_dir / f"{stem}.txt"):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._bytes -= size
+            self._stats['evicted'] += 1
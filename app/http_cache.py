@@ -0,0 +1,201 @@
+"""
+HTTP caching helpers for file responses.
+Adds strong ETags, conditional GET (304) and single byte-range (206)
+support on top of Starlette's FileResponse and StaticFiles.
+"""
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+
+# Capture images never change once written
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Files that can be rewritten in place (capture JSON): cache, but revalidate via ETag
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """
+    Strong ETag from file size and modification time.
+
+    Args:
+        stat_result: os.stat() result for the file
+
+    Returns:
+        Quoted ETag string
+    """
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: float) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since.
+    If-None-Match takes precedence when present (RFC 9110 13.2.2).
+
+    Args:
+        request_headers: Request headers
+        etag: Current ETag
+        last_modified: File mtime as a POSIX timestamp
+
+    Returns:
+        True if a 304 should be returned
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison for If-None-Match
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return etag in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range.
+
+    Args:
+        range_header: Range header value
+        size: File size in bytes
+
+    Returns:
+        (start, end) inclusive, or None if the header is not a single
+        satisfiable range. Raises ValueError if it is syntactically a
+        single range but unsatisfiable.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multiple ranges: serving the full entity is allowed
+        return None
+
+    start_s, sep, end_s = spec.strip().partition("-")
+    try:
+        start = int(start_s) if start_s else None
+        end = int(end_s) if end_s else None
+    except ValueError:
+        # Malformed ranges are ignored
+        return None
+    if not sep or (start is None and end is None):
+        return None
+
+    if start is None:
+        # Suffix range: last N bytes
+        if end == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - end), size - 1
+
+    end = size - 1 if end is None else end
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Yield file bytes start..end inclusive in chunks."""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def cached_file_response(
+    path: Path,
+    request_headers: Headers,
+    method: str = "GET",
+    cache_control: Optional[str] = None,
+    stat_result: Optional[os.stat_result] = None
+) -> Response:
+    """
+    File response with validators, conditional GET and range support.
+
+    Args:
+        path: File to serve
+        request_headers: Request headers
+        method: Request method (HEAD omits the body)
+        cache_control: Cache-Control header value
+        stat_result: Precomputed os.stat() result
+
+    Returns:
+        200 FileResponse, 206 partial response, 304 or 416
+    """
+    stat_result = stat_result or os.stat(path)
+    etag = make_etag(stat_result)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "accept-ranges": "bytes"
+    }
+    if cache_control:
+        headers["cache-control"] = cache_control
+
+    if is_not_modified(request_headers, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    # If-Range with a stale validator means: send the whole file
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["last-modified"])):
+        size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+            body = iter(()) if method == "HEAD" else _iter_file_range(path, start, end)
+            return StreamingResponse(
+                body,
+                status_code=206,
+                headers=headers,
+                media_type=mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+            )
+
+    response = FileResponse(path, stat_result=stat_result, method=method)
+    # Replace Starlette's weak md5 etag with the strong one
+    response.headers.update(headers)
+    return response
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with strong ETags, Cache-Control and byte ranges."""
+
+    def __init__(self, *args, cache_control: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            # 404 pages (html mode) are served as-is
+            return super().file_response(full_path, stat_result, scope, status_code)
+        return cached_file_response(
+            Path(full_path),
+            Headers(scope=scope),
+            method=scope["method"],
+            cache_control=self.cache_control,
+            stat_result=stat_result
+        )
@@ -0,0 +1,268 @@
+"""
+Inference worker for the split deployment.
+Loads YOLODetector, registers with the broker and processes jobs until
+stopped; reconnects with backoff if the broker goes away.
+
+Usage:
+    python -m app.inference_worker --broker 127.0.0.1:5555
+    INFERENCE_BROKER_SECRET=... python -m app.inference_worker --broker 10.0.0.5:5555 --model models/best.pt --capacity 2
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app import utils, yolo_infer
+from app.distributed import handshake, parse_address, recv_message, send_message
+
+
+BASE_DIR = Path(__file__).parent.parent
+
+
+def process_job(params: Dict, image_bytes: bytes) -> Tuple[Dict, bytes]:
+    """
+    Run the /detect pipeline for one job.
+
+    Args:
+        params: imgsz, model_name, annotate, tiled, tile_size, tile_overlap,
+            tile_batch_size, roi, cascade (fast_model, uncertain_band, endpoint)
+        image_bytes: Encoded image
+
+    Returns:
+        (result header, annotated JPEG bytes or b'')
+    """
+    try:
+        image_bgr = utils.decode_image_bytes(image_bytes)
+        annotate = params.get('annotate', False)
+        if params.get('tiled'):
+            result = yolo_infer.run_tiled_inference(
+                image_bgr,
+                tile_size=params['tile_size'],
+                overlap=params['tile_overlap'],
+                batch_size=params.get('tile_batch_size', 8),
+                enable_filtering=True,
+                min_green_ratio=0.15,
+                model_name=params.get('model_name'),
+                annotate=annotate
+            )
+        elif params.get('roi'):
+            result = yolo_infer.run_roi_inference(
+                image_bgr,
+                roi_xyxy=params['roi'],
+                max_imgsz=params.get('imgsz', 640),
+                enable_filtering=True,
+                min_green_ratio=0.15,
+                model_name=params.get('model_name'),
+                annotate=annotate
+            )
+        elif params.get('cascade'):
+            cascade = params['cascade']
+            result = yolo_infer.run_cascade_inference(
+                image_bgr,
+                fast_model=cascade['fast_model'],
+                full_model=params.get('model_name'),
+                uncertain_band=tuple(cascade['uncertain_band']),
+                endpoint=cascade['endpoint'],
+                imgsz=params.get('imgsz', 640),
+                enable_filtering=True,
+                min_green_ratio=0.15,
+                annotate=annotate
+            )
+        else:
+            result = yolo_infer.run_inference(
+                image_bgr,
+                imgsz=params.get('imgsz', 640),
+                enable_filtering=True,
+                min_green_ratio=0.15,
+                model_name=params.get('model_name'),
+                annotate=annotate
+            )
+        annotated_jpeg = b''
+        if annotate:
+            annotated_jpeg = utils.encode_image_to_jpeg(result['annotated_image_bgr'], quality=85)
+    except KeyError as e:
+        return {'ok': False, 'status': 404, 'error': str(e)}, b''
+    except ValueError as e:
+        return {'ok': False, 'status': 400, 'error': f"Invalid image: {str(e)}"}, b''
+
+    header = {
+        'ok': True,
+        'detections': result['detections'],
+        'inference_time_ms': result['inference_time_ms'],
+        'filtering_stats': result.get('filtering_stats', {}),
+        'model_name': result['model_name'],
+        'quality_metrics': utils.compute_image_quality_metrics(image_bgr)
+    }
+    if params.get('tiled'):
+        header['tiles'] = result['tiles']
+        header['tiling_stats'] = result['tiling_stats']
+    if 'cascade' in result:
+        header['cascade'] = result['cascade']
+    if 'roi' in result:
+        header['roi'] = result['roi']
+    return header, annotated_jpeg
+
+
+class InferenceWorker:
+    """Broker connection loop: register, heartbeat, run jobs."""
+
+    def __init__(self, host: str, port: int, worker_id: str, capacity: int = 1, heartbeat_interval: float = 2.0,
+                 secret: Optional[str] = None):
+        """
+        Args:
+            host: Broker host
+            port: Broker port
+            worker_id: Unique worker name (kept across reconnects)
+            capacity: Jobs processed concurrently
+            heartbeat_interval: Seconds between heartbeats
+            secret: Shared secret for the broker handshake
+        """
+        self.host = host
+        self.port = port
+        self.worker_id = worker_id
+        self.capacity = capacity
+        self.heartbeat_interval = heartbeat_interval
+        self.secret = secret
+        self._executor = ThreadPoolExecutor(max_workers=capacity, thread_name_prefix='infer')
+        self._stopping = None
+        self._jobs = set()
+
+    def stop(self):
+        """Deregister after in-flight jobs finish."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self):
+        """Serve jobs until stop() is called, reconnecting as needed."""
+        self._stopping = asyncio.Event()
+        backoff = 1.0
+        while not self._stopping.is_set():
+            try:
+                await self._serve()
+                backoff = 1.0
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                print(f"Broker connection failed: {e}; retrying in {backoff:.0f} s")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(backoff * 2, 10.0)
+        self._executor.shutdown(wait=True)
+
+    async def _serve(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        detector = yolo_infer.get_detector()
+        active = next((m['name'] for m in detector.list_models() if m['active']), None)
+        try:
+            await handshake(reader, writer, {
+                'type': 'register',
+                'worker_id': self.worker_id,
+                'capacity': self.capacity,
+                'model_name': active,
+                'class_names': detector.get_class_names() if detector.is_loaded() else {},
+                'host': socket.gethostname(),
+                'pid': os.getpid()
+            }, self.secret)
+        except BaseException:
+            writer.close()
+            raise
+        print(f"Registered with broker {self.host}:{self.port} as {self.worker_id}")
+
+        loop = asyncio.get_running_loop()
+        heartbeat = loop.create_task(self._heartbeat(writer))
+        stop_wait = loop.create_task(self._stopping.wait())
+        try:
+            while True:
+                receive = loop.create_task(recv_message(reader))
+                done, _ = await asyncio.wait({receive, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if stop_wait in done:
+                    receive.cancel()
+                    # Deregister; the broker stops sending jobs and closes once
+                    # the in-flight ones have been answered
+                    await send_message(writer, {'type': 'bye'})
+                    if self._jobs:
+                        await asyncio.wait(self._jobs)
+                    await writer.drain()
+                    return
+                header, payload = receive.result()
+                if header.get('type') == 'job':
+                    task = loop.create_task(self._run_job(writer, header, payload))
+                    self._jobs.add(task)
+                    task.add_done_callback(self._jobs.discard)
+        finally:
+            heartbeat.cancel()
+            stop_wait.cancel()
+            writer.close()
+
+    async def _run_job(self, writer: asyncio.StreamWriter, header: Dict, payload: bytes):
+        loop = asyncio.get_running_loop()
+        try:
+            result, result_payload = await loop.run_in_executor(
+                self._executor, process_job, header.get('params', {}), payload)
+        except Exception as e:
+            print(f"Error in job {header.get('job_id')}: {e}")
+            result, result_payload = {'ok': False, 'status': 500, 'error': f"Detection failed: {str(e)}"}, b''
+        if not writer.is_closing():
+            try:
+                await send_message(writer, {**result, 'type': 'result', 'job_id': header.get('job_id')}, result_payload)
+            except ConnectionError:
+                pass  # The broker requeues jobs of a lost connection
+
+    async def _heartbeat(self, writer: asyncio.StreamWriter):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await send_message(writer, {'type': 'heartbeat', 'inflight': len(self._jobs)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker for the split deployment")
+    parser.add_argument('--broker', default=os.environ.get('INFERENCE_BROKER', '127.0.0.1:5555'),
+                        help='Broker host:port')
+    parser.add_argument('--model', default=str(BASE_DIR / "models" / "best.pt"))
+    parser.add_argument('--conf-threshold', type=float, default=0.35)
+    parser.add_argument('--capacity', type=int, default=1, help='Concurrent jobs')
+    parser.add_argument('--worker-id', default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument('--fast-model', default=os.environ.get('CASCADE_FAST_MODEL'),
+                        help='Fast cascade model weights (needed when the API enables the cascade)')
+    parser.add_argument('--fast-model-name', default='cascade_fast',
+                        help='Registry name the API refers to the fast model by')
+    parser.add_argument('--no-optimize', action='store_true',
+                        default=os.environ.get('MODEL_OPTIMIZE', '1') != '1',
+                        help='Use model.predict() instead of the optimized CPU path')
+    parser.add_argument('--compile', action='store_true', default=os.environ.get('MODEL_COMPILE', '0') == '1',
+                        help='Wrap the network in torch.compile')
+    parser.add_argument('--warmup-imgsz', default='640', help='Comma-separated imgsz to warm up')
+    args = parser.parse_args()
+
+    warmup_imgsz = [int(s) for s in args.warmup_imgsz.split(',') if s.strip()]
+    yolo_infer.initialize_detector(
+        args.model, conf_threshold=args.conf_threshold,
+        optimize=not args.no_optimize, compile_model=args.compile)
+    yolo_infer.warmup_detector(warmup_imgsz)
+    if args.fast_model:
+        yolo_infer.get_detector().load_model(
+            args.fast_model, name=args.fast_model_name, activate=False,
+            optimize=not args.no_optimize, compile_model=args.compile)
+        yolo_infer.warmup_detector(warmup_imgsz, model_name=args.fast_model_name)
+
+    worker = InferenceWorker(*parse_address(args.broker), args.worker_id, capacity=args.capacity,
+                             secret=os.environ.get('INFERENCE_BROKER_SECRET') or None)
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C ends the process without deregistering
+        await worker.run()
+
+    asyncio.run(_run())
+
+
+if __name__ == '__main__':
+    main()
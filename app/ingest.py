@@ -0,0 +1,89 @@
+"""
+Content-hash deduplication for capture uploads.
+
+Clients that queue captures offline retry uploads whose response they
+never saw. Every stored capture records the SHA-256 of the uploaded
+bytes; an upload whose hash is already known returns the existing
+capture instead of running inference again.
+
+The hash -> capture ID map is an append-only text file (one
+"<sha256> <capture_id>" line per capture), so recording a capture is a
+single small append. Entries whose capture was deleted (e.g. by
+retention) are ignored on lookup.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class CaptureDedupIndex:
+    """Persistent SHA-256 -> capture ID map for uploaded captures."""
+
+    def __init__(self, path: Path, captures_dir: Path):
+        """
+        Args:
+            path: Append-only index file
+            captures_dir: Directory holding capture files
+        """
+        self.path = path
+        self.captures_dir = captures_dir
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the index file; build it from capture JSON if it doesn't exist yet."""
+        if not self.path.exists():
+            self._backfill()
+            return
+        index = {}
+        with open(self.path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    index[parts[0]] = parts[1]
+        with self._lock:
+            self._index = index
+
+    def lookup(self, digest: str) -> Optional[str]:
+        """Capture ID stored for this hash, if that capture still exists."""
+        with self._lock:
+            capture_id = self._index.get(digest)
+        if capture_id is None or not (self.captures_dir / f"{capture_id}_data.json").exists():
+            return None
+        return capture_id
+
+    def add(self, digest: str, capture_id: str):
+        with self._lock:
+            self._index[digest] = capture_id
+            with open(self.path, 'a') as f:
+                f.write(f"{digest} {capture_id}\n")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'hashes': len(self._index)}
+
+    def _backfill(self):
+        index = {}
+        for entry in os.scandir(self.captures_dir):
+            if not entry.name.endswith('_data.json'):
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    capture_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if capture_data.get('content_sha256'):
+                index[capture_data['content_sha256']] = capture_data['capture_id']
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            f.writelines(f"{digest} {capture_id}\n" for digest, capture_id in index.items())
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._index = index
@@ -1,19 +1,40 @@
 """
 FastAPI server for plant leaf disease detection.
 """
+import asyncio
+import base64
+import hashlib
+import hmac
+import ipaddress
 import json
 import io
-from datetime import datetime
+import math
+import os
+import time
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import Depends, FastAPI, File, Form, UploadFile, HTTPException, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 
-from app import yolo_infer, feedback, utils
+from app import analytics, distributed, preload, runtime_profile, yolo_infer, feedback, serialization, utils
+from app.admission import AdmissionController, AdmissionRejected
+from app.annotation_cache import AnnotationCache
+from app.broadcast import MJPEG_MEDIA_TYPE, BroadcastHub
+from app.dataset_export import DatasetExporter, select_captures
+from app.hard_examples import HardExampleCollector
+from app.ingest import CaptureDedupIndex, content_hash
+from app.http_cache import (
+    IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, CachedStaticFiles, cached_file_response
+)
+from app.memory_diagnostics import MemoryDiagnostics, MemoryDiagnosticsMiddleware
+from app.profiler import FORMATS, RequestProfiler
+from app.raw_upload import RawBody, RawBodyPool
+from app.retention import CaptureRetention
 
 
 # Initialize FastAPI app
@@ -32,6 +53,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in memory diagnostics (tracemalloc adds overhead; keep off in production)
+MEMORY_DIAGNOSTICS = os.environ.get("MEMORY_DIAGNOSTICS", "0") == "1"
+MEMORY_SNAPSHOT_INTERVAL_S = float(os.environ.get("MEMORY_SNAPSHOT_INTERVAL_S", "60"))
+memory_diagnostics = MemoryDiagnostics(snapshot_interval=MEMORY_SNAPSHOT_INTERVAL_S)
+app.add_middleware(MemoryDiagnosticsMiddleware, diagnostics=memory_diagnostics)
+
+# On-demand profiling of /detect (POST /admin/profile); idle unless a session runs
+request_profiler = RequestProfiler(entry_points=['app.main.detect'])
+
 # Setup paths
 BASE_DIR = Path(__file__).parent.parent
 CAPTURES_DIR = BASE_DIR / "captures"
@@ -39,46 +69,300 @@ MODELS_DIR = BASE_DIR / "models"
 STATIC_DIR = BASE_DIR / "app" / "static"
 TEMPLATES_DIR = BASE_DIR / "app" / "templates"
 
+# CPU profile written by scripts/autotune_cpu.py (threads, workers, imgsz)
+RUNTIME_PROFILE_PATH = Path(os.environ.get("RUNTIME_PROFILE", str(MODELS_DIR / "runtime_profile.json")))
+runtime_settings = runtime_profile.load_profile(RUNTIME_PROFILE_PATH)
+
+# Warmup configuration: every imgsz served by the endpoints gets warmed
+# so the first real request doesn't pay for predictor setup
+DETECT_IMGSZ = int(os.environ.get("DETECT_IMGSZ", runtime_settings.get('imgsz', 640)))
+WARMUP_RUNS = int(os.environ.get("WARMUP_RUNS", "2"))
+# Optimized CPU path (fused, channels-last, preallocated inputs) applied at
+# load time; MODEL_COMPILE additionally tries torch.compile
+MODEL_OPTIMIZE = os.environ.get("MODEL_OPTIMIZE", "1") == "1"
+MODEL_COMPILE = os.environ.get("MODEL_COMPILE", "0") == "1"
+# Load the model at import time so `gunicorn --preload` workers fork with
+# the weights already in memory and share them copy-on-write
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "0") == "1"
+WARMUP_IMGSZ = [
+    int(size) for size in os.environ.get("WARMUP_IMGSZ", str(DETECT_IMGSZ)).split(",") if size.strip()
+]
+
+# Sliced inference defaults for high-resolution field/drone images
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+TILE_BATCH_SIZE = int(os.environ.get("TILE_BATCH_SIZE", "8"))
+
+# Cascade: a small fast model screens frames and only uncertain ones (top
+# confidence inside the band) go to the full model. Captures always use
+# the full model. Bands can be set per endpoint, e.g. CASCADE_BAND_DETECT.
+CASCADE_FAST_MODEL = os.environ.get("CASCADE_FAST_MODEL")
+CASCADE_FAST_NAME = "cascade_fast"
+CASCADE_ENDPOINTS = {
+    name.strip() for name in os.environ.get("CASCADE_ENDPOINTS", "detect,capture").split(",") if name.strip()
+}
+CASCADE_BANDS = {
+    name: tuple(float(v) for v in os.environ.get(
+        f"CASCADE_BAND_{name.upper()}", os.environ.get("CASCADE_BAND", "0.25,0.7")).split(","))
+    for name in CASCADE_ENDPOINTS
+}
+
+# Split deployment: when INFERENCE_BROKER (host:port) is set, this process
+# only accepts uploads and sends inference jobs to workers through the
+# broker (app/inference_worker.py). INFERENCE_BROKER_BIND runs the broker
+# inside this process; with several API workers run it standalone instead.
+INFERENCE_BROKER = os.environ.get("INFERENCE_BROKER")
+INFERENCE_BROKER_BIND = os.environ.get("INFERENCE_BROKER_BIND")
+# Shared secret for the broker handshake; set it on the broker, API and
+# workers whenever the broker listens on a non-loopback address
+INFERENCE_BROKER_SECRET = os.environ.get("INFERENCE_BROKER_SECRET") or None
+INFERENCE_JOB_TIMEOUT_S = float(os.environ.get("INFERENCE_JOB_TIMEOUT_S", "30"))
+broker_client = (
+    distributed.BrokerClient(*distributed.parse_address(INFERENCE_BROKER), timeout=INFERENCE_JOB_TIMEOUT_S,
+                             secret=INFERENCE_BROKER_SECRET)
+    if INFERENCE_BROKER else None
+)
+
+# Admin endpoints require this token in the X-Admin-Token header. Without
+# it they only answer loopback clients (the server binds 0.0.0.0)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Rendered annotated captures are cached here up to this many bytes
+ANNOTATED_CACHE_DIR = CAPTURES_DIR / ".annotated_cache"
+ANNOTATED_CACHE_MAX_MB = int(os.environ.get("ANNOTATED_CACHE_MAX_MB", "256"))
+
 # Ensure directories exist
 utils.ensure_dir(CAPTURES_DIR)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+annotation_cache = AnnotationCache(
+    CAPTURES_DIR, ANNOTATED_CACHE_DIR, ANNOTATED_CACHE_MAX_MB * 2**20)
+
+# Bulk capture ingest (offline queue in app.js): uploads per request and
+# images per predict call; retried uploads are deduplicated by SHA-256
+INGEST_MAX_BATCH = int(os.environ.get("INGEST_MAX_BATCH", "16"))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "8"))
+capture_dedup = CaptureDedupIndex(CAPTURES_DIR / ".content_hashes.txt", CAPTURES_DIR)
+
+# Raw image/jpeg bodies on /detect and /capture (instead of multipart) are
+# read into pooled buffers and decoded in place; larger bodies get 413
+RAW_UPLOAD_MAX_MB = float(os.environ.get("RAW_UPLOAD_MAX_MB", "10"))
+RAW_UPLOAD_BUFFERS = int(os.environ.get("RAW_UPLOAD_BUFFERS", "4"))
+raw_uploads = RawBodyPool(int(RAW_UPLOAD_MAX_MB * 2**20), RAW_UPLOAD_BUFFERS)
+
+# Capture retention: quota, maximum age and recompression of old
+# originals, applied by a background task (all off by default)
+CAPTURE_QUOTA_MB = int(os.environ.get("CAPTURE_QUOTA_MB", "0"))
+CAPTURE_MAX_AGE_DAYS = float(os.environ.get("CAPTURE_MAX_AGE_DAYS", "0"))
+CAPTURE_POSITIVE_MAX_AGE_DAYS = os.environ.get("CAPTURE_POSITIVE_MAX_AGE_DAYS")
+CAPTURE_KEEP_POSITIVE = os.environ.get("CAPTURE_KEEP_POSITIVE", "1") == "1"
+CAPTURE_RECOMPRESS_AFTER_DAYS = float(os.environ.get("CAPTURE_RECOMPRESS_AFTER_DAYS", "0"))
+CAPTURE_RECOMPRESS_QUALITY = int(os.environ.get("CAPTURE_RECOMPRESS_QUALITY", "80"))
+CAPTURE_RECOMPRESS_FORMAT = os.environ.get("CAPTURE_RECOMPRESS_FORMAT", "jpeg")
+RETENTION_INTERVAL_S = float(os.environ.get("RETENTION_INTERVAL_S", "600"))
+capture_retention = CaptureRetention(
+    CAPTURES_DIR,
+    CAPTURES_DIR / ".retention.json",
+    max_bytes=CAPTURE_QUOTA_MB * 2**20,
+    max_age_days=CAPTURE_MAX_AGE_DAYS,
+    positive_max_age_days=float(CAPTURE_POSITIVE_MAX_AGE_DAYS) if CAPTURE_POSITIVE_MAX_AGE_DAYS else None,
+    keep_positive=CAPTURE_KEEP_POSITIVE,
+    recompress_after_days=CAPTURE_RECOMPRESS_AFTER_DAYS,
+    recompress_quality=CAPTURE_RECOMPRESS_QUALITY,
+    recompress_format=CAPTURE_RECOMPRESS_FORMAT,
+    interval_s=RETENTION_INTERVAL_S,
+    on_delete=annotation_cache.invalidate
+) if CAPTURE_QUOTA_MB or CAPTURE_MAX_AGE_DAYS or CAPTURE_RECOMPRESS_AFTER_DAYS else None
+
+# Per-client admission control for /detect
+ADMISSION_RATE_FPS = float(os.environ.get("ADMISSION_RATE_FPS", "10"))
+ADMISSION_BURST = float(os.environ.get("ADMISSION_BURST", "20"))
+INFERENCE_SLOTS = int(os.environ.get("INFERENCE_SLOTS", "1"))
+# X-Client-Id values (browser tabs) honoured per host before they share one client
+ADMISSION_MAX_TABS_PER_HOST = int(os.environ.get("ADMISSION_MAX_TABS_PER_HOST", "4"))
+admission = AdmissionController(ADMISSION_RATE_FPS, ADMISSION_BURST, slots=INFERENCE_SLOTS,
+                                max_clients_per_host=ADMISSION_MAX_TABS_PER_HOST)
+
+# Hard-example collection: unique live frames whose top confidence is in
+# the band are saved (with predicted boxes) for retraining
+HARD_EXAMPLES = os.environ.get("HARD_EXAMPLES", "0") == "1"
+HARD_EXAMPLES_DIR = Path(os.environ.get("HARD_EXAMPLES_DIR", str(BASE_DIR / "hard_examples")))
+HARD_EXAMPLE_BAND = tuple(float(v) for v in os.environ.get("HARD_EXAMPLE_BAND", "0.35,0.6").split(","))
+HARD_EXAMPLE_MAX_MB = int(os.environ.get("HARD_EXAMPLE_MAX_MB", "2048"))
+HARD_EXAMPLE_HASH_DISTANCE = int(os.environ.get("HARD_EXAMPLE_HASH_DISTANCE", "6"))
+hard_examples = HardExampleCollector(
+    HARD_EXAMPLES_DIR,
+    band=HARD_EXAMPLE_BAND,
+    max_bytes=HARD_EXAMPLE_MAX_MB * 2**20,
+    max_distance=HARD_EXAMPLE_HASH_DISTANCE
+) if HARD_EXAMPLES else None
+
+# Live broadcast: a camera running /detect?broadcast=<channel> is fanned
+# out to many viewers; slow viewers drop frames beyond their buffer
+BROADCAST_VIEWER_BUFFER = int(os.environ.get("BROADCAST_VIEWER_BUFFER", "2"))
+BROADCAST_MAX_VIEWERS = int(os.environ.get("BROADCAST_MAX_VIEWERS", "32"))
+BROADCAST_MAX_CHANNELS = int(os.environ.get("BROADCAST_MAX_CHANNELS", "16"))
+broadcast_hub = BroadcastHub(
+    buffer_size=BROADCAST_VIEWER_BUFFER,
+    max_viewers=BROADCAST_MAX_VIEWERS,
+    max_channels=BROADCAST_MAX_CHANNELS
+)
+
+# Rollup counters for /analytics, updated by /capture
+analytics_store = analytics.AnalyticsStore(CAPTURES_DIR / ".analytics.json")
+
+# Mount static files; assets aren't versioned, so clients revalidate via ETag
+STATIC_CACHE_CONTROL = os.environ.get("STATIC_CACHE_CONTROL", "public, no-cache")
+app.mount(
+    "/static",
+    CachedStaticFiles(directory=str(STATIC_DIR), cache_control=STATIC_CACHE_CONTROL),
+    name="static"
+)
 
 # Setup templates
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
-# Store last inference result for capture functionality
+# Store last inference result for capture functionality.
+# Only metadata is kept; holding frames here pinned two full-resolution
+# arrays per process between requests.
 last_inference_result = {
     'detections': [],
-    'annotated_image_bgr': None,
-    'original_image_bgr': None,
     'quality_metrics': {},
     'timestamp': None
 }
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize YOLO model on startup."""
+def _load_and_warmup(apply_threads: bool = True):
+    """
+    Load model weights and warm up, logging a startup-time breakdown.
+
+    Args:
+        apply_threads: Apply the runtime profile's thread counts first
+            (preload mode applies them in each worker instead)
+    """
     model_path = MODELS_DIR / "best.pt"
 
     if not model_path.exists():
         print(f"WARNING: Model file not found at {model_path}")
         print("Please train a model or place best.pt in the models/ directory")
         print("The server will start but detection will fail until model is available")
+        return
+
+    try:
+        timings = {}
+
+        start = time.perf_counter()
+        import ultralytics  # noqa: F401  (timed separately from weight loading)
+        timings['import_ultralytics'] = (time.perf_counter() - start) * 1000
+
+        if runtime_settings and apply_threads:
+            threads = runtime_profile.apply_threads(
+                runtime_settings['torch_threads'], runtime_settings['cv2_threads'])
+            print(f"Runtime profile {RUNTIME_PROFILE_PATH.name}: imgsz {DETECT_IMGSZ}, "
+                  f"torch threads {threads['torch_threads']}, cv2 threads {threads['cv2_threads']} "
+                  f"(tuned for {runtime_settings['workers']} uvicorn worker(s))")
+
+        # Initialize with conf_threshold=0.35 for reduced false positives
+        start = time.perf_counter()
+        yolo_infer.initialize_detector(
+            str(model_path), conf_threshold=0.35, optimize=MODEL_OPTIMIZE, compile_model=MODEL_COMPILE)
+        timings['load_weights'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        feedback.build_suggestion_index(yolo_infer.detector.get_class_names())
+        timings['feedback_index'] = (time.perf_counter() - start) * 1000
+        print("YOLO model loaded successfully")
+        print(
+            f"Available classes: {yolo_infer.detector.get_class_names()}")
+        print("Green detection filtering enabled by default")
+
+        warmup_timings = yolo_infer.warmup_detector(WARMUP_IMGSZ, WARMUP_RUNS)
+        for imgsz, ms in warmup_timings.items():
+            timings[f'warmup_{imgsz}'] = ms
+
+        if CASCADE_FAST_MODEL:
+            start = time.perf_counter()
+            yolo_infer.detector.load_model(
+                CASCADE_FAST_MODEL, name=CASCADE_FAST_NAME, activate=False,
+                optimize=MODEL_OPTIMIZE, compile_model=MODEL_COMPILE)
+            yolo_infer.warmup_detector(WARMUP_IMGSZ, WARMUP_RUNS, model_name=CASCADE_FAST_NAME)
+            timings['cascade_fast_model'] = (time.perf_counter() - start) * 1000
+            print(f"Cascade enabled for {sorted(CASCADE_ENDPOINTS)} with fast model {CASCADE_FAST_MODEL}")
+
+        print("Startup time breakdown:")
+        for stage, ms in timings.items():
+            print(f"  {stage:<20} {ms:9.1f} ms")
+        print(f"  {'total':<20} {sum(timings.values()):9.1f} ms")
+        print(f"Model ready (warmup: {WARMUP_RUNS} run(s) at imgsz {WARMUP_IMGSZ})")
+    except Exception as e:
+        print(f"ERROR loading model: {e}")
+        print("Server will start but detection will fail")
+
+
+# Preload mode: runs once in the gunicorn master, before workers fork
+if MODEL_PRELOAD and broker_client is None:
+    preload_state = preload.preload_model(lambda: _load_and_warmup(apply_threads=False))
+    if yolo_infer.detector.is_loaded():
+        print(f"Model preloaded in {preload_state['load_ms']:.0f} ms; forked workers share its weights")
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Load and warm up YOLO model in the background so the server starts fast."""
+    if MEMORY_DIAGNOSTICS:
+        memory_diagnostics.start()
+
+    loop = asyncio.get_event_loop()
+    if INFERENCE_BROKER_BIND:
+        app.state.broker = distributed.InferenceBroker(secret=INFERENCE_BROKER_SECRET)
+        await app.state.broker.start(*distributed.parse_address(INFERENCE_BROKER_BIND))
+    if broker_client is None and preload.is_preloaded():
+        # Forked from the preloading master: only thread counts are per worker
+        preload.after_fork(runtime_settings.get('torch_threads', 0))
+        if runtime_settings:
+            runtime_profile.apply_threads(0, runtime_settings['cv2_threads'])
+    elif broker_client is None:
+        app.state.model_loader = loop.run_in_executor(None, _load_and_warmup)
     else:
-        try:
-            # Initialize with conf_threshold=0.35 for reduced false positives
-            yolo_infer.initialize_detector(
-                str(model_path), conf_threshold=0.35)
-            print("YOLO model loaded successfully")
-            print(
-                f"Available classes: {yolo_infer.detector.get_class_names()}")
-            print("Green detection filtering enabled by default")
-        except Exception as e:
-            print(f"ERROR loading model: {e}")
-            print("Server will start but detection will fail")
+        print(f"Split mode: inference jobs go to broker {INFERENCE_BROKER}")
+
+    if hard_examples is not None:
+        await run_in_threadpool(hard_examples.start)
+    if capture_retention is not None:
+        await run_in_threadpool(capture_retention.start)
+    await run_in_threadpool(capture_dedup.load)
+
+    # One-time backfill of analytics rollups from existing captures; with
+    # several workers only the one that gets the backfill lock runs it
+    if not analytics_store.exists():
+        app.state.analytics_backfill = loop.run_in_executor(None, _backfill_analytics)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """End broadcast streams, close broker connections (split mode), flush hard examples, save the retention index."""
+    broadcast_hub.close()
+    if hard_examples is not None:
+        await run_in_threadpool(hard_examples.stop)
+    if capture_retention is not None:
+        await run_in_threadpool(capture_retention.stop)
+    if broker_client is not None:
+        await broker_client.close()
+    if getattr(app.state, 'broker', None) is not None:
+        await app.state.broker.close()
+
+
+def _backfill_analytics():
+    """Build analytics rollups from existing capture files."""
+    try:
+        start = time.perf_counter()
+        summary = analytics_store.backfill(CAPTURES_DIR, only_if_missing=True)
+        if summary is None:
+            print("Analytics backfill: done or running in another worker, skipped")
+            return
+        print(f"Analytics backfill: {summary['files_scanned']} capture(s) "
+              f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"ERROR in analytics backfill: {e}")
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -106,79 +390,367 @@ async def gallery(request: Request):
     )
 
 
+def _require_admin(request: Request):
+    """
+    Reject admin requests without the configured token. With no token
+    configured, only requests from this machine are allowed.
+    """
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode()):
+            raise HTTPException(status_code=403, detail="Admin token required")
+        return
+    try:
+        local = request.client is not None and ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        local = False
+    if not local:
+        raise HTTPException(status_code=403, detail="Admin endpoints need ADMIN_TOKEN for non-local clients")
+
+
+async def _remote_inference(image_bytes: bytes, annotate: bool = False, **params):
+    """
+    Run inference on a worker through the broker (split mode).
+
+    Args:
+        image_bytes: Encoded image as uploaded (bytes or a pooled-buffer view)
+        annotate: Also return the annotated JPEG
+        **params: model_name, tiled, tile_size, tile_overlap, roi, cascade
+
+    Returns:
+        (inference result with quality_metrics, annotated JPEG or None)
+    """
+    job = {
+        'imgsz': DETECT_IMGSZ,
+        'annotate': annotate,
+        'tile_batch_size': TILE_BATCH_SIZE,
+        **params
+    }
+    try:
+        # The transport may still hold unsent data after a timeout or
+        # disconnect, when the pooled buffer is already reused: send a copy
+        # (no-op for bytes)
+        result, annotated_jpeg = await broker_client.submit(job, bytes(image_bytes))
+    except distributed.RemoteInferenceError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    except (OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=503, detail=f"Inference workers unavailable: {e or 'timeout'}")
+    if 'cascade' in result:
+        yolo_infer.detector.record_cascade_result(params['cascade']['endpoint'], result['cascade'])
+    return result, (annotated_jpeg or None)
+
+
+def _use_cascade(endpoint: str, requested: Optional[bool] = None) -> bool:
+    """Whether an endpoint screens with the fast model (per-request override for /detect)."""
+    if requested and not CASCADE_FAST_MODEL:
+        raise HTTPException(status_code=400, detail="Cascade not configured (CASCADE_FAST_MODEL unset)")
+    if requested is not None:
+        return requested
+    return bool(CASCADE_FAST_MODEL) and endpoint in CASCADE_ENDPOINTS
+
+
+def _cascade_params(endpoint: str) -> dict:
+    """Cascade arguments for an endpoint."""
+    return {
+        'fast_model': CASCADE_FAST_NAME,
+        'uncertain_band': CASCADE_BANDS.get(endpoint, (0.25, 0.7)),
+        'endpoint': endpoint
+    }
+
+
+async def _raw_body(request: Request):
+    """
+    Raw image body in a pooled buffer, held until the response is sent
+    (None for multipart uploads).
+    """
+    if not raw_uploads.accepts(request.headers.get('content-type')):
+        yield None
+        return
+    try:
+        body = await raw_uploads.read(request)
+    except OverflowError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        yield body
+    finally:
+        raw_uploads.release(body)
+
+
+async def _upload_bytes(file: Optional[UploadFile], raw_body: Optional[RawBody]):
+    """Uploaded image: a zero-copy view of the raw body, or the multipart file's bytes."""
+    if raw_body is not None:
+        return raw_body.data
+    if file is None:
+        raise HTTPException(status_code=400, detail="Send the image as multipart 'file' or as an image/jpeg body")
+    return await file.read()
+
+
+def _client_host(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _client_id(request: Request) -> str:
+    """Admission key: client address plus optional X-Client-Id (one per browser tab)."""
+    host = _client_host(request)
+    tab_id = request.headers.get("X-Client-Id")
+    return f"{host}/{tab_id[:64]}" if tab_id else host
+
+
 @app.post("/detect")
-async def detect(file: UploadFile = File(...)):
+async def detect(
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    raw_body: Optional[RawBody] = Depends(_raw_body),
+    model: Optional[str] = None,
+    full_feedback: bool = False,
+    fields: Optional[str] = None,
+    encoding: Optional[str] = None,
+    tiled: bool = False,
+    tile_size: Optional[int] = None,
+    tile_overlap: Optional[float] = None,
+    cascade: Optional[bool] = None,
+    broadcast: Optional[str] = None,
+    roi: Optional[str] = None
+):
     """
     Detect plant diseases in uploaded image.
 
     Args:
-        file: Uploaded image file
+        file: Uploaded image file (multipart)
+        raw_body: Image sent as the request body (Content-Type image/jpeg),
+            decoded from a pooled buffer without multipart parsing
+        model: Registry name of model to use (default: active model)
+        full_feedback: Inline disclaimer and per-class suggestions instead of
+            referencing them by ID (see /feedback/static)
+        fields: Comma-separated fields to return, dotted for nested keys
+            (e.g. "detections,feedback.summary"); default returns all
+        encoding: "json" or "msgpack" (also negotiated via Accept header).
+            MessagePack responses carry the image as raw bytes in
+            'annotated_jpeg' instead of base64.
+        tiled: Run sliced inference on overlapping tiles at native
+            resolution (for images much larger than the model input)
+        tile_size: Tile edge length (default: TILE_SIZE)
+        tile_overlap: Tile overlap fraction (default: TILE_OVERLAP)
+        cascade: Screen with the fast model first (default: on if
+            CASCADE_FAST_MODEL is set and "detect" is in CASCADE_ENDPOINTS)
+        broadcast: Also publish the annotated frame to viewers of this
+            channel (/broadcast/{channel}/mjpeg or /ws)
+        roi: Region "x1,y1,x2,y2" in image pixels to re-run at native
+            resolution (tap-to-zoom); boxes are returned in full-image
+            coordinates and the annotated image shows the region only
 
     Returns:
-        JSON with detections, feedback, and annotated image
+        JSON or MessagePack with detections, feedback, and annotated image
     """
     try:
-        # Check if model is loaded
-        if not yolo_infer.detector.is_loaded():
+        selected = serialization.parse_fields(fields)
+        try:
+            response_encoding = serialization.negotiate_encoding(
+                encoding, request.headers.get('accept'))
+        except ValueError as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        if selected is not None and response_encoding == 'msgpack' and 'annotated_jpeg_base64' in selected:
+            # Binary encodings carry the image as raw bytes under its own key
+            selected.add('annotated_jpeg')
+
+        # Check if model is loaded (split mode: workers own the model)
+        if broker_client is None and not yolo_infer.detector.is_loaded():
             raise HTTPException(
                 status_code=503,
                 detail="Model not loaded. Please ensure best.pt is in models/ directory and restart server."
             )
 
-        # Read and decode image
-        image_bytes = await file.read()
-        image_bgr = utils.decode_image_bytes(image_bytes)
+        if broadcast is not None:
+            try:
+                BroadcastHub.validate_name(broadcast)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
 
-        # Run inference with green detection filtering enabled
-        inference_result = yolo_infer.run_inference(
-            image_bgr,
-            imgsz=640,
-            enable_filtering=True,
-            min_green_ratio=0.15
-        )
+        if tiled:
+            tile_size = tile_size or TILE_SIZE
+            tile_overlap = TILE_OVERLAP if tile_overlap is None else tile_overlap
+            if tile_size < 32 or not 0 <= tile_overlap < 0.9:
+                raise HTTPException(status_code=400, detail="Invalid tile_size or tile_overlap")
+        roi_xyxy = None
+        if roi is not None:
+            try:
+                roi_xyxy = [float(v) for v in roi.split(',')]
+            except ValueError:
+                roi_xyxy = []
+            if len(roi_xyxy) != 4 or roi_xyxy[2] <= roi_xyxy[0] or roi_xyxy[3] <= roi_xyxy[1] or tiled:
+                raise HTTPException(status_code=400, detail="roi must be x1,y1,x2,y2 (not combined with tiled)")
+        want_image = (serialization.wants_field(selected, 'annotated_jpeg_base64') or
+                      serialization.wants_field(selected, 'annotated_jpeg'))
+        # An explicit region is always checked with the full model
+        use_cascade = _use_cascade('detect', cascade) and not tiled and roi_xyxy is None
 
-        # Compute quality metrics
-        quality_metrics = utils.compute_image_quality_metrics(image_bgr)
+        # Admission: per-client rate limit, latest frame wins, fair turns.
+        # Inference runs off the event loop so newer frames can replace
+        # queued ones while a slot is busy.
+        async with admission.slot(_client_id(request), _client_host(request)):
+            if broker_client is not None:
+                # Split mode: a worker decodes, infers, measures quality and
+                # encodes the annotated image
+                image_bytes = await _upload_bytes(file, raw_body)
+                image_bgr = None
+                with memory_diagnostics.stage('remote_inference'):
+                    inference_result, annotated_jpeg = await _remote_inference(
+                        image_bytes,
+                        model_name=model,
+                        annotate=want_image or broadcast is not None,
+                        tiled=tiled,
+                        tile_size=tile_size,
+                        tile_overlap=tile_overlap,
+                        roi=roi_xyxy,
+                        cascade=_cascade_params('detect') if use_cascade else None
+                    )
+                quality_metrics = inference_result['quality_metrics']
+            else:
+                # Read and decode image
+                with memory_diagnostics.stage('decode'):
+                    image_bytes = await _upload_bytes(file, raw_body)
+                    image_bgr = utils.decode_image_bytes(image_bytes)
 
-        # Generate feedback
-        feedback_result = feedback.generate_feedback(
-            detections=inference_result['detections'],
-            quality_metrics=quality_metrics,
-            image_width=image_bgr.shape[1],
-            image_height=image_bgr.shape[0]
-        )
+                # Run inference with green detection filtering enabled
+                with memory_diagnostics.stage('inference'):
+                    if tiled:
+                        inference_result = await run_in_threadpool(
+                            request_profiler.wrap(yolo_infer.run_tiled_inference),
+                            image_bgr,
+                            tile_size=tile_size,
+                            overlap=tile_overlap,
+                            batch_size=TILE_BATCH_SIZE,
+                            enable_filtering=True,
+                            min_green_ratio=0.15,
+                            model_name=model,
+                            annotate=want_image or broadcast is not None
+                        )
+                    elif roi_xyxy is not None:
+                        inference_result = await run_in_threadpool(
+                            request_profiler.wrap(yolo_infer.run_roi_inference),
+                            image_bgr,
+                            roi_xyxy=roi_xyxy,
+                            max_imgsz=DETECT_IMGSZ,
+                            enable_filtering=True,
+                            min_green_ratio=0.15,
+                            model_name=model
+                        )
+                    elif use_cascade:
+                        inference_result = await run_in_threadpool(
+                            request_profiler.wrap(yolo_infer.run_cascade_inference),
+                            image_bgr,
+                            imgsz=DETECT_IMGSZ,
+                            enable_filtering=True,
+                            min_green_ratio=0.15,
+                            full_model=model,
+                            **_cascade_params('detect')
+                        )
+                    else:
+                        inference_result = await run_in_threadpool(
+                            request_profiler.wrap(yolo_infer.run_inference),
+                            image_bgr,
+                            imgsz=DETECT_IMGSZ,
+                            enable_filtering=True,
+                            min_green_ratio=0.15,
+                            model_name=model
+                        )
 
-        # Convert annotated image to base64 JPEG
-        annotated_base64 = utils.image_to_base64_jpeg(
-            inference_result['annotated_image_bgr'],
-            quality=85
-        )
+                # Compute quality metrics
+                with memory_diagnostics.stage('quality'):
+                    quality_metrics = utils.compute_image_quality_metrics(image_bgr)
 
-        # Store for potential capture
-        global last_inference_result
-        last_inference_result = {
-            'detections': inference_result['detections'],
-            'annotated_image_bgr': inference_result['annotated_image_bgr'],
-            'original_image_bgr': image_bgr,
-            'quality_metrics': quality_metrics,
-            'feedback': feedback_result,
-            'timestamp': datetime.now().isoformat()
-        }
+                # Encode annotated image only if the client or a broadcast needs it
+                annotated_jpeg = None
+                if want_image or broadcast is not None:
+                    with memory_diagnostics.stage('encode_jpeg'):
+                        annotated_jpeg = utils.encode_image_to_jpeg(
+                            inference_result['annotated_image_bgr'],
+                            quality=85
+                        )
 
-        # Build response with filtering statistics
-        response = {
-            'success': True,
-            'detections': inference_result['detections'],
-            'feedback': feedback_result,
-            'annotated_jpeg_base64': annotated_base64,
-            'inference_time_ms': inference_result['inference_time_ms'],
-            'quality_metrics': quality_metrics,
-            'filtering_stats': inference_result.get('filtering_stats', {}),
-            'timestamp': datetime.now().isoformat()
-        }
+            # Generate feedback; static text is referenced by ID for the live loop
+            feedback_result = feedback.generate_feedback(
+                detections=inference_result['detections'],
+                quality_metrics=quality_metrics,
+                image_width=quality_metrics['width'],
+                image_height=quality_metrics['height'],
+                compact=not full_feedback
+            )
+
+            if broadcast is not None and annotated_jpeg is not None:
+                # Encoded once here; every viewer gets the same bytes
+                try:
+                    broadcast_hub.publish(broadcast, annotated_jpeg, {
+                        'detections': [
+                            {k: d[k] for k in ('class_name', 'confidence', 'bbox_xyxy')}
+                            for d in inference_result['detections']
+                        ],
+                        'inference_time_ms': inference_result['inference_time_ms'],
+                        'model_name': inference_result['model_name']
+                    })
+                except OverflowError as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+
+            if hard_examples is not None:
+                # Band check and queue put only; hashing and writing run in the background
+                hard_examples.submit(
+                    inference_result.get('raw_detections', inference_result['detections']),
+                    image_bytes, image_bgr)
+
+            # Store for potential capture
+            global last_inference_result
+            last_inference_result = {
+                'detections': inference_result['detections'],
+                'quality_metrics': quality_metrics,
+                'feedback': feedback_result,
+                'timestamp': datetime.now().isoformat()
+            }
 
-        return JSONResponse(content=response)
+            # Build response with filtering statistics
+            response = {
+                'success': True,
+                'detections': inference_result['detections'],
+                'feedback': feedback_result,
+                'inference_time_ms': inference_result['inference_time_ms'],
+                'quality_metrics': quality_metrics,
+                'filtering_stats': inference_result.get('filtering_stats', {}),
+                'model_name': inference_result['model_name'],
+                'timestamp': datetime.now().isoformat()
+            }
+            if tiled:
+                response['tiles'] = inference_result['tiles']
+                response['tiling_stats'] = inference_result['tiling_stats']
+            if 'cascade' in inference_result:
+                response['cascade'] = inference_result['cascade']
+            if 'roi' in inference_result:
+                response['roi'] = inference_result['roi']
+            if annotated_jpeg is not None and want_image:
+                if response_encoding == 'msgpack':
+                    response['annotated_jpeg'] = annotated_jpeg
+                else:
+                    response['annotated_jpeg_base64'] = base64.b64encode(
+                        annotated_jpeg).decode('utf-8')
+            response = serialization.select_fields(response, selected)
 
+            with memory_diagnostics.stage('serialize'):
+                content = serialization.encode(response, response_encoding)
+            request_profiler.request_completed()
+            return Response(
+                content=content,
+                media_type=serialization.media_type(response_encoding)
+            )
+
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Frame {e.reason}",
+            headers={'Retry-After': str(max(1, math.ceil(e.retry_after)))}
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
     except Exception as e:
@@ -187,116 +759,789 @@ async def detect(file: UploadFile = File(...)):
             status_code=500, detail=f"Detection failed: {str(e)}")
 
 
+@app.get("/broadcast")
+async def broadcast_channels():
+    """Broadcast channels with viewer counts and per-viewer drop totals."""
+    return {'channels': broadcast_hub.stats()}
+
+
+@app.get("/broadcast/{channel}/mjpeg")
+async def broadcast_mjpeg(channel: str):
+    """
+    Annotated frames of a channel as multipart/x-mixed-replace (works
+    directly in an <img> tag or a browser tab).
+    """
+    try:
+        viewer = broadcast_hub.subscribe(channel)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def stream():
+        try:
+            while True:
+                frame = await viewer.next_frame()
+                if frame is None:
+                    return
+                yield frame.mjpeg_part
+        finally:
+            broadcast_hub.unsubscribe(channel, viewer)
+
+    return StreamingResponse(stream(), media_type=MJPEG_MEDIA_TYPE, headers={'Cache-Control': 'no-store'})
+
+
+@app.websocket("/broadcast/{channel}/ws")
+async def broadcast_websocket(websocket: WebSocket, channel: str):
+    """
+    Annotated frames of a channel over WebSocket: a JSON text message
+    (seq, detections, timing) followed by the JPEG as a binary message.
+    """
+    try:
+        viewer = broadcast_hub.subscribe(channel)
+    except (ValueError, OverflowError):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def send_frames():
+        while True:
+            frame = await viewer.next_frame()
+            if frame is None:
+                return
+            await websocket.send_text(frame.meta_json)
+            await websocket.send_bytes(frame.jpeg)
+
+    sender = asyncio.create_task(send_frames())
+    try:
+        # Viewers don't send anything; receiving only notices disconnects
+        while True:
+            receiver = asyncio.ensure_future(websocket.receive())
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                receiver.cancel()
+                if sender.exception() is None:
+                    await websocket.close()
+                break
+            if receiver.result()['type'] == 'websocket.disconnect':
+                break
+    finally:
+        sender.cancel()
+        broadcast_hub.unsubscribe(channel, viewer)
+
+
+def _store_capture(
+    original_image_bgr,
+    inference_result: Dict,
+    quality_metrics: Dict,
+    feedback_result: Dict,
+    digest: str,
+    timestamp: Optional[datetime] = None
+) -> Dict:
+    """
+    Write a capture's original image and JSON, then update analytics,
+    retention and the content-hash index.
+
+    Args:
+        original_image_bgr: Decoded original image
+        inference_result: Result of inference on the original
+        quality_metrics: Image quality metrics
+        feedback_result: Generated feedback
+        digest: SHA-256 of the uploaded bytes
+        timestamp: When the capture was taken (default: now)
+
+    Returns:
+        Capture data as saved to JSON
+    """
+    # Generate timestamp-based filenames (unique even within one batch)
+    capture_id = utils.generate_timestamp_filename("capture", "")
+    while (CAPTURES_DIR / f"{capture_id}_data.json").exists():
+        capture_id = utils.generate_timestamp_filename("capture", "")
+
+    original_filename = f"{capture_id}_original.jpg"
+    annotated_filename = f"{capture_id}_detected.jpg"
+    data_filename = f"{capture_id}_data.json"
+
+    original_path = CAPTURES_DIR / original_filename
+    data_path = CAPTURES_DIR / data_filename
+
+    # Save original image
+    original_jpeg = utils.encode_image_to_jpeg(
+        original_image_bgr, quality=95)
+    with open(original_path, 'wb') as f:
+        f.write(original_jpeg)
+
+    # Save JSON data; annotated_image is rendered from it on first request
+    capture_data = {
+        'capture_id': capture_id,
+        'timestamp': (timestamp or datetime.now()).isoformat(),
+        'original_image': original_filename,
+        'annotated_image': annotated_filename,
+        'detections': inference_result['detections'],
+        'quality_metrics': quality_metrics,
+        'feedback': feedback_result,
+        'inference_time_ms': inference_result['inference_time_ms'],
+        'model_name': inference_result['model_name'],
+        'content_sha256': digest
+    }
+    if timestamp is not None:
+        capture_data['uploaded_at'] = datetime.now().isoformat()
+
+    with open(data_path, 'w') as f:
+        json.dump(capture_data, f, indent=2)
+
+    analytics_store.record_capture(capture_data)
+    if capture_retention is not None:
+        capture_retention.record_capture(capture_id, capture_data['detections'])
+    capture_dedup.add(digest, capture_id)
+    return capture_data
+
+
+# Digests of captures being inferred/stored right now -> future of their
+# capture ID, so concurrent retries of the same bytes store only once
+_captures_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def _try_claim_capture(digest: str):
+    """
+    (existing capture ID, None), (None, future of an in-flight upload of
+    the same bytes), or (None, None) once this request owns the digest and
+    must call _release_capture.
+    """
+    existing = capture_dedup.lookup(digest)
+    if existing is not None:
+        return existing, None
+    pending = _captures_in_flight.get(digest)
+    if pending is None:
+        _captures_in_flight[digest] = asyncio.get_running_loop().create_future()
+    return None, pending
+
+
+async def _claim_capture(digest: str) -> Optional[str]:
+    """
+    Existing capture ID for these bytes, waiting for an in-flight upload of
+    the same bytes to finish; or None once this request owns the digest.
+    """
+    while True:
+        existing, pending = _try_claim_capture(digest)
+        if pending is None:
+            return existing
+        # None means the other upload failed: try again (and maybe claim it)
+        capture_id = await asyncio.shield(pending)
+        if capture_id is not None:
+            return capture_id
+
+
+def _release_capture(digest: str, capture_id: Optional[str]):
+    """Publish the outcome of a claimed digest to requests waiting on it."""
+    pending = _captures_in_flight.pop(digest, None)
+    if pending is not None and not pending.done():
+        pending.set_result(capture_id)
+
+
+def _infer_capture(original_image_bgr, model: Optional[str]):
+    """Full-model inference and quality metrics for one capture (local mode)."""
+    inference_result = yolo_infer.run_inference(
+        original_image_bgr,
+        imgsz=DETECT_IMGSZ,
+        enable_filtering=True,
+        min_green_ratio=0.15,
+        model_name=model,
+        annotate=False
+    )
+    if _use_cascade('capture'):
+        # Captures always get the full model; count them as escalations
+        yolo_infer.detector.record_cascade_result(
+            'capture', {'escalated': True, 'reason': 'forced'})
+    return inference_result, utils.compute_image_quality_metrics(original_image_bgr)
+
+
+def _capture_files(capture_id: str) -> Dict:
+    """File names of a capture; retention may have replaced the original with a recompressed file."""
+    original = f"{capture_id}_original.jpg"
+    try:
+        with open(CAPTURES_DIR / f"{capture_id}_data.json", 'r') as f:
+            original = json.load(f).get('original_image', original)
+    except (OSError, ValueError):
+        pass
+    return {
+        'original': original,
+        'annotated': f"{capture_id}_detected.jpg",
+        'data': f"{capture_id}_data.json"
+    }
+
+
 @app.post("/capture")
-async def capture(file: UploadFile = File(...)):
+async def capture(
+    file: Optional[UploadFile] = File(None),
+    raw_body: Optional[RawBody] = Depends(_raw_body),
+    model: Optional[str] = None
+):
     """
     Capture and save current detection results.
 
     Args:
-        file: Original image file
+        file: Original image file (multipart)
+        raw_body: Original image sent as the request body (image/jpeg)
+        model: Registry name of model to use (default: active model)
 
     Returns:
         JSON with saved file paths and capture ID
     """
     try:
         # Read original image
-        image_bytes = await file.read()
-        original_image_bgr = utils.decode_image_bytes(image_bytes)
+        image_bytes = await _upload_bytes(file, raw_body)
+
+        # A retried upload of the same bytes returns the stored capture,
+        # also while another request is still storing it
+        digest = content_hash(image_bytes)
+        existing = await _claim_capture(digest)
+        if existing is not None:
+            return JSONResponse(content={
+                'success': True,
+                'capture_id': existing,
+                'duplicate': True,
+                'files': _capture_files(existing),
+                'message': 'Capture already saved'
+            })
+
+        capture_id = None
+        try:
+            original_image_bgr = await run_in_threadpool(utils.decode_image_bytes, image_bytes)
 
-        # Run inference on this image with filtering enabled
-        inference_result = yolo_infer.run_inference(
-            original_image_bgr,
-            imgsz=640,
+            # Run inference on this image with filtering enabled; the annotated
+            # image is rendered later on demand, so skip drawing it here
+            if broker_client is not None:
+                inference_result, _ = await _remote_inference(image_bytes, model_name=model)
+                quality_metrics = inference_result['quality_metrics']
+            else:
+                inference_result, quality_metrics = await run_in_threadpool(
+                    _infer_capture, original_image_bgr, model)
+
+            feedback_result = feedback.generate_feedback(
+                detections=inference_result['detections'],
+                quality_metrics=quality_metrics,
+                image_width=original_image_bgr.shape[1],
+                image_height=original_image_bgr.shape[0]
+            )
+
+            capture_data = await run_in_threadpool(
+                _store_capture, original_image_bgr, inference_result, quality_metrics, feedback_result, digest)
+            capture_id = capture_data['capture_id']
+        finally:
+            _release_capture(digest, capture_id)
+
+        return JSONResponse(content={
+            'success': True,
+            'capture_id': capture_id,
+            'duplicate': False,
+            'files': _capture_files(capture_id),
+            'message': f'Capture saved successfully with {len(inference_result["detections"])} detection(s)'
+        })
+
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Error in /capture: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Capture failed: {str(e)}")
+
+
+def _parse_client_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Client capture time (ISO 8601, e.g. from Date.toISOString()) as local naive time."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed if parsed <= datetime.now() + timedelta(minutes=5) else None
+
+
+def _ingest_batch(images: List, inference_results: Optional[List[Dict]], model: Optional[str]):
+    """Inference (local mode), quality metrics and feedback for decoded uploads."""
+    if inference_results is None:
+        inference_results = yolo_infer.run_batch_inference(
+            images,
+            imgsz=DETECT_IMGSZ,
+            batch_size=INGEST_BATCH_SIZE,
             enable_filtering=True,
-            min_green_ratio=0.15
+            min_green_ratio=0.15,
+            model_name=model
         )
-        quality_metrics = utils.compute_image_quality_metrics(
-            original_image_bgr)
-
+        if _use_cascade('capture'):
+            for _ in images:
+                yolo_infer.detector.record_cascade_result(
+                    'capture', {'escalated': True, 'reason': 'forced'})
+    outputs = []
+    for image_bgr, inference_result in zip(images, inference_results):
+        quality_metrics = inference_result.get('quality_metrics') or utils.compute_image_quality_metrics(image_bgr)
         feedback_result = feedback.generate_feedback(
             detections=inference_result['detections'],
             quality_metrics=quality_metrics,
-            image_width=original_image_bgr.shape[1],
-            image_height=original_image_bgr.shape[0]
+            image_width=image_bgr.shape[1],
+            image_height=image_bgr.shape[0]
         )
+        outputs.append((inference_result, quality_metrics, feedback_result))
+    return outputs
 
-        # Generate timestamp-based filenames
-        capture_id = utils.generate_timestamp_filename("capture", "")
 
-        original_filename = f"{capture_id}_original.jpg"
-        annotated_filename = f"{capture_id}_detected.jpg"
-        data_filename = f"{capture_id}_data.json"
+@app.post("/capture/batch")
+async def capture_batch(
+    files: List[UploadFile] = File(...),
+    meta: Optional[str] = Form(None),
+    model: Optional[str] = None
+):
+    """
+    Store several captures in one request (offline queue upload).
 
-        original_path = CAPTURES_DIR / original_filename
-        annotated_path = CAPTURES_DIR / annotated_filename
-        data_path = CAPTURES_DIR / data_filename
+    Uploads whose bytes were already stored, or repeat earlier in the
+    batch, are not inferred again and return the existing capture ID.
+    New images go through batched inference. A bad image fails only its
+    own item.
 
-        # Save original image
-        original_jpeg = utils.encode_image_to_jpeg(
-            original_image_bgr, quality=95)
-        with open(original_path, 'wb') as f:
-            f.write(original_jpeg)
+    Args:
+        files: Original image files
+        meta: Optional JSON list aligned with files, each item with
+            'client_id' (echoed back) and 'captured_at' (ISO 8601 time the
+            capture was taken, stored as the capture timestamp)
+        model: Registry name of model to use (default: active model)
 
-        # Save annotated image
-        annotated_jpeg = utils.encode_image_to_jpeg(
-            inference_result['annotated_image_bgr'],
-            quality=95
-        )
-        with open(annotated_path, 'wb') as f:
-            f.write(annotated_jpeg)
+    Returns:
+        JSON with one result per file: capture_id, duplicate flag and
+        content hash, or an error
+    """
+    if len(files) > INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {INGEST_MAX_BATCH} files per batch")
+    try:
+        items_meta = json.loads(meta) if meta else [{} for _ in files]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="meta is not valid JSON")
+    if not isinstance(items_meta, list) or len(items_meta) != len(files):
+        raise HTTPException(status_code=400, detail="meta must be a list with one item per file")
+    if broker_client is None and not yolo_infer.detector.is_loaded():
+        raise HTTPException(status_code=503, detail="Model not loaded")
 
-        # Save JSON data
-        capture_data = {
-            'capture_id': capture_id,
-            'timestamp': datetime.now().isoformat(),
-            'original_image': original_filename,
-            'annotated_image': annotated_filename,
-            'detections': inference_result['detections'],
-            'quality_metrics': quality_metrics,
-            'feedback': feedback_result,
-            'inference_time_ms': inference_result['inference_time_ms']
-        }
+    claimed = {}  # digest -> stored capture ID (None until stored)
+    in_flight = {}  # digest -> future of another request storing the same bytes
+    try:
+        results = []
+        pending = {}  # digest -> (position, bytes), first occurrence only
+        for position, (upload, item_meta) in enumerate(zip(files, items_meta)):
+            data = await upload.read()
+            digest = content_hash(data)
+            result = {
+                'index': position,
+                'client_id': item_meta.get('client_id') if isinstance(item_meta, dict) else None,
+                'content_sha256': digest
+            }
+            existing = other = None
+            if digest not in pending and digest not in in_flight:
+                # Never wait while holding claims: two batches could wait on each other
+                existing, other = _try_claim_capture(digest)
+                if other is not None:
+                    in_flight[digest] = other
+            if existing is not None or digest in pending or digest in in_flight:
+                result['duplicate'] = True
+                result['capture_id'] = existing
+            else:
+                claimed[digest] = None
+                pending[digest] = (position, data)
+            results.append(result)
 
-        with open(data_path, 'w') as f:
-            json.dump(capture_data, f, indent=2)
+        # Decode off the event loop; undecodable uploads fail individually
+        positions, images = [], []
+        for digest, (position, data) in pending.items():
+            try:
+                images.append(await run_in_threadpool(utils.decode_image_bytes, data))
+                positions.append(position)
+            except ValueError as e:
+                results[position]['error'] = f"Invalid image: {e}"
 
-        return JSONResponse(content={
+        inference_results = None
+        if broker_client is not None and images:
+            remote = await asyncio.gather(*(
+                _remote_inference(pending[results[p]['content_sha256']][1], model_name=model) for p in positions))
+            inference_results = [inference_result for inference_result, _ in remote]
+        outputs = await run_in_threadpool(_ingest_batch, images, inference_results, model) if images else []
+
+        inference_time_ms = 0.0
+        for position, image_bgr, (inference_result, quality_metrics, feedback_result) in zip(positions, images, outputs):
+            item_meta = items_meta[position] if isinstance(items_meta[position], dict) else {}
+            capture_data = await run_in_threadpool(
+                _store_capture, image_bgr, inference_result, quality_metrics, feedback_result,
+                results[position]['content_sha256'], _parse_client_timestamp(item_meta.get('captured_at')))
+            inference_time_ms += inference_result['inference_time_ms']
+            claimed[results[position]['content_sha256']] = capture_data['capture_id']
+            results[position].update({
+                'duplicate': False,
+                'capture_id': capture_data['capture_id'],
+                'detections_count': len(capture_data['detections'])
+            })
+
+        # Repeats within the batch point at the capture stored for their first
+        # copy; bytes another request was storing, at that request's capture
+        stored = {r['content_sha256']: r.get('capture_id') for r in results if r.get('duplicate') is False}
+        for digest, capture_id in claimed.items():
+            _release_capture(digest, capture_id)
+        claimed.clear()
+        for digest, other in in_flight.items():
+            stored[digest] = await asyncio.shield(other)
+        for result in results:
+            if result.get('duplicate') and result['capture_id'] is None:
+                result['capture_id'] = stored.get(result['content_sha256'])
+                if result['capture_id'] is None:
+                    digest = result['content_sha256']
+                    result['error'] = (results[pending[digest][0]].get('error') if digest in pending
+                                       else "Concurrent upload of the same image failed; retry")
+
+        return {
             'success': True,
-            'capture_id': capture_id,
-            'files': {
-                'original': str(original_filename),
-                'annotated': str(annotated_filename),
-                'data': str(data_filename)
-            },
-            'message': f'Capture saved successfully with {len(inference_result["detections"])} detection(s)'
-        })
+            'results': results,
+            'stored': sum(1 for r in results if r.get('duplicate') is False),
+            'duplicates': sum(1 for r in results if r.get('duplicate') and r.get('capture_id')),
+            'errors': sum(1 for r in results if r.get('error')),
+            'inference_time_ms': inference_time_ms
+        }
 
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(f"Error in /capture: {e}")
+        print(f"Error in /capture/batch: {e}")
         raise HTTPException(
-            status_code=500, detail=f"Capture failed: {str(e)}")
+            status_code=500, detail=f"Batch capture failed: {str(e)}")
+    finally:
+        for digest, capture_id in claimed.items():
+            _release_capture(digest, capture_id)
 
 
 @app.get("/captures/{filename}")
-async def get_capture_file(filename: str):
-    """Serve capture files."""
+async def get_capture_file(request: Request, filename: str):
+    """
+    Serve capture files, rendering annotated images on demand.
+    Capture images never change once written, so they are served with
+    strong ETags, a long immutable lifetime and byte-range support. The
+    capture JSON is revalidated instead: retention rewrites it when it
+    points original_image at a recompressed file.
+    Only capture files are served: the analytics, retention and dedup
+    indexes kept in the same directory are not.
+    """
+    if not filename.startswith("capture_") or '/' in filename or '\\' in filename:
+        raise HTTPException(status_code=404, detail="File not found")
     file_path = CAPTURES_DIR / filename
     if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
+        # Annotated images are drawn from original + detections when first requested
+        capture_id = AnnotationCache.capture_id_from_filename(filename)
+        if capture_id is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        file_path = await run_in_threadpool(annotation_cache.get_or_render, capture_id)
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="File not found")
+
+    return cached_file_response(
+        file_path,
+        request.headers,
+        method=request.method,
+        cache_control=REVALIDATE_CACHE_CONTROL if filename.endswith("_data.json") else IMMUTABLE_CACHE_CONTROL
+    )
+
+
+@app.get("/analytics")
+async def get_analytics(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = 'day',
+    class_name: Optional[str] = None
+):
+    """
+    Detections per class per day or week, with confidence histograms.
+
+    Args:
+        start: First day, YYYY-MM-DD (default: 30 days before end)
+        end: Last day, YYYY-MM-DD (default: today)
+        granularity: 'day' or 'week'
+        class_name: Comma-separated classes to include (default: all)
+    """
+    try:
+        end_date = date.fromisoformat(end) if end else date.today()
+        start_date = date.fromisoformat(start) if start else end_date - timedelta(days=30)
+        class_names = [c.strip() for c in class_name.split(',')] if class_name else None
+        return analytics_store.query(start_date, end_date, granularity, class_names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/admin/analytics/backfill")
+async def admin_analytics_backfill(request: Request):
+    """Rebuild analytics rollups from all capture files."""
+    _require_admin(request)
+    summary = await run_in_threadpool(analytics_store.backfill, CAPTURES_DIR)
+    return {'success': True, **summary}
+
+
+@app.get("/admin/cascade")
+async def admin_cascade(request: Request):
+    """Cascade configuration and per-endpoint escalation rates."""
+    _require_admin(request)
+    return {
+        'enabled': bool(CASCADE_FAST_MODEL),
+        'fast_model': CASCADE_FAST_MODEL,
+        'endpoints': {name: {'uncertain_band': CASCADE_BANDS[name]} for name in sorted(CASCADE_ENDPOINTS)},
+        'stats': yolo_infer.detector.cascade_stats()
+    }
+
+
+@app.get("/admin/workers")
+async def admin_workers(request: Request):
+    """Split mode: registered inference workers, queue depth and retry counts."""
+    _require_admin(request)
+    if broker_client is None:
+        raise HTTPException(status_code=404, detail="Not running in split mode (INFERENCE_BROKER unset)")
+    try:
+        return await broker_client.stats()
+    except (OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=503, detail=f"Broker unavailable: {e or 'timeout'}")
+
+
+@app.get("/admin/admission")
+async def admin_admission(request: Request, client_id: Optional[str] = None):
+    """Per-client admitted, completed, throttled and dropped frame counts."""
+    _require_admin(request)
+    return admission.stats(client_id)
+
+
+@app.get("/admin/memory")
+async def admin_memory(request: Request, top: int = 0, snapshots: int = 60, current: bool = False):
+    """
+    Memory diagnostics: per-stage allocations, per-request peak bytes and
+    RSS/tensor snapshots. Requires MEMORY_DIAGNOSTICS=1 (or POST
+    /admin/memory/enable) for anything beyond current RSS.
+
+    Args:
+        top: Include this many largest live allocation sites
+        snapshots: Number of recent periodic snapshots to include
+        current: Take a full snapshot (incl. tensor memory) even when disabled
+    """
+    _require_admin(request)
+    report = await run_in_threadpool(memory_diagnostics.report, top, snapshots)
+    report['raw_uploads'] = raw_uploads.stats()
+    if current and not report['enabled']:
+        report['current'] = await run_in_threadpool(memory_diagnostics.snapshot)
+    return report
+
+
+@app.post("/admin/memory/{action}")
+async def admin_memory_action(request: Request, action: str):
+    """Enable, disable or reset memory diagnostics at runtime."""
+    _require_admin(request)
+    if action == 'enable':
+        memory_diagnostics.start()
+    elif action == 'disable':
+        memory_diagnostics.stop()
+    elif action == 'reset':
+        await run_in_threadpool(memory_diagnostics.reset)
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown action: {action}")
+    return {'success': True, 'enabled': memory_diagnostics.enabled}
+
+
+@app.get("/admin/retention")
+async def admin_retention(request: Request):
+    """Capture disk usage, retention settings and reclaimed bytes so far."""
+    _require_admin(request)
+    if capture_retention is None:
+        return {'enabled': False}
+    return {'enabled': True, **capture_retention.stats()}
+
+
+@app.post("/admin/retention/run")
+async def admin_retention_run(request: Request, dry_run: bool = False):
+    """Run a retention pass now; dry_run only reports what would be reclaimed."""
+    _require_admin(request)
+    if capture_retention is None:
+        raise HTTPException(status_code=400, detail="Capture retention is not configured")
+    return await run_in_threadpool(capture_retention.compact, dry_run)
+
 
-    from fastapi.responses import FileResponse
-    return FileResponse(file_path)
+@app.get("/admin/hard-examples")
+async def admin_hard_examples(request: Request):
+    """Hard-example collector counters (saved, duplicates, dropped, evicted, folder size)."""
+    _require_admin(request)
+    if hard_examples is None:
+        return {'enabled': False}
+    return {'enabled': True, 'path': str(HARD_EXAMPLES_DIR), **hard_examples.stats()}
+
+
+@app.get("/admin/export")
+async def admin_export(
+    request: Request,
+    format: str = 'zip',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    class_name: Optional[str] = None,
+    min_confidence: float = 0.0,
+    include_empty: bool = True,
+    limit: int = 0,
+    max_side: int = 0,
+    quality: int = 0,
+    val_fraction: float = 0.1
+):
+    """
+    Stream selected captures as a YOLO dataset archive for retraining.
+
+    The archive is produced capture by capture while it downloads, so
+    memory stays flat however many captures are selected.
+
+    Args:
+        format: "zip" or "tar"
+        start: First capture day, YYYY-MM-DD
+        end: Last capture day, YYYY-MM-DD
+        class_name: Comma-separated classes; captures need at least one
+        min_confidence: Drop detections below this confidence from labels
+        include_empty: Include captures without detections as backgrounds
+        limit: Maximum number of captures (0: all)
+        max_side: Downscale images to this longer side (0: original size)
+        quality: Re-encode images as JPEG at this quality (0: stored file)
+        val_fraction: Share of captures put in the val split
+    """
+    _require_admin(request)
+    try:
+        start_date = date.fromisoformat(start) if start else None
+        end_date = date.fromisoformat(end) if end else None
+        exporter = DatasetExporter(
+            CAPTURES_DIR, fmt=format, max_side=max_side, quality=quality,
+            val_fraction=val_fraction, class_names=yolo_infer.detector.get_class_names()
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    class_names = {c.strip() for c in class_name.split(',')} if class_name else None
+    captures = select_captures(CAPTURES_DIR, start_date, end_date, class_names,
+                               min_confidence, include_empty, limit)
+
+    filename = f"dataset_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = 'application/zip' if format == 'zip' else 'application/x-tar'
+    # Sync generator: Starlette iterates it in the threadpool
+    return StreamingResponse(exporter.stream(captures), media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@app.post("/admin/profile")
+async def admin_profile(
+    request: Request,
+    mode: str = 'sample',
+    seconds: float = 10,
+    requests: int = 0,
+    interval_ms: float = 5,
+    all_threads: bool = False,
+    format: Optional[str] = None
+):
+    """
+    Profile /detect for a number of seconds or completed requests and
+    return the result when the session ends.
+
+    Args:
+        mode: "sample" (collapsed stacks for flame graphs) or "cprofile"
+        seconds: Session length; upper bound when requests is set
+        requests: Stop after this many completed /detect requests
+        interval_ms: Sampling interval (sample mode)
+        all_threads: Sample every thread, not only /detect work
+        format: "collapsed" (sample), "pstats" or "text" (cprofile)
+    """
+    _require_admin(request)
+    if format is not None and format not in FORMATS.get(mode, ()):
+        raise HTTPException(status_code=400, detail=f"Format {format} not available for mode {mode}")
+    try:
+        request_profiler.start(mode, seconds=seconds, requests=requests,
+                               interval=interval_ms / 1000, all_threads=all_threads)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    summary = await request_profiler.wait()
+    try:
+        body, media_type = await run_in_threadpool(request_profiler.result, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    extension = {'text/plain': 'txt', 'application/octet-stream': 'prof'}[media_type]
+    headers = {
+        'Content-Disposition': f'attachment; filename="detect_{summary["mode"]}.{extension}"',
+        'X-Profile-Seconds': str(summary['elapsed_s']),
+        'X-Profile-Requests': str(summary['requests']),
+        'X-Profile-Samples': str(summary['samples'])
+    }
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@app.get("/admin/profile")
+async def admin_profile_status(request: Request):
+    """State of the running or last profiling session."""
+    _require_admin(request)
+    return request_profiler.status()
+
+
+@app.delete("/admin/profile")
+async def admin_profile_cancel(request: Request):
+    """End the running profiling session early; its caller gets the partial profile."""
+    _require_admin(request)
+    request_profiler.cancel()
+    return request_profiler.status()
+
+
+@app.get("/feedback/static")
+async def feedback_static(request: Request):
+    """
+    Static feedback text (disclaimer, per-class suggestions) referenced by ID
+    in /detect responses. Cacheable; revalidated via ETag.
+    """
+    payload = feedback.get_static_payload()
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=86400'}
+
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint (liveness)."""
     model_loaded = yolo_infer.detector.is_loaded()
     return {
         'status': 'healthy' if model_loaded else 'degraded',
         'model_loaded': model_loaded,
+        'model_ready': yolo_infer.detector.is_ready(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 only once the model is loaded and warmed up
+    (split mode: once at least one inference worker is registered)."""
+    if broker_client is not None:
+        try:
+            workers = len((await broker_client.stats())['workers'])
+        except (OSError, asyncio.TimeoutError):
+            workers = 0
+        ready = workers > 0
+        content = {'ready': ready, 'inference_workers': workers, 'timestamp': datetime.now().isoformat()}
+        return JSONResponse(content=content, status_code=200 if ready else 503)
+
+    ready = yolo_infer.detector.is_ready()
+    content = {
+        'ready': ready,
+        'model_loaded': yolo_infer.detector.is_loaded(),
         'timestamp': datetime.now().isoformat()
     }
+    return JSONResponse(content=content, status_code=200 if ready else 503)
 
 
 @app.get("/model-info")
@@ -315,6 +1560,78 @@ async def model_info():
     }
 
 
+@app.get("/admin/models")
+async def admin_list_models(request: Request):
+    """List loaded models and weight files available in models/."""
+    _require_admin(request)
+    return {
+        'loaded': yolo_infer.detector.list_models(),
+        'available': sorted(p.stem for p in MODELS_DIR.glob("*.pt"))
+    }
+
+
+@app.post("/admin/models/{name}/load")
+async def admin_load_model(
+    request: Request,
+    name: str,
+    activate: bool = False,
+    reload: bool = False,
+    conf_threshold: float = 0.35
+):
+    """
+    Load models/{name}.pt into the registry, warm it up and optionally
+    make it active. Requests in flight finish on the previous model.
+    """
+    _require_admin(request)
+    model_path = MODELS_DIR / f"{name}.pt"
+    if model_path.parent != MODELS_DIR or not model_path.exists():
+        raise HTTPException(status_code=404, detail=f"Weights not found: {name}.pt")
+
+    def _load():
+        # Warmed before it is published, so neither activation nor a reload
+        # of the name serving requests ever exposes a cold model
+        yolo_infer.detector.load_model(
+            str(model_path), conf_threshold=conf_threshold,
+            name=name, activate=False, reload=reload,
+            optimize=MODEL_OPTIMIZE, compile_model=MODEL_COMPILE,
+            warmup_imgsz=WARMUP_IMGSZ, warmup_runs=WARMUP_RUNS)
+        feedback.build_suggestion_index(yolo_infer.detector.get_class_names(name))
+        if activate:
+            return yolo_infer.detector.activate_model(name)
+        return next(m for m in yolo_infer.detector.list_models() if m['name'] == name)
+
+    try:
+        info = await run_in_threadpool(_load)
+    except Exception as e:
+        print(f"Error loading model {name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Model load failed: {str(e)}")
+    return {'success': True, 'model': info}
+
+
+@app.post("/admin/models/{name}/activate")
+async def admin_activate_model(request: Request, name: str):
+    """Atomically switch the active model."""
+    _require_admin(request)
+    try:
+        info = yolo_infer.detector.activate_model(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {'success': True, 'model': info}
+
+
+@app.delete("/admin/models/{name}")
+async def admin_unload_model(request: Request, name: str):
+    """Unload a model that is not active."""
+    _require_admin(request)
+    try:
+        yolo_infer.detector.unload_model(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {'success': True, 'unloaded': name}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,378 @@
+"""
+Opt-in memory diagnostics for long-running servers.
+Tracks per-stage allocations and per-request peak bytes with tracemalloc,
+and records periodic RSS and tensor-memory snapshots. When disabled,
+stage()/request() return a shared no-op context and nothing is traced.
+"""
+import contextvars
+import gc
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List
+
+from starlette.routing import Match
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+_NULL_CONTEXT = nullcontext()
+# Outermost open span of the current request (async task or thread)
+_root_span = contextvars.ContextVar('memory_root_span', default=None)
+REQUEST_WINDOW = 1000  # Recent request peaks kept for percentiles
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process in bytes (0 if unavailable)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def memory_sharing(pid: str = 'self') -> Dict:
+    """
+    Unique vs shared memory of a process from /proc/<pid>/smaps_rollup
+    (Linux). unique_bytes (USS) is what the process would free on exit;
+    with preloaded workers the shared weights count only under shared_bytes.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        'rss_bytes': fields.get('Rss', 0),
+        'pss_bytes': fields.get('Pss', 0),
+        'unique_bytes': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared_bytes': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    }
+
+
+def tensor_bytes() -> Dict:
+    """
+    Memory held by live torch tensors.
+    Walks gc-tracked objects, so only call this from the snapshot thread
+    or an admin request, never per frame.
+
+    Returns:
+        Dictionary with CPU tensor count/bytes and CUDA allocated bytes
+    """
+    try:
+        import torch
+    except ImportError:
+        return {}
+
+    count = 0
+    total = 0
+    for obj in gc.get_objects():
+        try:
+            if issubclass(type(obj), torch.Tensor) and not obj.is_cuda:
+                count += 1
+                total += obj.element_size() * obj.nelement()
+        except Exception:
+            continue
+
+    result = {'cpu_tensors': count, 'cpu_tensor_bytes': total}
+    if torch.cuda.is_available():
+        result['cuda_allocated_bytes'] = torch.cuda.memory_allocated()
+        result['cuda_reserved_bytes'] = torch.cuda.memory_reserved()
+    return result
+
+
+class _Span:
+    """Measures net and peak traced bytes between enter and exit."""
+
+    def __init__(self, owner: 'MemoryDiagnostics', name: str, is_request: bool):
+        self.owner = owner
+        self.name = name
+        self.is_request = is_request
+        self.root = None
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self._token = None
+
+    def __enter__(self):
+        self.root = _root_span.get() or self
+        if self.root is self:
+            self._token = _root_span.set(self)
+        self.owner._span_enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current, peak = self.owner._span_exit(self)
+        if self._token is not None:
+            _root_span.reset(self._token)
+        self.owner._record(
+            self.name,
+            net_bytes=current - self.start_bytes,
+            peak_bytes=max(0, peak - self.start_bytes),
+            is_request=self.is_request
+        )
+        return False
+
+
+class MemoryDiagnostics:
+    """Per-stage allocation tracking and periodic memory snapshots."""
+
+    def __init__(self, snapshot_interval: float = 60.0, max_snapshots: int = 1440, trace_frames: int = 1):
+        """
+        Args:
+            snapshot_interval: Seconds between background snapshots
+            max_snapshots: Snapshots kept in memory (oldest dropped)
+            trace_frames: Stack frames stored per allocation by tracemalloc
+        """
+        self.snapshot_interval = snapshot_interval
+        self.trace_frames = trace_frames
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._active_spans = []
+        self._stages = {}
+        self._request_peaks = deque(maxlen=REQUEST_WINDOW)
+        self._request_count = 0
+        self._request_peak_max = 0
+        self._snapshots = deque(maxlen=max_snapshots)
+        self._baseline = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start tracemalloc and the snapshot thread."""
+        if self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+        self.enabled = True
+        self._baseline = self.snapshot()
+        self._snapshots.append(self._baseline)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._snapshot_loop, name='memory-snapshots', daemon=True)
+        self._thread.start()
+        print(f"Memory diagnostics enabled (snapshot every {self.snapshot_interval:.0f} s)")
+
+    def stop(self):
+        """Stop tracing and the snapshot thread."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        tracemalloc.stop()
+
+    def stage(self, name: str):
+        """
+        Context manager tracking allocations of one pipeline stage.
+
+        Args:
+            name: Stage name (e.g. 'decode', 'inference')
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Span(self, name, is_request=False)
+
+    def request(self, name: str = 'request'):
+        """
+        Context manager tracking the peak bytes of a whole request.
+
+        Args:
+            name: Request kind (e.g. 'detect')
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Span(self, name, is_request=True)
+
+    def _span_enter(self, span: _Span):
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            # tracemalloc's peak is process-wide: only reset it when every
+            # open span belongs to this request (nested stages), carrying the
+            # peak so far into them. Spans overlapping other requests report
+            # an upper bound instead.
+            if all(s.root is span.root for s in self._active_spans):
+                for s in self._active_spans:
+                    s.peak_bytes = max(s.peak_bytes, peak)
+                tracemalloc.reset_peak()
+            span.start_bytes = current
+            self._active_spans.append(span)
+
+    def _span_exit(self, span: _Span):
+        with self._lock:
+            self._active_spans.remove(span)
+            current, peak = tracemalloc.get_traced_memory()
+            return current, max(peak, span.peak_bytes)
+
+    def _record(self, name: str, net_bytes: int, peak_bytes: int, is_request: bool):
+        with self._lock:
+            if is_request:
+                self._request_count += 1
+                self._request_peaks.append(peak_bytes)
+                self._request_peak_max = max(self._request_peak_max, peak_bytes)
+                name = f"request:{name}"
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = {'count': 0, 'net_bytes_total': 0, 'peak_bytes_sum': 0, 'peak_bytes_max': 0}
+            stats['count'] += 1
+            stats['net_bytes_total'] += net_bytes
+            stats['peak_bytes_sum'] += peak_bytes
+            stats['peak_bytes_max'] = max(stats['peak_bytes_max'], peak_bytes)
+
+    def snapshot(self) -> Dict:
+        """
+        Take a point-in-time memory snapshot.
+
+        Returns:
+            Dictionary with RSS, traced bytes, tensor memory and gc counts
+        """
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'monotonic_s': time.monotonic(),
+            'rss_bytes': rss_bytes(),
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'tensors': tensor_bytes(),
+            'gc_counts': list(gc.get_count())
+        }
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                snap = self.snapshot()
+            except Exception as e:
+                print(f"Memory snapshot failed: {e}")
+                continue
+            with self._lock:
+                self._snapshots.append(snap)
+
+    def top_allocations(self, limit: int = 10) -> List[Dict]:
+        """
+        Largest live allocation sites by source line.
+
+        Args:
+            limit: Number of sites to return
+
+        Returns:
+            List of {'location', 'size_bytes', 'count'}
+        """
+        if not tracemalloc.is_tracing():
+            return []
+        stats = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        )).statistics('lineno')
+        return [
+            {'location': str(stat.traceback[0]), 'size_bytes': stat.size, 'count': stat.count}
+            for stat in stats[:limit]
+        ]
+
+    def report(self, top: int = 0, snapshots: int = 60) -> Dict:
+        """
+        Diagnostics summary for the admin endpoint.
+
+        Args:
+            top: Include this many top allocation sites (0 to skip)
+            snapshots: Number of most recent snapshots to include
+
+        Returns:
+            Stage stats, request peaks, current and recent snapshots
+        """
+        if not self.enabled:
+            return {'enabled': False, 'rss_bytes': rss_bytes(), 'sharing': memory_sharing()}
+
+        current = self.snapshot()
+        with self._lock:
+            stages = {
+                name: {
+                    'count': s['count'],
+                    'net_bytes_total': s['net_bytes_total'],
+                    'peak_bytes_mean': s['peak_bytes_sum'] / s['count'] if s['count'] else 0,
+                    'peak_bytes_max': s['peak_bytes_max']
+                }
+                for name, s in self._stages.items()
+            }
+            peaks = sorted(self._request_peaks)
+            recent = list(self._snapshots)[-snapshots:] if snapshots > 0 else []
+            request_count = self._request_count
+            request_peak_max = self._request_peak_max
+
+        report = {
+            'enabled': True,
+            'stages': stages,
+            'requests': {
+                'count': request_count,
+                'peak_bytes_max': request_peak_max,
+                'peak_bytes_p50': peaks[len(peaks) // 2] if peaks else 0,
+                'peak_bytes_p95': peaks[min(len(peaks) - 1, int(len(peaks) * 0.95))] if peaks else 0,
+                'window': len(peaks)
+            },
+            'current': current,
+            'baseline': self._baseline,
+            'rss_growth_bytes': current['rss_bytes'] - self._baseline['rss_bytes'],
+            'traced_growth_bytes': current['traced_bytes'] - self._baseline['traced_bytes'],
+            'sharing': memory_sharing(),
+            'snapshots': recent
+        }
+        if top > 0:
+            report['top_allocations'] = self.top_allocations(top)
+        return report
+
+    def reset(self):
+        """Clear stage stats and snapshots and take a new baseline."""
+        with self._lock:
+            self._stages.clear()
+            self._request_peaks.clear()
+            self._request_count = 0
+            self._request_peak_max = 0
+            self._snapshots.clear()
+        if self.enabled:
+            self._baseline = self.snapshot()
+            with self._lock:
+                self._snapshots.append(self._baseline)
+
+
+class MemoryDiagnosticsMiddleware:
+    """ASGI middleware wrapping each HTTP request in a request span."""
+
+    def __init__(self, app, diagnostics: MemoryDiagnostics):
+        self.app = app
+        self.diagnostics = diagnostics
+
+    async def __call__(self, scope, receive, send):
+        if not self.diagnostics.enabled or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        with self.diagnostics.request(self._route_name(scope)):
+            await self.app(scope, receive, send)
+
+    @staticmethod
+    def _route_name(scope) -> str:
+        """
+        Route template the request matches (e.g. /captures/{filename}), so
+        stats are bounded by the number of routes; unmatched paths are
+        counted as 'other' instead of one entry per client-chosen URL.
+        """
+        partial = None
+        for route in getattr(scope.get('app'), 'routes', ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or 'other'
@@ -0,0 +1,212 @@
+"""
+Optimized CPU execution path for YOLO detection models.
+
+model.predict() rebuilds its input pipeline on every call: letterbox via
+a new LetterBox object, np.stack, a BGR->RGB copy, a fresh float tensor,
+and a Results object per image. OptimizedRunner prepares the network once
+at load time (Conv+BN fusion, eval mode, channels-last weights, optional
+torch.compile) and runs frames under torch.inference_mode() into
+preallocated input tensors, one set per letterbox geometry. A camera
+streams a fixed resolution at a fixed imgsz, so after the first frame
+the hot path allocates no input tensors at all.
+
+Letterboxing and NMS match the predict() path (same rounding, padding
+value and minimum-rectangle padding), so detections are the same up to
+float rounding; scripts/bench_optimized.py checks parity and latency.
+"""
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+# Input buffer sets kept per geometry; frames with more distinct
+# resolutions than this still work but allocate per call
+MAX_CACHED_GEOMETRIES = 8
+
+
+class OptimizedRunner:
+    """Callable running a YOLO detection model without the predictor."""
+
+    def __init__(self, model, compile_model: bool = False):
+        """
+        Prepare the model for inference. Fusion and the memory format
+        change are applied to the model in place, so model.predict()
+        (used by tiled inference) runs on the same prepared weights.
+
+        Args:
+            model: Loaded ultralytics YOLO detection model
+            compile_model: Wrap the network in torch.compile (falls back to
+                eager mode if compilation fails on first use)
+        """
+        import torch
+
+        if getattr(model, 'task', None) != 'detect':
+            raise ValueError(f"Optimized runner supports detection models only, got task '{model.task}'")
+
+        self._torch = torch
+        module = model.model
+        # no_grad keeps the fused weights leaf tensors (fuse copies into them)
+        with torch.no_grad():
+            module = module.fuse(verbose=False) if hasattr(module, 'fuse') else module
+        module.eval()
+        module.to(memory_format=torch.channels_last)
+        model.model = module
+
+        self.module = module
+        self.stride = max(int(module.stride.max()), 32)
+        self.compiled = False
+        self._forward = module
+        if compile_model:
+            try:
+                self._forward = torch.compile(module, dynamic=False)
+                self.compiled = True
+            except Exception as e:
+                print(f"WARNING: torch.compile unavailable, using eager mode: {e}")
+
+        self._geometry = {}
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def describe(self) -> Dict:
+        """Settings in effect, for the model registry listing."""
+        return {
+            'fused': True,
+            'channels_last': True,
+            'compiled': self.compiled,
+            'cached_geometries': len(self._buffers)
+        }
+
+    def _letterbox_geometry(self, height: int, width: int, imgsz: int) -> Tuple:
+        """
+        Letterbox layout for an input size, as ultralytics LetterBox with
+        auto=True (padding only up to the next stride multiple).
+
+        Returns:
+            ((padded_h, padded_w), (resized_w, resized_h), (top, left))
+        """
+        key = (height, width, imgsz)
+        geometry = self._geometry.get(key)
+        if geometry is None:
+            from ultralytics.utils.checks import check_imgsz
+
+            size = check_imgsz(imgsz, stride=self.stride, min_dim=2)
+            size = (size, size) if isinstance(size, int) else tuple(size)
+            r = min(size[0] / height, size[1] / width)
+            new_w, new_h = int(round(width * r)), int(round(height * r))
+            dw = np.mod(size[1] - new_w, self.stride) / 2
+            dh = np.mod(size[0] - new_h, self.stride) / 2
+            top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+            left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+            geometry = ((new_h + top + bottom, new_w + left + right), (new_w, new_h), (top, left))
+            if len(self._geometry) < MAX_CACHED_GEOMETRIES * 4:
+                self._geometry[key] = geometry
+        return geometry
+
+    def _acquire(self, geometry: Tuple) -> Tuple:
+        """Take a free (input tensor, resize scratch) pair for a geometry."""
+        with self._lock:
+            free = self._buffers.get(geometry)
+            if free:
+                return free.pop()
+        torch = self._torch
+        (padded_h, padded_w), (new_w, new_h), _ = geometry
+        # Pad value 114 as LetterBox; only the image region is rewritten per frame
+        tensor = torch.full((1, 3, padded_h, padded_w), 114 / 255, dtype=torch.float32)
+        tensor = tensor.contiguous(memory_format=torch.channels_last)
+        scratch = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        return tensor, scratch
+
+    def _release(self, geometry: Tuple, buffers: Tuple):
+        with self._lock:
+            if geometry in self._buffers or len(self._buffers) < MAX_CACHED_GEOMETRIES:
+                self._buffers.setdefault(geometry, []).append(buffers)
+
+    def _run_forward(self, tensor):
+        try:
+            return self._forward(tensor)
+        except Exception as e:
+            if not self.compiled:
+                raise
+            print(f"WARNING: torch.compile failed, falling back to eager mode: {e}")
+            self._forward = self.module
+            self.compiled = False
+            return self._forward(tensor)
+
+    def __call__(
+        self,
+        image_bgr: np.ndarray,
+        conf: float,
+        iou: float = 0.5,
+        imgsz: int = 640,
+        max_det: int = 100
+    ) -> Tuple[np.ndarray, float]:
+        """
+        Detect objects in one image.
+
+        Args:
+            image_bgr: Input image in BGR format
+            conf: Confidence threshold
+            iou: NMS IoU threshold
+            imgsz: Inference size
+            max_det: Maximum detections kept after NMS
+
+        Returns:
+            (N x 6 array of x1, y1, x2, y2, confidence, class_id in image
+            coordinates, forward pass time in milliseconds)
+        """
+        from ultralytics.utils import ops
+
+        torch = self._torch
+        height, width = image_bgr.shape[:2]
+        geometry = self._letterbox_geometry(height, width, imgsz)
+        (new_w, new_h), (top, left) = geometry[1], geometry[2]
+        tensor, scratch = self._acquire(geometry)
+        try:
+            if (new_w, new_h) != (width, height):
+                cv2.resize(image_bgr, (new_w, new_h), dst=scratch, interpolation=cv2.INTER_LINEAR)
+                src = scratch
+            else:
+                src = np.ascontiguousarray(image_bgr)
+            # HWC uint8 BGR -> RGB channels of the NCHW (channels-last) input
+            src_t = torch.from_numpy(src)
+            roi = tensor[0, :, top:top + new_h, left:left + new_w]
+            for channel in range(3):
+                roi[channel].copy_(src_t[:, :, 2 - channel])
+            roi.div_(255)
+
+            with torch.inference_mode():
+                start = time.perf_counter()
+                preds = self._run_forward(tensor)
+                forward_ms = (time.perf_counter() - start) * 1000
+                det = ops.non_max_suppression(preds, conf, iou, max_det=max_det)[0]
+                det[:, :4] = ops.scale_boxes(tensor.shape[2:], det[:, :4], image_bgr.shape)
+                det = det.numpy()
+        finally:
+            self._release(geometry, (tensor, scratch))
+        return det, forward_ms
+
+
+def detections_from_array(det: np.ndarray, names: Dict, offset: Tuple[int, int] = (0, 0)) -> List[Dict]:
+    """
+    Convert an N x 6 (xyxy, conf, cls) array into detection dictionaries.
+
+    Args:
+        det: Detections array
+        names: Model class names
+        offset: (x, y) added to boxes
+
+    Returns:
+        List of detection dictionaries
+    """
+    dx, dy = offset
+    return [
+        {
+            'class_id': int(cls_id),
+            'class_name': names[int(cls_id)],
+            'confidence': float(conf_val),
+            'bbox_xyxy': [float(x1 + dx), float(y1 + dy), float(x2 + dx), float(y2 + dy)]
+        }
+        for x1, y1, x2, y2, conf_val, cls_id in det
+    ]
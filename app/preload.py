@@ -0,0 +1,66 @@
+"""
+Preload mode: load the model once in the server's master process so that
+forked workers share the weights instead of each loading best.pt.
+
+With `gunicorn --preload` the app module is imported in the master
+before it forks. preload_model() runs the loader there, then freezes
+the garbage collector so collections in the workers don't write to the
+headers of the model's objects and un-share their pages. Weight tensors
+are never written during inference, so their pages stay shared
+copy-on-write between all workers. Only buffers a worker allocates or
+touches itself count towards its unique RSS.
+
+PyTorch's OpenMP pool does not survive fork: a worker forked after the
+master ran a multi-threaded op deadlocks on its first inference. The
+master therefore loads and warms up single-threaded. Each worker sets
+its own thread count after the fork (after_fork()).
+
+uvicorn --workers starts workers by spawning, not forking, so it gets
+no sharing. Use gunicorn with the uvicorn worker class.
+"""
+import gc
+import time
+from typing import Callable, Dict
+
+_state = {'preloaded': False, 'torch_threads': 0, 'load_ms': 0.0}
+
+
+def preload_model(load: Callable[[], None]) -> Dict:
+    """
+    Run the model loader in the master process, ready to be forked.
+
+    Args:
+        load: Loads (and warms up) the model; must not change torch threads
+
+    Returns:
+        Preload state: thread count to restore in workers and load time
+    """
+    import torch
+
+    _state['torch_threads'] = torch.get_num_threads()
+    torch.set_num_threads(1)
+    start = time.perf_counter()
+    load()
+    _state['load_ms'] = (time.perf_counter() - start) * 1000
+    # Move everything allocated so far out of the collector's generations
+    gc.collect()
+    gc.freeze()
+    _state['preloaded'] = True
+    return dict(_state)
+
+
+def is_preloaded() -> bool:
+    return _state['preloaded']
+
+
+def after_fork(torch_threads: int = 0):
+    """
+    Restore multi-threaded inference in a worker.
+
+    Args:
+        torch_threads: Thread count for this worker (0: the count the
+            master had before preloading)
+    """
+    import torch
+
+    torch.set_num_threads(torch_threads or _state['torch_threads'])
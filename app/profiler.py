@@ -0,0 +1,256 @@
+"""
+On-demand request profiler for production debugging.
+
+An admin starts a session for N seconds or N requests; the endpoint
+returns the profile when it ends. Two modes:
+
+- sample: a background thread samples the Python stacks of threads
+  currently serving a tracked request (the event loop while it runs the
+  entry-point coroutine, plus threadpool calls passed through wrap()) and
+  returns collapsed stacks ("a;b;c count") for flamegraph.pl/speedscope.
+- cprofile: deterministic cProfile of the event loop thread and of every
+  wrapped threadpool call, merged into one pstats file (snakeviz,
+  flameprof).
+
+Nothing runs when no session is active: wrap() returns the callable
+unchanged and request_completed() is a single attribute check.
+"""
+import asyncio
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+MODES = ('sample', 'cprofile')
+# Output formats per mode; the first is the default
+FORMATS = {'sample': ('collapsed',), 'cprofile': ('pstats', 'text')}
+MAX_SECONDS = 300
+
+
+class _Session:
+    """State of one profiling run."""
+
+    def __init__(self, mode: str, seconds: float, requests: int, interval: float, all_threads: bool):
+        self.mode = mode
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+        self.all_threads = all_threads
+        self.started = time.perf_counter()
+        self.ended = None
+        self.completed_requests = 0
+        self.samples = 0
+        self.stacks = Counter()
+        self.stats = None
+        self.loop_profile = None
+        self.done = asyncio.Event()
+
+
+class RequestProfiler:
+    """One profiling session at a time, started and finished on the event loop."""
+
+    def __init__(self, entry_points: Iterable[str] = ()):
+        """
+        Args:
+            entry_points: Qualified names of request handlers whose frames
+                mark event-loop samples as belonging to a tracked request
+                (e.g. "app.main.detect")
+        """
+        self.entry_points = set(entry_points)
+        self._session = None
+        self._last = None
+        self._lock = threading.Lock()
+        self._active_threads = set()
+        self._labels = {}
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+        self._timer = None
+
+    @property
+    def active(self) -> bool:
+        return self._session is not None
+
+    def start(self, mode: str = 'sample', seconds: float = 10, requests: int = 0,
+              interval: float = 0.005, all_threads: bool = False):
+        """
+        Start a session. Must be called on the event loop thread.
+
+        Args:
+            mode: "sample" or "cprofile"
+            seconds: Maximum duration (also the limit when requests is set)
+            requests: Stop after this many completed requests (0: time only)
+            interval: Sampling interval in seconds (sample mode)
+            all_threads: Sample every thread, not only tracked requests
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        if not 0 < seconds <= MAX_SECONDS or requests < 0 or interval <= 0:
+            raise ValueError(f"seconds must be in (0, {MAX_SECONDS}], requests >= 0, interval > 0")
+        if self._session is not None:
+            raise RuntimeError("A profiling session is already running")
+
+        session = _Session(mode, seconds, requests, interval, all_threads)
+        if mode == 'cprofile':
+            session.loop_profile = cProfile.Profile()
+            session.loop_profile.enable()
+        else:
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, args=(session,), name='request-profiler', daemon=True)
+            self._sampler.start()
+        self._session = session
+        self._timer = asyncio.get_running_loop().call_later(seconds, self._finish)
+
+    def wrap(self, fn: Callable) -> Callable:
+        """
+        Profile a callable that runs in a worker thread on behalf of a
+        tracked request. Returns fn itself when no session is active.
+        """
+        session = self._session
+        if session is None:
+            return fn
+
+        def _profiled(*args, **kwargs):
+            ident = threading.get_ident()
+            self._active_threads.add(ident)
+            profile = cProfile.Profile() if session.mode == 'cprofile' else None
+            try:
+                if profile is None:
+                    return fn(*args, **kwargs)
+                return profile.runcall(fn, *args, **kwargs)
+            finally:
+                self._active_threads.discard(ident)
+                if profile is not None:
+                    with self._lock:
+                        # Drop calls that outlived their session
+                        if self._session is session:
+                            if session.stats is None:
+                                session.stats = pstats.Stats(profile)
+                            else:
+                                session.stats.add(profile)
+        return _profiled
+
+    def request_completed(self):
+        """Count a finished tracked request (event loop thread)."""
+        session = self._session
+        if session is None:
+            return
+        session.completed_requests += 1
+        if session.requests and session.completed_requests >= session.requests:
+            self._finish()
+
+    async def wait(self) -> Dict:
+        """Wait for the running session to end and return its summary."""
+        session = self._session or self._last
+        if session is None:
+            raise RuntimeError("No profiling session")
+        await session.done.wait()
+        return self._summary(session)
+
+    def status(self) -> Dict:
+        """Summary of the running session, or of the last finished one."""
+        session = self._session or self._last
+        return {'active': self.active, 'session': self._summary(session) if session else None}
+
+    def cancel(self):
+        """End the running session early (its result is still available)."""
+        if self._session is not None:
+            self._finish()
+
+    def _finish(self):
+        session = self._session
+        if session is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if session.mode == 'cprofile':
+            session.loop_profile.disable()
+        else:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+        with self._lock:
+            if session.mode == 'cprofile':
+                loop_stats = pstats.Stats(session.loop_profile)
+                if session.stats is not None:
+                    loop_stats.add(session.stats)
+                session.stats = loop_stats
+            session.loop_profile = None
+            self._session = None
+        session.ended = time.perf_counter()
+        self._last = session
+        session.done.set()
+
+    @staticmethod
+    def _summary(session: _Session) -> Dict:
+        end = session.ended or time.perf_counter()
+        return {
+            'mode': session.mode,
+            'running': session.ended is None,
+            'elapsed_s': round(end - session.started, 3),
+            'requests': session.completed_requests,
+            'request_limit': session.requests,
+            'second_limit': session.seconds,
+            'samples': session.samples
+        }
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get('__name__', '?')
+            # co_qualname is Python 3.11+; 3.10 only has the bare name
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = f"{module}.{name}".replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def _sample_loop(self, session: _Session):
+        own = threading.get_ident()
+        while not self._stop_sampling.wait(session.interval):
+            active = set(self._active_threads)
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame))
+                    frame = frame.f_back
+                if not (session.all_threads or ident in active or self.entry_points.intersection(stack)):
+                    continue
+                session.stacks[';'.join(reversed(stack))] += 1
+            session.samples += 1
+
+    def result(self, fmt: Optional[str] = None) -> Tuple[bytes, str]:
+        """
+        Profile of the last finished session.
+
+        Args:
+            fmt: sample mode: "collapsed" (default); cprofile mode: "pstats"
+                (default, marshalled stats for pstats.Stats/snakeviz) or
+                "text" (top functions by cumulative time)
+
+        Returns:
+            (body, media type)
+        """
+        session = self._last
+        if session is None:
+            raise RuntimeError("No finished profiling session")
+        fmt = fmt or FORMATS[session.mode][0]
+        if fmt not in FORMATS[session.mode]:
+            raise ValueError(f"Format {fmt} not available for {session.mode} mode")
+        if session.mode == 'sample':
+            lines = [f"{stack} {count}" for stack, count in session.stacks.most_common()]
+            return ('\n'.join(lines) + '\n').encode('utf-8'), 'text/plain'
+        if fmt == 'text':
+            stream = io.StringIO()
+            session.stats.stream = stream
+            session.stats.sort_stats('cumulative').print_stats(60)
+            return stream.getvalue().encode('utf-8'), 'text/plain'
+        return marshal.dumps(session.stats.stats), 'application/octet-stream'
@@ -0,0 +1,118 @@
+"""
+Raw image/jpeg request bodies read into reusable preallocated buffers.
+
+A multipart upload is parsed by python-multipart, spooled to a temporary
+file, then copied into a new bytes object by UploadFile.read() before it
+can be decoded. A raw body skips all of that: the ASGI body chunks are
+copied once, straight into a pooled buffer, and the decoder reads a
+zero-copy view of that buffer.
+
+Buffers are numpy arrays allocated with np.empty, so the pages are only
+touched (and count towards RSS) up to the largest body actually received.
+When every pooled buffer is in use a one-off buffer is allocated for the
+request instead of waiting.
+"""
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+RAW_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'application/octet-stream'}
+
+
+class RawBody:
+    """A request body held in a buffer until released."""
+
+    __slots__ = ('buffer', 'size', 'pooled')
+
+    def __init__(self, buffer: np.ndarray, size: int, pooled: bool):
+        self.buffer = buffer
+        self.size = size
+        self.pooled = pooled
+
+    @property
+    def data(self) -> memoryview:
+        """Zero-copy, bytes-like view of the body; invalid after release."""
+        return memoryview(self.buffer)[:self.size]
+
+
+class RawBodyPool:
+    """Pool of fixed-size body buffers with a per-request size limit."""
+
+    def __init__(self, max_bytes: int, buffers: int = 4):
+        """
+        Args:
+            max_bytes: Largest accepted body (also the size of each buffer)
+            buffers: Buffers kept for reuse
+        """
+        self.max_bytes = max_bytes
+        self._free = [np.empty(max_bytes, dtype=np.uint8) for _ in range(buffers)]
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'pooled': 0, 'allocated': 0, 'rejected': 0, 'bytes': 0}
+
+    @staticmethod
+    def accepts(content_type: Optional[str]) -> bool:
+        """Whether a Content-Type header denotes a raw image body (not multipart)."""
+        if not content_type:
+            return False
+        return content_type.split(';', 1)[0].strip().lower() in RAW_CONTENT_TYPES
+
+    async def read(self, request) -> RawBody:
+        """
+        Stream a request body into a buffer.
+
+        Args:
+            request: Starlette request whose body has not been read
+
+        Returns:
+            RawBody; pass it to release() when done with its data
+
+        Raises:
+            OverflowError: Body larger than max_bytes
+            ValueError: Empty body
+        """
+        declared = request.headers.get('content-length')
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            self._stats['rejected'] += 1
+            raise OverflowError(f"Body exceeds {self.max_bytes} bytes")
+
+        body = self._acquire(int(declared) if declared and declared.isdigit() else 0)
+        try:
+            size = 0
+            async for chunk in request.stream():
+                end = size + len(chunk)
+                if end > len(body.buffer):
+                    # No (or a wrong) Content-Length: enforce the limit while streaming
+                    self._stats['rejected'] += 1
+                    raise OverflowError(f"Body exceeds {self.max_bytes} bytes")
+                body.buffer[size:end] = np.frombuffer(chunk, dtype=np.uint8)
+                size = end
+            if size == 0:
+                raise ValueError("Empty request body")
+        except BaseException:
+            self.release(body)
+            raise
+        body.size = size
+        self._stats['requests'] += 1
+        self._stats['bytes'] += size
+        return body
+
+    def release(self, body: RawBody):
+        """Return a body's buffer to the pool."""
+        if body.pooled and body.buffer is not None:
+            with self._lock:
+                self._free.append(body.buffer)
+        body.buffer = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'max_bytes': self.max_bytes, 'free_buffers': len(self._free)}
+
+    def _acquire(self, declared: int) -> RawBody:
+        with self._lock:
+            if self._free:
+                self._stats['pooled'] += 1
+                return RawBody(self._free.pop(), 0, pooled=True)
+            self._stats['allocated'] += 1
+        # Pool exhausted: size a one-off buffer from Content-Length when known
+        return RawBody(np.empty(declared or self.max_bytes, dtype=np.uint8), 0, pooled=False)
@@ -0,0 +1,438 @@
+"""
+Capture retention: disk quota, maximum age and recompression.
+
+Keeps an index of captures (bytes on disk, capture time, whether any
+detection is a disease) that /capture updates incrementally, so
+compaction never rescans the directory or re-reads capture JSON. The
+index is persisted next to the captures; on startup only the directory
+listing is reconciled against it.
+
+Each compaction pass:
+1. deletes captures older than max_age_days (disease-positive captures
+   use positive_max_age_days instead),
+2. deletes the oldest captures until usage is under the quota, healthy
+   or empty ones before disease-positive ones when keep_positive is set,
+3. recompresses originals older than recompress_after_days to a lower
+   JPEG quality or WebP, keeping the result only if it is smaller. The
+   result is a new file (<id>_recompressed.jpg or <id>_original.webp)
+   and the capture JSON is pointed at it: capture images are served as
+   immutable, so an image never changes once written (the JSON is
+   served with revalidation).
+
+With several server processes each capture is also appended as one
+line to <index>.log. A pass takes an exclusive lock on <index>.lock
+(only one process compacts at a time), folds the log into the persisted
+index and adopts the result as its own before choosing what to delete,
+then persists the outcome while still holding the lock. Appends and the
+fold are serialized by a short lock on <index>.log.lock.
+
+Analytics rollups are not touched, so history remains queryable after
+captures are deleted (an analytics backfill would drop them).
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+from app import utils
+
+CAPTURE_PREFIX = "capture_"
+# Original (JPEG, or its recompressed JPEG/WebP replacement), detection
+# JSON and the annotated image older versions stored
+RECOMPRESSED_SUFFIXES = {'jpeg': 'recompressed.jpg', 'webp': 'original.webp'}
+CAPTURE_FILE_SUFFIXES = ('original.jpg', *RECOMPRESSED_SUFFIXES.values(), 'data.json', 'detected.jpg')
+DAY_SECONDS = 86400
+
+
+def capture_time(capture_id: str) -> float:
+    """Capture timestamp from an ID like capture_20231228_143052_123456."""
+    return datetime.strptime(capture_id[len(CAPTURE_PREFIX):], "%Y%m%d_%H%M%S_%f").timestamp()
+
+
+def is_disease_positive(detections: List[Dict]) -> bool:
+    """True if any detection is a disease class (not a healthy leaf)."""
+    return any('healthy' not in d.get('class_name', '').lower() for d in detections)
+
+
+class CaptureRetention:
+    """Incremental capture usage tracking with background compaction."""
+
+    def __init__(
+        self,
+        captures_dir: Path,
+        index_path: Path,
+        max_bytes: int = 0,
+        max_age_days: float = 0,
+        positive_max_age_days: Optional[float] = None,
+        keep_positive: bool = True,
+        recompress_after_days: float = 0,
+        recompress_quality: int = 80,
+        recompress_format: str = 'jpeg',
+        interval_s: float = 600,
+        on_delete=None
+    ):
+        """
+        Args:
+            captures_dir: Directory holding capture files
+            index_path: JSON file for the persisted usage index
+            max_bytes: Disk quota for captures (0: no quota)
+            max_age_days: Delete captures older than this (0: keep)
+            positive_max_age_days: Age limit for disease-positive captures
+                (default: same as max_age_days)
+            keep_positive: Under quota pressure, delete healthy/empty
+                captures before disease-positive ones
+            recompress_after_days: Recompress originals older than this (0: never)
+            recompress_quality: JPEG/WebP quality for recompression
+            recompress_format: 'jpeg' or 'webp' (written as a new file,
+                capture JSON updated)
+            interval_s: Seconds between background passes
+            on_delete: Called with the capture ID after a capture is deleted
+        """
+        if recompress_format not in ('jpeg', 'webp'):
+            raise ValueError(f"Unsupported recompress format: {recompress_format}")
+        self.captures_dir = captures_dir
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.positive_max_age_days = positive_max_age_days if positive_max_age_days is not None else max_age_days
+        self.keep_positive = keep_positive
+        self.recompress_after_days = recompress_after_days
+        self.recompress_quality = recompress_quality
+        self.recompress_format = recompress_format
+        self.interval_s = interval_s
+        self.on_delete = on_delete
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._index = {}
+        self._total = 0
+        self._log_path = index_path.with_suffix('.log')
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._totals = {'passes': 0, 'deleted_captures': 0, 'deleted_bytes': 0,
+                        'recompressed': 0, 'recompressed_bytes_saved': 0}
+        self._last_run = None
+
+    def start(self):
+        """Load and reconcile the index, then start background compaction."""
+        with self._process_lock():
+            self._load_index()
+        self._thread = threading.Thread(target=self._run, name='capture-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        with self._process_lock():
+            self._merge_shared_index()
+
+    def record_capture(self, capture_id: str, detections: List[Dict]):
+        """Add a newly written capture to the index (stats its files only)."""
+        entry = self._entry_from_files(capture_id, positive=is_disease_positive(detections))
+        line = (json.dumps({'capture_id': capture_id, **entry}, separators=(',', ':')) + '\n').encode('utf-8')
+        # Under the log lock so a concurrent fold sees the capture either in
+        # the log or, after it replaced the index, in memory
+        with self._file_lock('.log.lock', exclusive=False):
+            fd = os.open(self._log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._total += entry['bytes'] - self._index.get(capture_id, {}).get('bytes', 0)
+                self._index[capture_id] = entry
+                over_quota = self.max_bytes and self._total > self.max_bytes
+        if over_quota:
+            self._wake.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            positive = sum(1 for e in self._index.values() if e['positive'])
+            return {
+                'captures': len(self._index),
+                'positive_captures': positive,
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'max_age_days': self.max_age_days,
+                'positive_max_age_days': self.positive_max_age_days,
+                'recompress_after_days': self.recompress_after_days,
+                'recompress_format': self.recompress_format,
+                'totals': dict(self._totals),
+                'last_run': self._last_run
+            }
+
+    def compact(self, dry_run: bool = False) -> Dict:
+        """
+        Run one retention pass.
+
+        Args:
+            dry_run: Only report what would be deleted/recompressed
+
+        Returns:
+            Summary with deleted captures, recompressed originals and
+            reclaimed bytes
+        """
+        with self._run_lock, self._process_lock():
+            start = time.perf_counter()
+            # Pick up captures recorded and deleted by other processes
+            self._merge_shared_index(consume=not dry_run)
+            now = time.time()
+            victims = self._select_victims(now)
+            victim_set = set(victims)
+            summary = {'dry_run': dry_run, 'deleted_captures': len(victims), 'deleted_bytes': 0,
+                       'recompressed': 0, 'recompressed_bytes_saved': 0}
+
+            for capture_id in victims:
+                summary['deleted_bytes'] += self._index[capture_id]['bytes']
+                if not dry_run:
+                    self._delete(capture_id)
+
+            if self.recompress_after_days:
+                cutoff = now - self.recompress_after_days * DAY_SECONDS
+                with self._lock:
+                    candidates = [cid for cid, e in self._index.items()
+                                  if not e['recompressed'] and e['captured_at'] < cutoff and cid not in victim_set]
+                for capture_id in candidates:
+                    saved = self._recompress(capture_id, dry_run)
+                    if saved is not None:
+                        summary['recompressed'] += 1
+                        summary['recompressed_bytes_saved'] += saved
+
+            summary['reclaimed_bytes'] = summary['deleted_bytes'] + summary['recompressed_bytes_saved']
+            summary['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            summary['finished_at'] = datetime.now().isoformat()
+            if not dry_run:
+                self._totals['passes'] += 1
+                for key in ('deleted_captures', 'deleted_bytes', 'recompressed', 'recompressed_bytes_saved'):
+                    self._totals[key] += summary[key]
+                self._last_run = summary
+                self._save_index()
+            return summary
+
+    def _select_victims(self, now: float) -> List[str]:
+        """Captures to delete for age, then for quota (oldest first)."""
+        with self._lock:
+            entries = sorted(self._index.items(), key=lambda item: item[1]['captured_at'])
+            victims = []
+            for capture_id, entry in entries:
+                limit = self.positive_max_age_days if entry['positive'] else self.max_age_days
+                if limit and entry['captured_at'] < now - limit * DAY_SECONDS:
+                    victims.append(capture_id)
+
+            if self.max_bytes:
+                remaining = self._total - sum(self._index[cid]['bytes'] for cid in victims)
+                chosen = set(victims)
+                # Healthy/empty captures go first when keeping positives longer
+                order = entries
+                if self.keep_positive:
+                    order = ([item for item in entries if not item[1]['positive']] +
+                             [item for item in entries if item[1]['positive']])
+                for capture_id, entry in order:
+                    if remaining <= self.max_bytes:
+                        break
+                    if capture_id not in chosen:
+                        victims.append(capture_id)
+                        chosen.add(capture_id)
+                        remaining -= entry['bytes']
+            return victims
+
+    def _capture_files(self, capture_id: str) -> List[Path]:
+        """Existing files of a capture (checked by name, no directory scan)."""
+        paths = (self.captures_dir / f"{capture_id}_{suffix}" for suffix in CAPTURE_FILE_SUFFIXES)
+        return [p for p in paths if p.exists()]
+
+    def _entry_from_files(self, capture_id: str, positive: bool) -> Dict:
+        files = self._capture_files(capture_id)
+        return {
+            'bytes': sum(p.stat().st_size for p in files),
+            'captured_at': capture_time(capture_id),
+            'positive': positive,
+            'recompressed': any(p.name.endswith(tuple(RECOMPRESSED_SUFFIXES.values())) for p in files)
+        }
+
+    def _delete(self, capture_id: str):
+        for path in self._capture_files(capture_id):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            entry = self._index.pop(capture_id, None)
+            if entry is not None:
+                self._total -= entry['bytes']
+        if self.on_delete is not None:
+            self.on_delete(capture_id)
+
+    def _recompress(self, capture_id: str, dry_run: bool) -> Optional[int]:
+        """Re-encode one original; returns bytes saved, or None if not smaller."""
+        original = self.captures_dir / f"{capture_id}_original.jpg"
+        target = self.captures_dir / f"{capture_id}_{RECOMPRESSED_SUFFIXES[self.recompress_format]}"
+        data_path = self.captures_dir / f"{capture_id}_data.json"
+        if not original.exists() or target.exists():
+            return None
+        data = original.read_bytes()
+        image_bgr = utils.decode_image_bytes(data)
+        if self.recompress_format == 'webp':
+            ok, buffer = cv2.imencode('.webp', image_bgr, [cv2.IMWRITE_WEBP_QUALITY, self.recompress_quality])
+        else:
+            ok, buffer = cv2.imencode('.jpg', image_bgr, [cv2.IMWRITE_JPEG_QUALITY, self.recompress_quality])
+        encoded = buffer.tobytes() if ok else None
+
+        if encoded is None or len(encoded) >= len(data):
+            # Not worth it; don't try this capture again
+            with self._lock:
+                if capture_id in self._index and not dry_run:
+                    self._index[capture_id]['recompressed'] = True
+            return None
+        saved = len(data) - len(encoded)
+        if dry_run:
+            return saved
+
+        # New name rather than rewriting the original: clients may have
+        # cached the old file as immutable
+        tmp_path = target.with_suffix('.tmp')
+        tmp_path.write_bytes(encoded)
+        os.replace(tmp_path, target)
+        with open(data_path, 'r') as f:
+            capture_data = json.load(f)
+        capture_data['original_image'] = target.name
+        tmp_data = data_path.with_suffix('.tmp')
+        with open(tmp_data, 'w') as f:
+            json.dump(capture_data, f, indent=2)
+        os.replace(tmp_data, data_path)
+        original.unlink()
+
+        entry = self._entry_from_files(capture_id, positive=False)
+        with self._lock:
+            if capture_id in self._index:
+                old = self._index[capture_id]
+                self._total += entry['bytes'] - old['bytes']
+                old['bytes'] = entry['bytes']
+                old['recompressed'] = True
+        return saved
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                summary = self.compact()
+                if summary['deleted_captures'] or summary['recompressed']:
+                    print(f"Capture retention: deleted {summary['deleted_captures']} capture(s), "
+                          f"recompressed {summary['recompressed']}, "
+                          f"reclaimed {summary['reclaimed_bytes'] / 2**20:.1f} MB")
+            except Exception as e:
+                print(f"Error in capture retention: {e}")
+
+    def _process_lock(self):
+        """Exclusive lock shared by every process using this index."""
+        return self._file_lock('.lock')
+
+    @contextmanager
+    def _file_lock(self, suffix: str, exclusive: bool = True):
+        """flock on <index><suffix>; also serializes threads of this process."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.index_path.with_suffix(suffix), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge_shared_index(self, consume: bool = True):
+        """
+        Replace this process's entries with the persisted index plus the
+        captures every process appended to the log, without listing the
+        directory. Caller holds the process lock.
+
+        Args:
+            consume: Persist the merged index and empty the log
+        """
+        with self._file_lock('.log.lock'):
+            self._adopt_index(self._read_shared_index())
+            if consume:
+                self._save_index()
+                self._truncate_log()
+
+    def _load_index(self):
+        """
+        Merge the persisted index and log, then reconcile the result with
+        the directory listing (startup only). Caller holds the process lock.
+        """
+        # record_capture waits on the log lock, so no capture is missed
+        # between reading the log and emptying it
+        with self._file_lock('.log.lock'):
+            index = self._read_shared_index()
+            on_disk = {
+                entry.name.rsplit('_', 1)[0]
+                for entry in os.scandir(self.captures_dir)
+                if entry.is_file() and entry.name.startswith(CAPTURE_PREFIX) and entry.name.endswith('_data.json')
+            }
+            for capture_id in set(index) - on_disk:
+                del index[capture_id]
+            for capture_id in sorted(on_disk - set(index)):
+                # Only captures the index hasn't seen are read
+                try:
+                    with open(self.captures_dir / f"{capture_id}_data.json", 'r') as f:
+                        detections = json.load(f).get('detections', [])
+                    index[capture_id] = self._entry_from_files(capture_id, is_disease_positive(detections))
+                except (OSError, ValueError) as e:
+                    print(f"WARNING: Skipping capture {capture_id} in retention index: {e}")
+
+            self._adopt_index(index)
+            self._save_index()
+            self._truncate_log()
+
+    def _read_shared_index(self) -> Dict[str, Dict]:
+        """Persisted index with the log applied. Caller holds the log lock."""
+        index = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r') as f:
+                    index = json.load(f).get('captures', {})
+            except (OSError, ValueError) as e:
+                print(f"WARNING: Rebuilding capture retention index: {e}")
+        try:
+            with open(self._log_path, 'rb') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                index[entry.pop('capture_id')] = entry
+            except (ValueError, KeyError):
+                continue
+        return index
+
+    def _adopt_index(self, index: Dict[str, Dict]):
+        with self._lock:
+            self._index = index
+            self._total = sum(e['bytes'] for e in index.values())
+
+    def _truncate_log(self):
+        if self._log_path.exists():
+            os.truncate(self._log_path, 0)
+
+    def _save_index(self):
+        with self._lock:
+            payload = {'captures': dict(self._index)}
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self.index_path)
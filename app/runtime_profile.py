@@ -0,0 +1,82 @@
+"""
+Host-specific CPU runtime profile.
+scripts/autotune_cpu.py benchmarks thread counts, worker count and imgsz on
+this machine and writes the best configuration to a JSON profile; the
+server reads it at startup and applies the thread settings.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict
+
+import cv2
+
+
+PROFILE_VERSION = 1
+PROFILE_KEYS = ('torch_threads', 'cv2_threads', 'workers', 'imgsz')
+
+
+def load_profile(path: Path) -> Dict:
+    """
+    Read a runtime profile.
+
+    Args:
+        path: Profile JSON path
+
+    Returns:
+        Profile dictionary, or {} if missing or unreadable
+    """
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r') as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring runtime profile {path}: {e}")
+        return {}
+
+    if profile.get('version') != PROFILE_VERSION:
+        print(f"WARNING: Ignoring runtime profile {path}: unsupported version {profile.get('version')}")
+        return {}
+    if profile.get('cpu_count') != os.cpu_count():
+        print(f"WARNING: Runtime profile {path} was tuned on {profile.get('cpu_count')} CPUs, "
+              f"this host has {os.cpu_count()}; re-run scripts/autotune_cpu.py")
+    return profile
+
+
+def save_profile(path: Path, profile: Dict):
+    """
+    Write a runtime profile atomically.
+
+    Args:
+        path: Profile JSON path
+        profile: Settings plus benchmark metadata
+    """
+    missing = [key for key in PROFILE_KEYS if key not in profile]
+    if missing:
+        raise ValueError(f"Runtime profile missing keys: {missing}")
+    profile = {'version': PROFILE_VERSION, 'cpu_count': os.cpu_count(), **profile}
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def apply_threads(torch_threads: int = 0, cv2_threads: int = -1) -> Dict:
+    """
+    Set PyTorch intra-op and OpenCV thread counts for this process.
+
+    Args:
+        torch_threads: PyTorch intra-op threads (0 keeps the default)
+        cv2_threads: OpenCV threads (0 disables threading, <0 keeps the default)
+
+    Returns:
+        Thread counts in effect afterwards
+    """
+    import torch
+
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+    if cv2_threads >= 0:
+        cv2.setNumThreads(cv2_threads)
+    return {'torch_threads': torch.get_num_threads(), 'cv2_threads': cv2.getNumThreads()}
@@ -0,0 +1,163 @@
+"""
+Response serialization for detection payloads.
+Supports field selection, a fast JSON encoder and optional MessagePack.
+"""
+import json
+from typing import Dict, Iterable, Optional, Set
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_ACCEPT_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """
+    Parse a comma-separated field selector.
+
+    Args:
+        fields: Selector like "detections,feedback.summary" (None = all fields)
+
+    Returns:
+        Set of field paths, or None to keep everything
+    """
+    if not fields:
+        return None
+    return {f.strip() for f in fields.split(',') if f.strip()}
+
+
+def wants_field(selected: Optional[Set[str]], name: str) -> bool:
+    """
+    Check whether a top-level field is requested.
+    Lets endpoints skip work (e.g. JPEG encoding) for unrequested fields.
+
+    Args:
+        selected: Parsed field selector (None = all fields)
+        name: Top-level field name
+
+    Returns:
+        True if the field (or any sub-field of it) is selected
+    """
+    if selected is None:
+        return True
+    return any(f == name or f.startswith(name + '.') for f in selected)
+
+
+def select_fields(payload: Dict, selected: Optional[Iterable[str]]) -> Dict:
+    """
+    Keep only selected fields. Dotted paths select nested keys
+    (e.g. "feedback.summary" keeps only payload['feedback']['summary']).
+
+    Args:
+        payload: Full response dictionary
+        selected: Field paths to keep (None = all fields)
+
+    Returns:
+        Filtered dictionary
+    """
+    if selected is None:
+        return payload
+
+    result = {}
+    for path in selected:
+        head, _, rest = path.partition('.')
+        if head not in payload:
+            continue
+        value = payload[head]
+        if rest and isinstance(value, dict):
+            nested = select_fields(value, [rest])
+            if nested:
+                result.setdefault(head, {}).update(nested)
+        else:
+            result[head] = value
+    return result
+
+
+def negotiate_encoding(encoding: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick response encoding from an explicit parameter or the Accept header.
+
+    Args:
+        encoding: "json" or "msgpack" (takes precedence)
+        accept: Request Accept header
+
+    Returns:
+        "json" or "msgpack"
+
+    Raises:
+        ValueError: If an unknown or unavailable encoding is requested
+    """
+    if encoding:
+        encoding = encoding.lower()
+        if encoding not in ("json", "msgpack"):
+            raise ValueError(f"Unknown encoding: {encoding}")
+    elif accept and any(t in accept for t in MSGPACK_ACCEPT_TYPES):
+        encoding = "msgpack"
+    else:
+        encoding = "json"
+
+    if encoding == "msgpack" and msgpack is None:
+        raise ValueError("MessagePack encoding requested but msgpack is not installed")
+    return encoding
+
+
+def encode_json(payload: Dict) -> bytes:
+    """
+    Encode payload as JSON bytes, using orjson when installed.
+
+    Args:
+        payload: Response dictionary
+
+    Returns:
+        UTF-8 JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def encode_msgpack(payload: Dict) -> bytes:
+    """
+    Encode payload as MessagePack. bytes values stay binary, so images
+    can be sent without base64 overhead.
+
+    Args:
+        payload: Response dictionary
+
+    Returns:
+        MessagePack bytes
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode(payload: Dict, encoding: str) -> bytes:
+    """
+    Encode payload with the negotiated encoding.
+
+    Args:
+        payload: Response dictionary
+        encoding: "json" or "msgpack"
+
+    Returns:
+        Encoded bytes
+    """
+    if encoding == "msgpack":
+        return encode_msgpack(payload)
+    return encode_json(payload)
+
+
+def media_type(encoding: str) -> str:
+    """Get media type for an encoding."""
+    return MSGPACK_MEDIA_TYPE if encoding == "msgpack" else JSON_MEDIA_TYPE
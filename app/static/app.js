@@ -31,10 +31,65 @@ const disclaimerText = document.getElementById("disclaimerText");
 const metricsDisplay = document.getElementById("metricsDisplay");
 const captureToast = document.getElementById("captureToast");
 const loadingOverlay = document.getElementById("loadingOverlay");
+const zoomPanel = document.getElementById("zoomPanel");
+const zoomImage = document.getElementById("zoomImage");
+const zoomDetections = document.getElementById("zoomDetections");
+const zoomCloseBtn = document.getElementById("zoomCloseBtn");
+
+// Hanya field yang dipakai loop live yang diminta dari /detect
+const DETECT_FIELDS =
+  "detections,feedback,annotated_jpeg_base64,inference_time_ms,quality_metrics";
+
+// Siarkan hasil anotasi ke penonton lain: buka halaman dengan ?broadcast=nama
+// lalu penonton membuka /broadcast/nama/mjpeg (inferensi tetap sekali per frame)
+const BROADCAST_CHANNEL = new URLSearchParams(window.location.search).get(
+  "broadcast"
+);
+const DETECT_URL = BROADCAST_CHANNEL
+  ? `/detect?fields=${DETECT_FIELDS}&broadcast=${encodeURIComponent(
+      BROADCAST_CHANNEL
+    )}`
+  : `/detect?fields=${DETECT_FIELDS}`;
+
+// Tap-to-zoom: sisi ROI relatif terhadap sisi terpendek frame (min. dalam px)
+const ZOOM_ROI_FRACTION = 0.35;
+const ZOOM_MIN_ROI_PX = 160;
+const ZOOM_FIELDS = "detections,annotated_jpeg_base64,roi,inference_time_ms";
+
+// Frame yang hasilnya sedang ditampilkan di annotatedImage
+let resultFrameBlob = null;
 
 // Video preview state
 let videoPreviewInterval = null;
 
+// Teks umpan balik statis (penafian, saran per kelas) dari /feedback/static
+let feedbackStatic = null;
+
+// ID per tab untuk admission control server (banyak tab/ponsel bisa berbagi IP)
+const CLIENT_ID =
+  sessionStorage.getItem("clientId") ||
+  (window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(16).slice(2)}`);
+sessionStorage.setItem("clientId", CLIENT_ID);
+
+// Jeda tambahan (ms) setelah server menolak frame dengan 429
+let throttleDelayMs = 0;
+
+/**
+ * Muat teks umpan balik statis sekali; browser meng-cache via ETag
+ */
+async function loadFeedbackStatic() {
+  try {
+    const response = await fetch("/feedback/static");
+    if (response.ok) {
+      feedbackStatic = await response.json();
+    }
+  } catch (error) {
+    console.error("Error memuat umpan balik statis:", error);
+  }
+}
+
 /**
  * Gambar video ke canvas secara kontinyu
  */
@@ -142,15 +197,22 @@ function captureFrame() {
  * Kirim frame ke server untuk deteksi
  */
 async function detectFrame(frameBlob) {
-  const formData = new FormData();
-  formData.append("file", frameBlob, "frame.jpg");
-
   try {
-    const response = await fetch("/detect", {
+    // Blob JPEG dikirim langsung sebagai body (tanpa multipart): server
+    // membacanya ke buffer yang dipakai ulang dan men-decode tanpa salinan
+    const response = await fetch(DETECT_URL, {
       method: "POST",
-      body: formData,
+      headers: { "X-Client-Id": CLIENT_ID, "Content-Type": "image/jpeg" },
+      body: frameBlob,
     });
 
+    if (response.status === 429) {
+      // Frame ditolak (terlalu cepat / diganti frame lebih baru): lewati saja
+      const retryAfter = parseFloat(response.headers.get("Retry-After") || "1");
+      throttleDelayMs = retryAfter * 1000;
+      return null;
+    }
+
     if (!response.ok) {
       const error = await response.json();
       throw new Error(error.detail || "Deteksi gagal");
@@ -176,28 +238,8 @@ function updateResults(result) {
   annotatedImage.src = `data:image/jpeg;base64,${result.annotated_jpeg_base64}`;
 
   // Update daftar deteksi
-  detectionsList.innerHTML = "";
   if (result.detections && result.detections.length > 0) {
-    result.detections.forEach((det) => {
-      const detDiv = document.createElement("div");
-      detDiv.className = "detection-item";
-
-      const confidence = (det.confidence * 100).toFixed(1);
-      const confidenceClass =
-        det.confidence >= 0.7
-          ? "high"
-          : det.confidence >= 0.5
-          ? "medium"
-          : "low";
-
-      detDiv.innerHTML = `
-                <div class="detection-name">${det.class_name}</div>
-                <div class="detection-confidence confidence-${confidenceClass}">
-                    ${confidence}%
-                </div>
-            `;
-      detectionsList.appendChild(detDiv);
-    });
+    renderDetectionItems(detectionsList, result.detections);
   } else {
     detectionsList.innerHTML =
       '<div class="no-detection">Tidak ada penyakit terdeteksi</div>';
@@ -227,7 +269,27 @@ function updateResults(result) {
   // Update feedback - saran
   suggestionsList.innerHTML = "";
   if (result.feedback && result.feedback.suggestions) {
-    result.feedback.suggestions.forEach((suggestion) => {
+    const suggestions = [...result.feedback.suggestions];
+
+    // Saran per kelas dirujuk dengan ID; uraikan dari teks statis dan
+    // sisipkan di posisi yang sama dengan mode lengkap
+    if (result.feedback.suggestion_refs && feedbackStatic) {
+      const expanded = [];
+      Object.entries(result.feedback.suggestion_refs).forEach(
+        ([className, suggestionId]) => {
+          const items = feedbackStatic.suggestions[suggestionId] || [];
+          expanded.push(`\n📋 Untuk ${className}:`);
+          items.forEach((s) => expanded.push(`  • ${s}`));
+        }
+      );
+      const at =
+        typeof result.feedback.suggestion_refs_at === "number"
+          ? result.feedback.suggestion_refs_at
+          : suggestions.length;
+      suggestions.splice(at, 0, ...expanded);
+    }
+
+    suggestions.forEach((suggestion) => {
       const item = document.createElement("div");
       item.className = "feedback-item";
       item.textContent = suggestion;
@@ -238,6 +300,12 @@ function updateResults(result) {
   // Update disclaimer
   if (result.feedback && result.feedback.disclaimer) {
     disclaimerText.textContent = result.feedback.disclaimer;
+  } else if (
+    result.feedback &&
+    feedbackStatic &&
+    result.feedback.disclaimer_id === feedbackStatic.disclaimer.id
+  ) {
+    disclaimerText.textContent = feedbackStatic.disclaimer.text;
   }
 
   // Update metrik
@@ -295,9 +363,14 @@ async function detectionLoop() {
 
     // Kirim ke server
     const result = await detectFrame(frameBlob);
+    if (!result) {
+      setTimeout(detectionLoop, Math.max(500, throttleDelayMs));
+      return;
+    }
 
     // Update UI
     updateResults(result);
+    resultFrameBlob = frameBlob;
 
     // Update FPS
     frameCount++;
@@ -321,6 +394,88 @@ async function detectionLoop() {
   setTimeout(detectionLoop, 500); // ~2 FPS untuk koneksi lambat
 }
 
+/**
+ * Isi daftar deteksi (nama kelas + confidence)
+ */
+function renderDetectionItems(container, detections) {
+  container.innerHTML = "";
+  detections.forEach((det) => {
+    const detDiv = document.createElement("div");
+    detDiv.className = "detection-item";
+
+    const confidence = (det.confidence * 100).toFixed(1);
+    const confidenceClass =
+      det.confidence >= 0.7 ? "high" : det.confidence >= 0.5 ? "medium" : "low";
+
+    detDiv.innerHTML = `
+                <div class="detection-name">${det.class_name}</div>
+                <div class="detection-confidence confidence-${confidenceClass}">
+                    ${confidence}%
+                </div>
+            `;
+    container.appendChild(detDiv);
+  });
+}
+
+/**
+ * Ketuk gambar hasil: kirim frame yang sama dengan ROI di sekitar titik
+ * ketukan. Server memotong frame pada resolusi asli (tanpa diperkecil ke
+ * 640) sehingga lesi kecil terlihat lebih detail.
+ */
+async function zoomAt(event) {
+  const width = annotatedImage.naturalWidth;
+  const height = annotatedImage.naturalHeight;
+  if (!resultFrameBlob || !width || !height) return;
+
+  // Posisi ketukan dalam piksel frame (gambar bisa object-fit: contain)
+  const rect = annotatedImage.getBoundingClientRect();
+  const scale = Math.min(rect.width / width, rect.height / height);
+  const x = (event.clientX - rect.left - (rect.width - width * scale) / 2) / scale;
+  const y = (event.clientY - rect.top - (rect.height - height * scale) / 2) / scale;
+  if (x < 0 || y < 0 || x > width || y > height) return;
+
+  const side = Math.min(
+    Math.max(ZOOM_MIN_ROI_PX, Math.round(Math.min(width, height) * ZOOM_ROI_FRACTION)),
+    width,
+    height
+  );
+  const x1 = Math.min(Math.max(0, Math.round(x - side / 2)), width - side);
+  const y1 = Math.min(Math.max(0, Math.round(y - side / 2)), height - side);
+  const roi = [x1, y1, x1 + side, y1 + side].join(",");
+
+  try {
+    zoomPanel.classList.remove("hidden");
+    zoomDetections.innerHTML = "<p>Menganalisis area...</p>";
+    const response = await fetch(`/detect?fields=${ZOOM_FIELDS}&roi=${roi}`, {
+      method: "POST",
+      // ID terpisah agar tidak menggantikan frame loop live di antrean server
+      headers: { "X-Client-Id": `${CLIENT_ID}-zoom`, "Content-Type": "image/jpeg" },
+      body: resultFrameBlob,
+    });
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || "Perbesar gagal");
+    }
+
+    const result = await response.json();
+    zoomImage.src = `data:image/jpeg;base64,${result.annotated_jpeg_base64}`;
+    if (result.detections.length > 0) {
+      renderDetectionItems(zoomDetections, result.detections);
+    } else {
+      zoomDetections.innerHTML =
+        '<div class="no-detection">Tidak ada penyakit terdeteksi di area ini</div>';
+    }
+  } catch (error) {
+    console.error("Error perbesar:", error);
+    zoomDetections.innerHTML = `<p>Error: ${error.message}</p>`;
+  }
+}
+
+function closeZoom() {
+  zoomPanel.classList.add("hidden");
+  zoomImage.src = "";
+}
+
 /**
  * Mulai deteksi
  */
@@ -357,6 +512,138 @@ function stopDetection() {
   fpsCounter.textContent = "0 FPS";
 }
 
+/**
+ * Antrean tangkapan offline: tangkapan disimpan di IndexedDB lalu diunggah
+ * per batch ke /capture/batch. Server mendeduplikasi berdasarkan hash isi,
+ * jadi unggah ulang setelah koneksi putus tidak diinferensi dua kali.
+ */
+const CAPTURE_DB_NAME = "plant-capture-queue";
+const CAPTURE_STORE = "captures";
+const CAPTURE_BATCH_SIZE = 8;
+const CAPTURE_FLUSH_INTERVAL_MS = 30000;
+let captureDbPromise = null;
+let isFlushingQueue = false;
+
+function openCaptureDb() {
+  if (!window.indexedDB) return Promise.resolve(null);
+  if (!captureDbPromise) {
+    captureDbPromise = new Promise((resolve) => {
+      const request = indexedDB.open(CAPTURE_DB_NAME, 1);
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore(CAPTURE_STORE, { keyPath: "id" });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => {
+        console.error("IndexedDB tidak tersedia:", request.error);
+        resolve(null);
+      };
+    });
+  }
+  return captureDbPromise;
+}
+
+/**
+ * Jalankan satu operasi pada store antrean; selesai saat transaksi selesai
+ */
+function captureStoreRequest(db, mode, operation) {
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction(CAPTURE_STORE, mode);
+    const request = operation(transaction.objectStore(CAPTURE_STORE));
+    transaction.oncomplete = () => resolve(request ? request.result : undefined);
+    transaction.onerror = () => reject(transaction.error);
+  });
+}
+
+async function queueCapture(db, blob) {
+  const item = {
+    id:
+      window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(16).slice(2)}`,
+    blob: blob,
+    captured_at: new Date().toISOString(),
+  };
+  await captureStoreRequest(db, "readwrite", (store) => store.put(item));
+  return item.id;
+}
+
+/**
+ * Unggah antrean per batch. Mengembalikan hasil per ID lokal dan jumlah
+ * tangkapan yang masih menunggu.
+ */
+async function flushCaptureQueue() {
+  const db = await openCaptureDb();
+  const uploaded = {};
+  if (!db || isFlushingQueue || !navigator.onLine) {
+    return { uploaded, pending: db ? await countQueuedCaptures(db) : 0 };
+  }
+
+  isFlushingQueue = true;
+  try {
+    while (true) {
+      const items = await captureStoreRequest(db, "readonly", (store) =>
+        store.getAll(null, CAPTURE_BATCH_SIZE)
+      );
+      if (!items.length) break;
+
+      const formData = new FormData();
+      items.forEach((item) => formData.append("files", item.blob, "capture.jpg"));
+      formData.append(
+        "meta",
+        JSON.stringify(
+          items.map((item) => ({ client_id: item.id, captured_at: item.captured_at }))
+        )
+      );
+
+      const response = await fetch("/capture/batch", {
+        method: "POST",
+        body: formData,
+      });
+      if (!response.ok) {
+        throw new Error(`Unggah batch gagal (${response.status})`);
+      }
+      const result = await response.json();
+
+      // Hapus yang sudah tersimpan (atau duplikat) dan yang ditolak permanen
+      const done = result.results.filter((r) => r.capture_id || r.error);
+      await captureStoreRequest(db, "readwrite", (store) => {
+        done.forEach((r) => store.delete(r.client_id));
+      });
+      done.forEach((r) => {
+        uploaded[r.client_id] = r;
+      });
+      if (done.length < items.length) break;
+    }
+  } catch (error) {
+    // Offline atau server tidak terjangkau: coba lagi nanti
+    console.error("Error unggah antrean tangkapan:", error);
+  } finally {
+    isFlushingQueue = false;
+  }
+  return { uploaded, pending: await countQueuedCaptures(db) };
+}
+
+function countQueuedCaptures(db) {
+  return captureStoreRequest(db, "readonly", (store) => store.count());
+}
+
+/**
+ * Unggah langsung tanpa antrean (browser tanpa IndexedDB)
+ */
+async function uploadCaptureDirect(blob) {
+  const response = await fetch("/capture", {
+    method: "POST",
+    headers: { "Content-Type": "image/jpeg" },
+    body: blob,
+  });
+
+  if (!response.ok) {
+    throw new Error("Tangkapan gagal");
+  }
+
+  return response.json();
+}
+
 /**
  * Tangkap frame dan hasil saat ini
  */
@@ -369,24 +656,31 @@ async function captureImage() {
   try {
     loadingOverlay.classList.remove("hidden");
 
-    const formData = new FormData();
-    formData.append("file", lastFrameBlob, "capture.jpg");
-
-    const response = await fetch("/capture", {
-      method: "POST",
-      body: formData,
-    });
-
-    if (!response.ok) {
-      throw new Error("Tangkapan gagal");
+    const db = await openCaptureDb();
+    if (!db) {
+      const result = await uploadCaptureDirect(lastFrameBlob);
+      loadingOverlay.classList.add("hidden");
+      showToast(`Tangkapan tersimpan! (${result.capture_id})`);
+      return;
     }
 
-    const result = await response.json();
+    // Simpan dulu ke antrean, lalu coba unggah (bersama antrean lama)
+    const localId = await queueCapture(db, lastFrameBlob);
+    const { uploaded, pending } = await flushCaptureQueue();
 
     loadingOverlay.classList.add("hidden");
 
-    // Tampilkan toast sukses
-    showToast(`Tangkapan tersimpan! (${result.capture_id})`);
+    const result = uploaded[localId];
+    if (result && result.capture_id) {
+      // Tampilkan toast sukses
+      showToast(`Tangkapan tersimpan! (${result.capture_id})`);
+    } else if (result && result.error) {
+      throw new Error(result.error);
+    } else {
+      showToast(
+        `Tangkapan disimpan di perangkat, diunggah saat online (${pending} menunggu)`
+      );
+    }
   } catch (error) {
     loadingOverlay.classList.add("hidden");
     console.error("Error tangkap:", error);
@@ -394,6 +688,17 @@ async function captureImage() {
   }
 }
 
+/**
+ * Unggah antrean di latar belakang saat koneksi kembali
+ */
+async function syncCaptureQueue() {
+  const { uploaded } = await flushCaptureQueue();
+  const count = Object.values(uploaded).filter((r) => r.capture_id).length;
+  if (count) {
+    showToast(`${count} tangkapan dari antrean terunggah`);
+  }
+}
+
 /**
  * Tampilkan notifikasi toast
 }
@@ -416,6 +721,8 @@ startBtn.addEventListener("click", startDetection);
 stopBtn.addEventListener("click", stopDetection);
 captureBtn.addEventListener("click", captureImage);
 switchCameraBtn.addEventListener("click", switchCamera);
+annotatedImage.addEventListener("click", zoomAt);
+zoomCloseBtn.addEventListener("click", closeZoom);
 
 /**
  * Inisialisasi saat halaman dimuat
@@ -430,10 +737,19 @@ window.addEventListener("load", async () => {
     return;
   }
 
+  // Muat teks umpan balik statis sebelum loop deteksi dimulai
+  loadFeedbackStatic();
+
+  // Unggah tangkapan yang tertunda dari sesi offline sebelumnya
+  syncCaptureQueue();
+  setInterval(syncCaptureQueue, CAPTURE_FLUSH_INTERVAL_MS);
+
   // Inisialisasi kamera
   await initCamera();
 });
 
+window.addEventListener("online", syncCaptureQueue);
+
 /**
  * Bersihkan saat halaman dibongkar
 });
@@ -89,8 +89,11 @@ def compute_blur_metric(image_bgr: np.ndarray) -> float:
         Laplacian variance (higher = sharper)
     """
     gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-    laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-    return float(laplacian.var())
+    # 3x3 Laplacian of 8-bit input fits in int16 exactly; a CV_64F result
+    # would allocate a full-resolution float64 array per frame
+    laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+    _, stddev = cv2.meanStdDev(laplacian)
+    return float(stddev[0, 0] ** 2)
 
 
 def compute_image_quality_metrics(image_bgr: np.ndarray) -> dict:
@@ -2,18 +2,34 @@
 YOLOv8 inference module for plant leaf disease detection.
 Enhanced with green detection and confidence filtering to reduce false positives.
 """
+import math
+import threading
+import time
 import cv2
 import numpy as np
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from ultralytics import YOLO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.optimized_runner import OptimizedRunner, detections_from_array
 
 
 class YOLODetector:
-    """Singleton YOLOv8 detector for plant leaf diseases with enhanced filtering."""
+    """
+    Singleton YOLOv8 detector for plant leaf diseases with enhanced filtering.
+
+    Holds a registry of named models so new weights can be loaded and
+    swapped in without a restart. Requests resolve the model once at the
+    start, so in-flight calls finish on the model they started with even
+    if the active model changes underneath them.
+    """
 
     _instance = None
     _model = None
+    _active_name = None
+    _models = {}
+    _cascade_stats = {}
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -24,34 +40,227 @@ class YOLODetector:
         """Initialize detector (lazy loading)."""
         pass
 
-    def load_model(self, model_path: str, conf_threshold: float = 0.35):
+    def load_model(
+        self,
+        model_path: str,
+        conf_threshold: float = 0.35,
+        name: Optional[str] = None,
+        activate: Optional[bool] = None,
+        reload: bool = False,
+        optimize: bool = False,
+        compile_model: bool = False,
+        warmup_imgsz: Iterable[int] = (),
+        warmup_runs: int = 0
+    ) -> Dict:
         """
-        Load YOLO model.
+        Load YOLO model into the registry.
+        The new weights are loaded (and warmed up if requested) outside the
+        registry and published in one swap, so reloading a name that is
+        serving requests never exposes a cold model.
 
         Args:
             model_path: Path to model weights (.pt file)
             conf_threshold: Confidence threshold for detections (default: 0.35)
+            name: Registry name (default: file stem, e.g. "best")
+            activate: Make this the active model. None activates only if no
+                model is active yet.
+            reload: Load again even if a model with this name exists
+            optimize: Prepare the optimized CPU execution path (fused,
+                channels-last, preallocated inputs; see optimized_runner)
+            compile_model: Also wrap the network in torch.compile
+            warmup_imgsz: Input sizes to warm up before publishing
+            warmup_runs: Warmup predictions per size (0: publish cold)
+
+        Returns:
+            Registry entry info for the loaded model
         """
-        if self._model is None:
-            model_file = Path(model_path)
-            if not model_file.exists():
-                raise FileNotFoundError(f"Model file not found: {model_path}")
+        model_file = Path(model_path)
+        name = name or model_file.stem
+
+        with self._lock:
+            if name in self._models and not reload:
+                if activate:
+                    self._activate_locked(name)
+                return self._entry_info(self._models[name])
+
+        if not model_file.exists():
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        # Deferred import: pulling in ultralytics (and torch) is the
+        # slowest part of startup, so only pay for it when a model loads
+        from ultralytics import YOLO
+
+        print(f"Loading YOLO model '{name}' from {model_path}...")
+        model = YOLO(str(model_file))
+        runner = None
+        if optimize:
+            try:
+                runner = OptimizedRunner(model, compile_model=compile_model)
+            except ValueError as e:
+                print(f"WARNING: {e}; using model.predict()")
+        entry = {
+            'name': name,
+            'path': str(model_file),
+            'model': model,
+            'runner': runner,
+            'conf_threshold': conf_threshold,
+            'loaded_at': datetime.now().isoformat(),
+            'file_bytes': model_file.stat().st_size,
+            'memory_bytes': self._estimate_model_bytes(model),
+            'warm': False
+        }
+        print(f"Model loaded successfully. Classes: {model.names}")
+        print(f"Confidence threshold: {conf_threshold}")
+        if warmup_runs:
+            self._warmup_entry(entry, warmup_imgsz, warmup_runs)
+
+        with self._lock:
+            # Reloading the active name swaps it in place
+            replacing_active = name == self._active_name
+            self._models[name] = entry
+            if activate or replacing_active or (activate is None and self._model is None):
+                self._activate_locked(name)
+
+        return self._entry_info(entry)
+
+    def activate_model(self, name: str) -> Dict:
+        """
+        Atomically make a loaded model the active one.
+
+        Args:
+            name: Registry name of a loaded model
+
+        Returns:
+            Registry entry info for the activated model
+        """
+        with self._lock:
+            if name not in self._models:
+                raise KeyError(f"Model not loaded: {name}")
+            self._activate_locked(name)
+            return self._entry_info(self._models[name])
+
+    def unload_model(self, name: str) -> None:
+        """
+        Remove a model from the registry.
+        Requests already running on it keep their reference until they finish.
+
+        Args:
+            name: Registry name of a loaded model
+        """
+        with self._lock:
+            if name not in self._models:
+                raise KeyError(f"Model not loaded: {name}")
+            if name == self._active_name:
+                raise ValueError(f"Cannot unload active model '{name}'; activate another model first")
+            del self._models[name]
+
+    def list_models(self) -> List[Dict]:
+        """List loaded models with memory footprint and active flag."""
+        with self._lock:
+            return [self._entry_info(entry) for entry in self._models.values()]
+
+    def _activate_locked(self, name: str):
+        """Swap active model. Caller must hold the lock."""
+        entry = self._models[name]
+        self._active_name = name
+        self._model = entry['model']
+        self.conf_threshold = entry['conf_threshold']
+
+    def _resolve(self, model_name: Optional[str] = None) -> Dict:
+        """Get registry entry by name, or the active entry."""
+        with self._lock:
+            name = model_name or self._active_name
+            if name is None:
+                raise RuntimeError("Model not loaded. Call load_model() first.")
+            if name not in self._models:
+                raise KeyError(f"Model not loaded: {name}")
+            return self._models[name]
+
+    def _entry_info(self, entry: Dict) -> Dict:
+        """Registry entry without the model object."""
+        info = {k: v for k, v in entry.items() if k not in ('model', 'runner')}
+        info['optimized'] = entry['runner'].describe() if entry.get('runner') else None
+        info['active'] = entry['name'] == self._active_name
+        return info
+
+    @staticmethod
+    def _estimate_model_bytes(model) -> int:
+        """
+        Estimate resident size of model weights.
+
+        Args:
+            model: Loaded YOLO model
 
-            print(f"Loading YOLO model from {model_path}...")
-            self._model = YOLO(model_path)
-            self.conf_threshold = conf_threshold
-            print(f"Model loaded successfully. Classes: {self._model.names}")
-            print(f"Confidence threshold: {conf_threshold}")
+        Returns:
+            Bytes held by parameters and buffers
+        """
+        module = getattr(model, 'model', None)
+        if module is None or not hasattr(module, 'parameters'):
+            return 0
+        total = sum(p.numel() * p.element_size() for p in module.parameters())
+        total += sum(b.numel() * b.element_size() for b in module.buffers())
+        return int(total)
 
     def is_loaded(self) -> bool:
         """Check if model is loaded."""
         return self._model is not None
 
-    def get_class_names(self) -> dict:
+    def is_ready(self) -> bool:
+        """Check if active model is loaded and has completed warmup."""
+        if self._model is None:
+            return False
+        try:
+            return self._resolve()['warm']
+        except (KeyError, RuntimeError):
+            return False
+
+    def warmup(
+        self,
+        imgsz_list: Iterable[int] = (640,),
+        runs: int = 1,
+        model_name: Optional[str] = None
+    ) -> Dict[int, float]:
+        """
+        Run warmup predictions on synthetic frames.
+        The first predict call at a given size pays for lazy predictor setup
+        and kernel selection; doing it here keeps that cost off real requests.
+
+        Args:
+            imgsz_list: Input sizes that will be served
+            runs: Number of warmup predictions per size (0 disables warmup)
+            model_name: Registry name (default: active model)
+
+        Returns:
+            Dictionary mapping imgsz to total warmup time in milliseconds
+        """
+        return self._warmup_entry(self._resolve(model_name), imgsz_list, runs)
+
+    @staticmethod
+    def _warmup_entry(entry: Dict, imgsz_list: Iterable[int], runs: int) -> Dict[int, float]:
+        """Warm up one registry entry, which need not be published yet."""
+        model = entry['model']
+        runner = entry.get('runner')
+
+        timings = {}
+        for imgsz in imgsz_list:
+            # Mid-gray frame with some noise so NMS sees realistic input
+            frame = np.random.randint(96, 160, (imgsz, imgsz, 3), dtype=np.uint8)
+            start = time.perf_counter()
+            for _ in range(runs):
+                if runner is not None:
+                    runner(frame, conf=entry['conf_threshold'], imgsz=imgsz)
+                else:
+                    model.predict(frame, imgsz=imgsz, verbose=False)
+            timings[imgsz] = (time.perf_counter() - start) * 1000
+
+        entry['warm'] = True
+        return timings
+
+    def get_class_names(self, model_name: Optional[str] = None) -> dict:
         """Get class names dictionary."""
         if self._model is None:
             return {}
-        return self._model.names
+        return self._resolve(model_name)['model'].names
 
     @staticmethod
     def calculate_green_ratio(image_bgr: np.ndarray, bbox_xyxy: List[float]) -> float:
@@ -170,7 +379,9 @@ class YOLODetector:
         enable_filtering: bool = True,
         min_green_ratio: float = 0.15,
         min_area_ratio: float = 0.001,
-        max_area_ratio: float = 0.95
+        max_area_ratio: float = 0.95,
+        model_name: Optional[str] = None,
+        annotate: bool = True
     ) -> Dict:
         """
         Run inference on image with enhanced filtering.
@@ -183,146 +394,629 @@ class YOLODetector:
             min_green_ratio: Minimum green content (0-1)
             min_area_ratio: Minimum box area ratio
             max_area_ratio: Maximum box area ratio
+            model_name: Registry name of model to use (default: active model)
+            annotate: Draw detections on a copy of the image
 
         Returns:
             Dictionary containing:
                 - detections: List of detection dictionaries
                 - raw_detections: Unfiltered detections
-                - annotated_image_bgr: Annotated image
+                - annotated_image_bgr: Annotated image (None if annotate=False)
                 - inference_time_ms: Inference time in milliseconds
                 - filtering_stats: Statistics about filtering
         """
-        if self._model is None:
-            raise RuntimeError("Model not loaded. Call load_model() first.")
+        # Resolve once so a concurrent model swap can't change it mid-request
+        entry = self._resolve(model_name)
+        model = entry['model']
 
-        conf = conf_threshold if conf_threshold is not None else self.conf_threshold
+        conf = conf_threshold if conf_threshold is not None else entry['conf_threshold']
 
-        # Run inference with higher IOU threshold to reduce overlapping boxes
-        results = self._model.predict(
+        runner = entry.get('runner')
+        if runner is not None:
+            det, inference_time_ms = runner(image_bgr, conf=conf, iou=0.5, imgsz=imgsz, max_det=100)
+            raw_detections = detections_from_array(det, model.names)
+        else:
+            # Run inference with higher IOU threshold to reduce overlapping boxes
+            results = model.predict(
+                image_bgr,
+                conf=conf,
+                iou=0.5,  # Higher IOU threshold for better NMS
+                imgsz=imgsz,
+                verbose=False,
+                max_det=100  # Limit maximum detections
+            )
+
+            # Parse results
+            result = results[0]  # Single image
+            raw_detections = self._parse_result(result, model.names)
+            inference_time_ms = result.speed['inference'] if hasattr(result, 'speed') else 0
+
+        detections, filtering_stats = self._apply_filtering(
+            raw_detections,
             image_bgr,
-            conf=conf,
-            iou=0.5,  # Higher IOU threshold for better NMS
-            imgsz=imgsz,
-            verbose=False,
-            max_det=100  # Limit maximum detections
+            enable_filtering,
+            min_green_ratio=min_green_ratio,
+            min_area_ratio=min_area_ratio,
+            max_area_ratio=max_area_ratio
         )
 
-        # Parse results
-        raw_detections = []
-        result = results[0]  # Single image
-
-        if result.boxes is not None and len(result.boxes) > 0:
-            boxes = result.boxes
-            for i in range(len(boxes)):
-                box = boxes[i]
-
-                # Extract box data
-                xyxy = box.xyxy[0].cpu().numpy().tolist()  # [x1, y1, x2, y2]
-                conf_val = float(box.conf[0].cpu().numpy())
-                cls_id = int(box.cls[0].cpu().numpy())
-                cls_name = self._model.names[cls_id]
-
-                detection = {
-                    'class_id': cls_id,
-                    'class_name': cls_name,
-                    'confidence': conf_val,
-                    'bbox_xyxy': xyxy
+        # Create annotated image with only filtered detections
+        annotated_image_bgr = self.draw_detections(image_bgr, detections) if annotate else None
+
+        return {
+            'detections': detections,
+            'raw_detections': raw_detections,
+            'annotated_image_bgr': annotated_image_bgr,
+            'inference_time_ms': inference_time_ms,
+            'filtering_stats': filtering_stats,
+            'model_name': entry['name']
+        }
+
+    def run_roi_inference(
+        self,
+        image_bgr: np.ndarray,
+        roi_xyxy: List[float],
+        max_imgsz: int = 640,
+        min_roi_size: int = 32,
+        annotate: bool = True,
+        **kwargs
+    ) -> Dict:
+        """
+        Run inference on a region of interest cropped at native resolution.
+
+        The crop is never upscaled: imgsz is the crop's longer side rounded
+        up to the model stride, capped at max_imgsz. A region smaller than
+        the model input is therefore seen pixel for pixel (more detail than
+        the downscaled full frame) and costs less than a full-frame pass.
+
+        Args:
+            image_bgr: Full frame in BGR format
+            roi_xyxy: Region [x1, y1, x2, y2] in frame pixels (clamped to the frame)
+            max_imgsz: Largest input size to run the crop at
+            min_roi_size: Smallest accepted region side in pixels
+            annotate: Draw detections on a copy of the crop
+            **kwargs: Arguments for run_inference() (model_name, filtering)
+
+        Returns:
+            run_inference() result with boxes in full-frame coordinates,
+            the annotated crop (zoomed view) and 'roi' with 'roi_xyxy'
+            (clamped) and 'imgsz'
+        """
+        height, width = image_bgr.shape[:2]
+        x1 = max(0, min(int(roi_xyxy[0]), width))
+        y1 = max(0, min(int(roi_xyxy[1]), height))
+        x2 = max(0, min(int(math.ceil(roi_xyxy[2])), width))
+        y2 = max(0, min(int(math.ceil(roi_xyxy[3])), height))
+        if x2 - x1 < min_roi_size or y2 - y1 < min_roi_size:
+            raise ValueError(f"ROI must be at least {min_roi_size}x{min_roi_size} pixels inside the image")
+
+        # Slice is a view; predict letterboxes it without copying the frame
+        crop = image_bgr[y1:y2, x1:x2]
+        imgsz = min(max_imgsz, int(math.ceil(max(x2 - x1, y2 - y1) / 32)) * 32)
+        result = self.run_inference(crop, imgsz=imgsz, annotate=annotate, **kwargs)
+
+        # Filtered detections are the same dicts as raw ones; shift each once
+        shifted = set()
+        for det in result['raw_detections'] + result['detections']:
+            if id(det) not in shifted:
+                shifted.add(id(det))
+                bx1, by1, bx2, by2 = det['bbox_xyxy']
+                det['bbox_xyxy'] = [bx1 + x1, by1 + y1, bx2 + x1, by2 + y1]
+        result['roi'] = {'roi_xyxy': [x1, y1, x2, y2], 'imgsz': imgsz}
+        return result
+
+    def run_batch_inference(
+        self,
+        images_bgr: List[np.ndarray],
+        conf_threshold: Optional[float] = None,
+        imgsz: int = 640,
+        batch_size: int = 8,
+        enable_filtering: bool = True,
+        min_green_ratio: float = 0.15,
+        min_area_ratio: float = 0.001,
+        max_area_ratio: float = 0.95,
+        model_name: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Run inference on several images with one predict call per batch
+        (bulk uploads). Images are batched by shape: a batch of mixed
+        shapes is letterboxed to a full square, same-shape batches keep
+        the minimal rectangle. Nothing is annotated.
+
+        Args:
+            images_bgr: Input images in BGR format (sizes may differ)
+            conf_threshold: Override confidence threshold
+            imgsz: Input image size for model
+            batch_size: Images per predict call
+            enable_filtering: Enable green detection filtering
+            min_green_ratio: Minimum green content (0-1)
+            min_area_ratio: Minimum box area ratio
+            max_area_ratio: Maximum box area ratio
+            model_name: Registry name of model to use (default: active model)
+
+        Returns:
+            One run_inference()-style result per image, in order
+            (annotated_image_bgr is None; inference_time_ms is the
+            image's share of its batch)
+        """
+        entry = self._resolve(model_name)
+        model = entry['model']
+        conf = conf_threshold if conf_threshold is not None else entry['conf_threshold']
+
+        groups = {}
+        for index, image_bgr in enumerate(images_bgr):
+            groups.setdefault(image_bgr.shape, []).append(index)
+        batches = [
+            indices[i:i + batch_size]
+            for indices in groups.values()
+            for i in range(0, len(indices), batch_size)
+        ]
+
+        outputs = [None] * len(images_bgr)
+        for indices in batches:
+            batch = [images_bgr[index] for index in indices]
+            results = model.predict(
+                batch,
+                conf=conf,
+                iou=0.5,
+                imgsz=imgsz,
+                verbose=False,
+                max_det=100
+            )
+            for index, image_bgr, result in zip(indices, batch, results):
+                raw_detections = self._parse_result(result, model.names)
+                detections, filtering_stats = self._apply_filtering(
+                    raw_detections,
+                    image_bgr,
+                    enable_filtering,
+                    min_green_ratio=min_green_ratio,
+                    min_area_ratio=min_area_ratio,
+                    max_area_ratio=max_area_ratio
+                )
+                outputs[index] = {
+                    'detections': detections,
+                    'raw_detections': raw_detections,
+                    'annotated_image_bgr': None,
+                    'inference_time_ms': result.speed['inference'] if hasattr(result, 'speed') else 0,
+                    'filtering_stats': filtering_stats,
+                    'model_name': entry['name']
                 }
-                raw_detections.append(detection)
+        return outputs
 
-        # Apply filtering if enabled
-        if enable_filtering:
-            filtered_detections = self.filter_detections(
-                raw_detections,
+    def run_cascade_inference(
+        self,
+        image_bgr: np.ndarray,
+        fast_model: str,
+        full_model: Optional[str] = None,
+        uncertain_band: Tuple[float, float] = (0.25, 0.7),
+        force_full: bool = False,
+        endpoint: str = 'default',
+        conf_threshold: Optional[float] = None,
+        annotate: bool = True,
+        **kwargs
+    ) -> Dict:
+        """
+        Two-stage inference: run a small fast model first and escalate to
+        the full model only when the fast model's top confidence falls in
+        the uncertain band. Frames with no box above the band's lower edge
+        or a confident top box are answered by the fast model alone.
+
+        Args:
+            image_bgr: Input image in BGR format
+            fast_model: Registry name of the fast model
+            full_model: Registry name of the full model (default: active model)
+            uncertain_band: (low, high) top-confidence range that escalates
+            force_full: Always use the full model (e.g. captures)
+            endpoint: Label for escalation statistics
+            conf_threshold: Override confidence threshold of the final result
+            annotate: Draw detections on a copy of the image
+            **kwargs: Filtering arguments for run_inference()
+
+        Returns:
+            run_inference() result plus 'cascade' with 'escalated', 'reason',
+            'fast_model' and 'fast_top_confidence'. inference_time_ms covers
+            both stages when the frame escalated.
+        """
+        low, high = uncertain_band
+        cascade = {'escalated': True, 'reason': 'forced', 'fast_model': fast_model, 'fast_top_confidence': None}
+        fast_time_ms = 0.0
+
+        if not force_full:
+            fast_entry = self._resolve(fast_model)
+            fast_conf = conf_threshold if conf_threshold is not None else fast_entry['conf_threshold']
+            # Predict down to the band's lower edge so uncertain boxes are seen
+            fast = self.run_inference(
                 image_bgr,
-                min_green_ratio=min_green_ratio,
-                min_area_ratio=min_area_ratio,
-                max_area_ratio=max_area_ratio
+                conf_threshold=min(low, fast_conf),
+                model_name=fast_model,
+                annotate=False,
+                **kwargs
             )
-            detections = filtered_detections
+            top = max((d['confidence'] for d in fast['raw_detections']), default=0.0)
+            fast_time_ms = fast['inference_time_ms']
+            cascade['fast_top_confidence'] = top
+
+            if top < low or top >= high:
+                cascade['escalated'] = False
+                cascade['reason'] = 'below_band' if top < low else 'above_band'
+                # Drop boxes that were only returned because of the lowered threshold
+                fast['raw_detections'] = [d for d in fast['raw_detections'] if d['confidence'] >= fast_conf]
+                fast['detections'] = [d for d in fast['detections'] if d['confidence'] >= fast_conf]
+                if annotate:
+                    fast['annotated_image_bgr'] = self.draw_detections(image_bgr, fast['detections'])
+                fast['cascade'] = cascade
+                self.record_cascade_result(endpoint, cascade)
+                return fast
+            cascade['reason'] = 'uncertain'
+
+        result = self.run_inference(
+            image_bgr,
+            conf_threshold=conf_threshold,
+            model_name=full_model,
+            annotate=annotate,
+            **kwargs
+        )
+        result['inference_time_ms'] += fast_time_ms
+        result['cascade'] = cascade
+        self.record_cascade_result(endpoint, cascade)
+        return result
 
-            filtering_stats = {
-                'raw_count': len(raw_detections),
-                'filtered_count': len(filtered_detections),
-                'removed_count': len(raw_detections) - len(filtered_detections)
-            }
-        else:
-            detections = raw_detections
-            filtering_stats = {
-                'raw_count': len(raw_detections),
-                'filtered_count': len(raw_detections),
-                'removed_count': 0
+    def record_cascade_result(self, endpoint: str, cascade: Dict):
+        """
+        Count one cascade decision (also used for results from remote workers).
+
+        Args:
+            endpoint: Endpoint label
+            cascade: 'cascade' entry of a cascade result
+        """
+        with self._lock:
+            stats = self._cascade_stats.setdefault(
+                endpoint, {'frames': 0, 'escalated': 0, 'forced': 0, 'uncertain': 0, 'below_band': 0, 'above_band': 0})
+            stats['frames'] += 1
+            stats['escalated'] += int(cascade['escalated'])
+            stats[cascade['reason']] += 1
+
+    def cascade_stats(self) -> Dict:
+        """Per-endpoint cascade decisions and escalation rate."""
+        with self._lock:
+            return {
+                endpoint: {**stats, 'escalation_rate': stats['escalated'] / stats['frames'] if stats['frames'] else 0.0}
+                for endpoint, stats in self._cascade_stats.items()
             }
 
-        # Create annotated image with only filtered detections
-        annotated_image_bgr = image_bgr.copy()
+    def run_tiled_inference(
+        self,
+        image_bgr: np.ndarray,
+        tile_size: int = 640,
+        overlap: float = 0.2,
+        batch_size: int = 8,
+        conf_threshold: Optional[float] = None,
+        merge_iou: float = 0.5,
+        merge_metric: str = 'ios',
+        enable_filtering: bool = True,
+        min_green_ratio: float = 0.15,
+        min_area_ratio: float = 0.0001,
+        max_area_ratio: float = 0.95,
+        model_name: Optional[str] = None,
+        annotate: bool = True
+    ) -> Dict:
+        """
+        Run sliced inference for high-resolution images.
+        The image is split into overlapping tiles that are inferred at native
+        resolution in batches, boxes are mapped back to image coordinates and
+        duplicates along tile seams are merged with cross-tile NMS.
 
-        if detections:
-            for det in detections:
-                x1, y1, x2, y2 = map(int, det['bbox_xyxy'])
-                conf = det['confidence']
-                cls_name = det['class_name']
-
-                # Draw bounding box
-                color = (0, 255, 0)  # Green
-                cv2.rectangle(annotated_image_bgr,
-                              (x1, y1), (x2, y2), color, 2)
-
-                # Prepare label with confidence and green ratio if available
-                label = f"{cls_name} {conf:.2f}"
-                if 'green_ratio' in det:
-                    label += f" (G:{det['green_ratio']:.2f})"
-
-                # Draw label background
-                (label_w, label_h), _ = cv2.getTextSize(
-                    label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
-                )
-                cv2.rectangle(
-                    annotated_image_bgr,
-                    (x1, y1 - label_h - 10),
-                    (x1 + label_w + 10, y1),
-                    color,
-                    -1
-                )
+        Args:
+            image_bgr: Input image in BGR format
+            tile_size: Tile edge length in pixels (also used as imgsz)
+            overlap: Fractional overlap between neighbouring tiles (0-0.9)
+            batch_size: Tiles per predict call
+            conf_threshold: Override confidence threshold
+            merge_iou: Overlap threshold for merging seam duplicates
+            merge_metric: 'ios' (intersection over smaller box, catches boxes
+                truncated by a tile edge) or 'iou'
+            enable_filtering: Enable green detection filtering
+            min_green_ratio: Minimum green content (0-1)
+            min_area_ratio: Minimum box area ratio (lower default than
+                run_inference since lesions are small relative to 4K frames)
+            max_area_ratio: Maximum box area ratio
+            model_name: Registry name of model to use (default: active model)
+            annotate: Draw detections on a copy of the image
 
-                # Draw label text
-                cv2.putText(
-                    annotated_image_bgr,
-                    label,
-                    (x1 + 5, y1 - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 0, 0),
-                    1,
-                    cv2.LINE_AA
-                )
+        Returns:
+            Same keys as run_inference, plus:
+                - tiles: Per-tile window, detection count and timing
+                - tiling_stats: Tile grid and merge statistics
+        """
+        entry = self._resolve(model_name)
+        model = entry['model']
+        conf = conf_threshold if conf_threshold is not None else entry['conf_threshold']
 
-        # Get inference time
-        inference_time_ms = result.speed['inference'] if hasattr(
-            result, 'speed') else 0
+        h, w = image_bgr.shape[:2]
+        windows = self.make_tiles(h, w, tile_size, overlap)
+        batches = [windows[i:i + batch_size] for i in range(0, len(windows), batch_size)]
+
+        def _run_batch(batch):
+            # Slices are views; predict letterboxes them without copying the frame
+            crops = [image_bgr[y1:y2, x1:x2] for x1, y1, x2, y2 in batch]
+            start = time.perf_counter()
+            results = model.predict(
+                crops,
+                conf=conf,
+                iou=0.5,
+                imgsz=tile_size,
+                verbose=False,
+                max_det=100
+            )
+            batch_ms = (time.perf_counter() - start) * 1000
+            return batch, results, batch_ms
+
+        # Batches run one after another: predict on a shared model is
+        # serialized by the predictor lock, so threads would not overlap
+        start = time.perf_counter()
+        batch_outputs = [_run_batch(batch) for batch in batches]
+        tiles_wall_ms = (time.perf_counter() - start) * 1000
+
+        tile_detections = []
+        tiles = []
+        inference_time_ms = 0.0
+        for batch, results, batch_ms in batch_outputs:
+            for (x1, y1, x2, y2), result in zip(batch, results):
+                dets = self._parse_result(result, model.names, offset=(x1, y1))
+                tile_ms = result.speed['inference'] if hasattr(result, 'speed') else 0
+                inference_time_ms += tile_ms
+                tile_detections.extend(dets)
+                tiles.append({
+                    'window_xyxy': [x1, y1, x2, y2],
+                    'detections_count': len(dets),
+                    'inference_time_ms': tile_ms,
+                    'batch_time_ms': batch_ms
+                })
+
+        raw_detections = self.merge_detections(tile_detections, merge_iou, merge_metric)
+
+        detections, filtering_stats = self._apply_filtering(
+            raw_detections,
+            image_bgr,
+            enable_filtering,
+            min_green_ratio=min_green_ratio,
+            min_area_ratio=min_area_ratio,
+            max_area_ratio=max_area_ratio
+        )
 
         return {
             'detections': detections,
             'raw_detections': raw_detections,
-            'annotated_image_bgr': annotated_image_bgr,
+            'annotated_image_bgr': self.draw_detections(image_bgr, detections) if annotate else None,
             'inference_time_ms': inference_time_ms,
-            'filtering_stats': filtering_stats
+            'filtering_stats': filtering_stats,
+            'model_name': entry['name'],
+            'tiles': tiles,
+            'tiling_stats': {
+                'tile_size': tile_size,
+                'overlap': overlap,
+                'tiles_count': len(windows),
+                'batches_count': len(batches),
+                'tile_detections_count': len(tile_detections),
+                'merged_count': len(tile_detections) - len(raw_detections),
+                'wall_time_ms': tiles_wall_ms
+            }
         }
 
+    @staticmethod
+    def make_tiles(height: int, width: int, tile_size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+        """
+        Compute overlapping tile windows covering the image.
+        Tiles are spread evenly so the overlap is at least the requested
+        fraction and every tile is full-size when the image is larger than
+        a tile.
+
+        Args:
+            height: Image height
+            width: Image width
+            tile_size: Tile edge length in pixels
+            overlap: Fractional overlap between neighbouring tiles
+
+        Returns:
+            List of (x1, y1, x2, y2) windows
+        """
+        stride = max(1, int(tile_size * (1 - overlap)))
+
+        def _starts(length):
+            if length <= tile_size:
+                return [0]
+            span = length - tile_size
+            count = -(-span // stride) + 1
+            return [round(i * span / (count - 1)) for i in range(count)]
+
+        return [
+            (x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in _starts(height)
+            for x in _starts(width)
+        ]
+
+    @staticmethod
+    def merge_detections(detections: List[Dict], threshold: float = 0.5, metric: str = 'ios') -> List[Dict]:
+        """
+        Class-aware greedy NMS across tiles.
+        Each kept box is compared against the remaining boxes of its class
+        only, so memory stays linear in the number of detections instead of
+        building an N x N overlap matrix.
+
+        Args:
+            detections: Detections in full-image coordinates
+            threshold: Overlap above which the lower-confidence box is dropped
+            metric: 'ios' (intersection over smaller area) or 'iou'
+
+        Returns:
+            Kept detections, highest confidence first
+        """
+        if len(detections) < 2:
+            return list(detections)
+
+        boxes = np.array([d['bbox_xyxy'] for d in detections], dtype=np.float32)
+        scores = np.array([d['confidence'] for d in detections], dtype=np.float32)
+        classes = np.array([d['class_id'] for d in detections])
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+        keep = []
+        for class_id in np.unique(classes):
+            # Candidates of this class, highest confidence first
+            remaining = np.flatnonzero(classes == class_id)
+            remaining = remaining[np.argsort(-scores[remaining], kind='stable')]
+            while remaining.size:
+                best, rest = remaining[0], remaining[1:]
+                keep.append(best)
+                if not rest.size:
+                    break
+                xx1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+                yy1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+                xx2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+                yy2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+                inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+                if metric == 'iou':
+                    denom = areas[best] + areas[rest] - inter
+                else:
+                    denom = np.minimum(areas[best], areas[rest])
+                remaining = rest[inter / np.maximum(denom, 1e-9) <= threshold]
+
+        keep.sort(key=lambda idx: -scores[idx])
+        return [detections[idx] for idx in keep]
+
+    @staticmethod
+    def _parse_result(result, names: Dict, offset: Tuple[int, int] = (0, 0)) -> List[Dict]:
+        """
+        Convert a YOLO result into detection dictionaries.
+
+        Args:
+            result: Single ultralytics Results object
+            names: Model class names
+            offset: (x, y) added to boxes, for tiles and crops
+
+        Returns:
+            List of detection dictionaries
+        """
+        if result.boxes is None or len(result.boxes) == 0:
+            return []
+
+        # One device-to-host transfer for all boxes instead of per box
+        return detections_from_array(result.boxes.data.cpu().numpy(), names, offset)
+
+    def _apply_filtering(
+        self,
+        raw_detections: List[Dict],
+        image_bgr: np.ndarray,
+        enable_filtering: bool,
+        **filter_kwargs
+    ) -> Tuple[List[Dict], Dict]:
+        """Apply green/size filtering and build filtering statistics."""
+        if enable_filtering:
+            detections = self.filter_detections(raw_detections, image_bgr, **filter_kwargs)
+        else:
+            detections = raw_detections
+
+        filtering_stats = {
+            'raw_count': len(raw_detections),
+            'filtered_count': len(detections),
+            'removed_count': len(raw_detections) - len(detections)
+        }
+        return detections, filtering_stats
+
+    @staticmethod
+    def draw_detections(image_bgr: np.ndarray, detections: List[Dict]) -> np.ndarray:
+        """
+        Draw detection boxes and labels on a copy of the image.
+
+        Args:
+            image_bgr: Image in BGR format
+            detections: Detections to draw
+
+        Returns:
+            Annotated copy of the image
+        """
+        annotated_image_bgr = image_bgr.copy()
+
+        for det in detections:
+            x1, y1, x2, y2 = map(int, det['bbox_xyxy'])
+            conf = det['confidence']
+            cls_name = det['class_name']
+
+            # Draw bounding box
+            color = (0, 255, 0)  # Green
+            cv2.rectangle(annotated_image_bgr,
+                          (x1, y1), (x2, y2), color, 2)
+
+            # Prepare label with confidence and green ratio if available
+            label = f"{cls_name} {conf:.2f}"
+            if 'green_ratio' in det:
+                label += f" (G:{det['green_ratio']:.2f})"
+
+            # Draw label background
+            (label_w, label_h), _ = cv2.getTextSize(
+                label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
+            )
+            cv2.rectangle(
+                annotated_image_bgr,
+                (x1, y1 - label_h - 10),
+                (x1 + label_w + 10, y1),
+                color,
+                -1
+            )
+
+            # Draw label text
+            cv2.putText(
+                annotated_image_bgr,
+                label,
+                (x1 + 5, y1 - 5),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 0, 0),
+                1,
+                cv2.LINE_AA
+            )
+
+        return annotated_image_bgr
+
 
 # Global detector instance
 detector = YOLODetector()
 
 
-def initialize_detector(model_path: str = "models/best.pt", conf_threshold: float = 0.35):
+def initialize_detector(
+    model_path: str = "models/best.pt",
+    conf_threshold: float = 0.35,
+    optimize: bool = False,
+    compile_model: bool = False
+):
     """
     Initialize the global detector instance.
 
     Args:
         model_path: Path to model weights
         conf_threshold: Confidence threshold (default: 0.35 for reduced false positives)
+        optimize: Use the optimized CPU execution path
+        compile_model: Also wrap the network in torch.compile
     """
-    detector.load_model(model_path, conf_threshold)
+    detector.load_model(model_path, conf_threshold, optimize=optimize, compile_model=compile_model)
+
+
+def warmup_detector(
+    imgsz_list: Iterable[int] = (640,),
+    runs: int = 1,
+    model_name: Optional[str] = None
+) -> Dict[int, float]:
+    """
+    Warm up the global detector instance.
+
+    Args:
+        imgsz_list: Input sizes that will be served
+        runs: Number of warmup predictions per size
+        model_name: Registry name (default: active model)
+
+    Returns:
+        Dictionary mapping imgsz to warmup time in milliseconds
+    """
+    return detector.warmup(imgsz_list, runs, model_name)
 
 
 def run_inference(image_bgr: np.ndarray, **kwargs) -> Dict:
@@ -337,6 +1031,7 @@ def run_inference(image_bgr: np.ndarray, **kwargs) -> Dict:
             - min_green_ratio: Minimum green content ratio (default: 0.15)
             - min_area_ratio: Minimum box area ratio (default: 0.001)
             - max_area_ratio: Maximum box area ratio (default: 0.95)
+            - model_name: Registry name of model to use (default: active)
 
     Returns:
         Inference results dictionary with:
@@ -349,6 +1044,79 @@ def run_inference(image_bgr: np.ndarray, **kwargs) -> Dict:
     return detector.run_inference(image_bgr, **kwargs)
 
 
+def run_roi_inference(image_bgr: np.ndarray, **kwargs) -> Dict:
+    """
+    Convenience function to run inference on a region of interest on global detector.
+
+    Args:
+        image_bgr: Full frame in BGR format
+        **kwargs: Additional arguments for detector.run_roi_inference()
+            - roi_xyxy: Region [x1, y1, x2, y2] in frame pixels (required)
+            - max_imgsz: Largest input size for the crop (default: 640)
+            - model_name and filtering arguments as run_inference()
+
+    Returns:
+        Inference results dictionary as run_inference() with full-frame
+        boxes, plus 'roi'
+    """
+    return detector.run_roi_inference(image_bgr, **kwargs)
+
+
+def run_batch_inference(images_bgr: List[np.ndarray], **kwargs) -> List[Dict]:
+    """
+    Convenience function to run batched inference on global detector.
+
+    Args:
+        images_bgr: Input images in BGR format
+        **kwargs: Additional arguments for detector.run_batch_inference()
+            - batch_size: Images per predict call (default: 8)
+            - imgsz, conf_threshold and filtering arguments as run_inference()
+            - model_name: Registry name of model to use (default: active)
+
+    Returns:
+        List of inference result dictionaries, one per image
+    """
+    return detector.run_batch_inference(images_bgr, **kwargs)
+
+
+def run_cascade_inference(image_bgr: np.ndarray, **kwargs) -> Dict:
+    """
+    Convenience function to run two-stage cascade inference on global detector.
+
+    Args:
+        image_bgr: Input image in BGR format
+        **kwargs: Additional arguments for detector.run_cascade_inference()
+            - fast_model: Registry name of the fast model (required)
+            - full_model: Registry name of the full model (default: active)
+            - uncertain_band: (low, high) top confidence that escalates
+            - force_full: Always use the full model
+            - endpoint: Label for escalation statistics
+
+    Returns:
+        Inference results dictionary as run_inference(), plus 'cascade'
+    """
+    return detector.run_cascade_inference(image_bgr, **kwargs)
+
+
+def run_tiled_inference(image_bgr: np.ndarray, **kwargs) -> Dict:
+    """
+    Convenience function to run sliced inference on global detector.
+
+    Args:
+        image_bgr: Input image in BGR format
+        **kwargs: Additional arguments for detector.run_tiled_inference()
+            - tile_size: Tile edge length (default: 640)
+            - overlap: Tile overlap fraction (default: 0.2)
+            - batch_size: Tiles per predict call (default: 8)
+            - annotate: Draw detections on a copy (default: True)
+
+    Returns:
+        Inference results dictionary as run_inference(), plus per-tile
+        timing in 'tiles' and grid/merge statistics in 'tiling_stats'
+    """
+    return detector.run_tiled_inference(image_bgr, **kwargs)
+
+
 def get_detector() -> YOLODetector:
     """
     Get the global detector instance.
@@ -0,0 +1,269 @@
+"""
+CPU auto-tuner for the detection server.
+
+Benchmarks a grid of PyTorch intra-op threads, OpenCV threads, worker
+processes and imgsz with the real model on sample frames, then writes the
+configuration with the best throughput that meets the latency target to
+models/runtime_profile.json. The server applies it at startup.
+
+Each worker process runs the same pipeline as /detect (decode, inference
+with green filtering, quality metrics) in a closed loop, so worker count
+is measured without HTTP overhead. Smaller imgsz values are only
+considered if their detections agree with the largest imgsz on the sample
+frames (see --min-agreement). The model is loaded with the same
+optimize/compile settings as the server (MODEL_OPTIMIZE, MODEL_COMPILE)
+so the profile is tuned for the runner that actually serves requests.
+
+Usage:
+    python scripts/autotune_cpu.py --frames samples/
+    python scripts/autotune_cpu.py --frames samples/ --latency-ms 300 --imgsz 640,512,416
+    python scripts/autotune_cpu.py --frames samples/ --workers 1,2 --torch-threads 1,2,4 --dry-run
+    python scripts/autotune_cpu.py --frames samples/ --no-optimize  # plain ultralytics predict
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import runtime_profile  # noqa: E402
+from scripts.loadtest import load_frames, percentile  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def default_thread_grid() -> List[int]:
+    """1, 2, 4, ... up to the CPU count."""
+    cpus = os.cpu_count() or 1
+    grid = []
+    n = 1
+    while n < cpus:
+        grid.append(n)
+        n *= 2
+    return grid + [cpus]
+
+
+def _worker(model_path, optimize, compile_model, frames, imgsz_list, torch_threads, cv2_threads,
+            duration, warmup, barrier, results):
+    """Benchmark process: load the model once, then run each imgsz for duration seconds."""
+    runtime_profile.apply_threads(torch_threads, cv2_threads)
+    from app import utils, yolo_infer
+
+    yolo_infer.initialize_detector(model_path, optimize=optimize, compile_model=compile_model)
+    for imgsz in imgsz_list:
+        yolo_infer.warmup_detector([imgsz], warmup)
+        latencies = []
+        barrier.wait()
+        end = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            image_bgr = utils.decode_image_bytes(frames[i % len(frames)])
+            yolo_infer.run_inference(image_bgr, imgsz=imgsz, annotate=False)
+            utils.compute_image_quality_metrics(image_bgr)
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+        results.put((imgsz, latencies))
+        barrier.wait()
+
+
+def benchmark(args, frames: List[bytes], workers: int, torch_threads: int, cv2_threads: int) -> Dict[int, Dict]:
+    """
+    Run one (workers, threads) combination for every imgsz.
+
+    Returns:
+        Mapping imgsz -> {'throughput_fps', 'latency_ms'}
+    """
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(
+            args.model, args.optimize, args.compile, frames, args.imgsz, torch_threads, cv2_threads,
+            args.duration, args.warmup, barrier, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+
+    collected = {imgsz: [] for imgsz in args.imgsz}
+    for _ in range(workers * len(args.imgsz)):
+        imgsz, latencies = results.get(timeout=args.duration * 4 + 600)
+        collected[imgsz].append(latencies)
+    for p in procs:
+        p.join()
+
+    summary = {}
+    for imgsz, per_worker in collected.items():
+        lat = [ms for worker_lat in per_worker for ms in worker_lat]
+        summary[imgsz] = {
+            'throughput_fps': len(lat) / args.duration,
+            'latency_ms': {
+                'mean': sum(lat) / len(lat) if lat else 0.0,
+                'p50': percentile(lat, 50),
+                'p95': percentile(lat, 95)
+            }
+        }
+    return summary
+
+
+def _iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detection_agreement(args, frames: List[bytes]) -> Dict[int, float]:
+    """
+    Fraction of detections at the largest imgsz that each imgsz reproduces
+    (same class, IoU >= 0.5, and no extra boxes counted as misses).
+
+    Returns:
+        Mapping imgsz -> agreement in [0, 1]
+    """
+    from app import utils, yolo_infer
+
+    yolo_infer.initialize_detector(args.model, optimize=args.optimize, compile_model=args.compile)
+    reference_size = max(args.imgsz)
+    images = [utils.decode_image_bytes(frame) for frame in frames[:args.agreement_frames]]
+    reference = [
+        yolo_infer.run_inference(image, imgsz=reference_size, annotate=False)['detections']
+        for image in images
+    ]
+
+    agreement = {}
+    for imgsz in args.imgsz:
+        matched = 0
+        total = 0
+        for image, ref_dets in zip(images, reference):
+            dets = yolo_infer.run_inference(image, imgsz=imgsz, annotate=False)['detections']
+            unused = list(dets)
+            for ref in ref_dets:
+                match = next((d for d in unused if d['class_id'] == ref['class_id']
+                              and _iou(d['bbox_xyxy'], ref['bbox_xyxy']) >= 0.5), None)
+                if match is not None:
+                    unused.remove(match)
+                    matched += 1
+            total += max(len(ref_dets), len(dets))
+        agreement[imgsz] = matched / total if total else 1.0
+    return agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune CPU threads, workers and imgsz for this host")
+    parser.add_argument('--frames', required=True, help='Folder of sample .jpg/.png frames')
+    parser.add_argument('--model', default=str(BASE_DIR / "models" / "best.pt"))
+    parser.add_argument('--no-optimize', dest='optimize', action='store_false',
+                        default=os.environ.get("MODEL_OPTIMIZE", "1") == "1",
+                        help='Benchmark plain ultralytics predict (default: MODEL_OPTIMIZE, like the server)')
+    parser.add_argument('--compile', action='store_true',
+                        default=os.environ.get("MODEL_COMPILE", "0") == "1",
+                        help='Also try torch.compile (default: MODEL_COMPILE, like the server)')
+    parser.add_argument('--torch-threads', type=parse_int_list, default=default_thread_grid())
+    parser.add_argument('--cv2-threads', type=parse_int_list, default=None,
+                        help='OpenCV thread counts (default: 1 and CPU count)')
+    parser.add_argument('--workers', type=parse_int_list, default=None,
+                        help='Worker process counts (default: 1, 2, 4 ... up to CPU count)')
+    parser.add_argument('--imgsz', type=parse_int_list, default=[640, 512, 416, 320])
+    parser.add_argument('--latency-ms', type=float, default=500,
+                        help='p95 per-frame latency target')
+    parser.add_argument('--min-agreement', type=float, default=0.9,
+                        help='Required detection agreement with the largest imgsz')
+    parser.add_argument('--agreement-frames', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration')
+    parser.add_argument('--warmup', type=int, default=3, help='Warmup runs per imgsz')
+    parser.add_argument('--allow-oversubscription', action='store_true',
+                        help='Also try workers x torch threads > CPU count')
+    parser.add_argument('--output', default=str(BASE_DIR / "models" / "runtime_profile.json"))
+    parser.add_argument('--json', help='Write all benchmark results to this path')
+    parser.add_argument('--dry-run', action='store_true', help="Don't write the profile")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    args.cv2_threads = args.cv2_threads or sorted({1, cpus})
+    args.workers = args.workers or default_thread_grid()
+    if not Path(args.model).exists():
+        raise SystemExit(f"Model not found: {args.model}")
+    frames = load_frames(args.frames)
+
+    print(f"Model {Path(args.model).name}, optimize {'on' if args.optimize else 'off'}, "
+          f"compile {'on' if args.compile else 'off'}")
+    print(f"Checking detection agreement against imgsz {max(args.imgsz)} "
+          f"on {min(len(frames), args.agreement_frames)} frame(s)")
+    agreement = detection_agreement(args, frames)
+    for imgsz, value in sorted(agreement.items(), reverse=True):
+        flag = '' if value >= args.min_agreement else '  (excluded)'
+        print(f"  imgsz {imgsz:4d}: {value:.1%}{flag}")
+
+    combos = [
+        (w, t, c) for w in args.workers for t in args.torch_threads for c in args.cv2_threads
+        if args.allow_oversubscription or w * t <= cpus
+    ]
+    print(f"\nBenchmarking {len(combos)} thread/worker combination(s) x {len(args.imgsz)} imgsz, "
+          f"{args.duration:.0f} s each")
+
+    results = []
+    for workers, torch_threads, cv2_threads in combos:
+        for imgsz, stats in benchmark(args, frames, workers, torch_threads, cv2_threads).items():
+            entry = {
+                'workers': workers, 'torch_threads': torch_threads, 'cv2_threads': cv2_threads,
+                'imgsz': imgsz, 'agreement': agreement[imgsz], **stats
+            }
+            results.append(entry)
+            print(f"  workers {workers}  torch {torch_threads:2d}  cv2 {cv2_threads:2d}  imgsz {imgsz:4d}: "
+                  f"{stats['throughput_fps']:6.2f} fps  p95 {stats['latency_ms']['p95']:7.1f} ms")
+
+    eligible = [
+        r for r in results
+        if r['latency_ms']['p95'] <= args.latency_ms and r['agreement'] >= args.min_agreement
+    ]
+    if args.json:
+        Path(args.json).write_text(json.dumps({'agreement': agreement, 'results': results}, indent=2))
+    if not eligible:
+        fastest = min(results, key=lambda r: r['latency_ms']['p95'])
+        raise SystemExit(f"\nNo configuration meets p95 <= {args.latency_ms:.0f} ms "
+                         f"(best: {fastest['latency_ms']['p95']:.0f} ms); no profile written")
+
+    # Best throughput; prefer larger imgsz, then fewer processes, on ties
+    best = max(eligible, key=lambda r: (round(r['throughput_fps'], 1), r['imgsz'], -r['workers']))
+    profile = {
+        'torch_threads': best['torch_threads'],
+        'cv2_threads': best['cv2_threads'],
+        'workers': best['workers'],
+        'imgsz': best['imgsz'],
+        'measured': {
+            'throughput_fps': best['throughput_fps'],
+            'latency_ms': best['latency_ms'],
+            'agreement': best['agreement']
+        },
+        'latency_target_ms': args.latency_ms,
+        'model': Path(args.model).name,
+        'optimize': args.optimize,
+        'compile': args.compile,
+        'tuned_at': datetime.now().isoformat()
+    }
+
+    print(f"\nBest: {best['workers']} worker(s), torch threads {best['torch_threads']}, "
+          f"cv2 threads {best['cv2_threads']}, imgsz {best['imgsz']}: "
+          f"{best['throughput_fps']:.2f} fps, p95 {best['latency_ms']['p95']:.0f} ms")
+    if args.dry_run:
+        return
+    runtime_profile.save_profile(Path(args.output), profile)
+    print(f"Profile written to {args.output}")
+    print(f"Start the server with: uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers {best['workers']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the two-stage cascade against the full model alone.
+
+Runs every image through the full model and through the cascade (fast
+model first, full model only inside the uncertain band) for one or more
+bands, and reports throughput, escalation rate, how often the cascade's
+answer differs from the full model's, and frame accuracy against YOLO
+labels when a labels folder is given.
+
+A frame's answer is the set of detected class IDs after filtering; a
+labeled frame counts as correct when that set equals the labeled set.
+
+Usage:
+    python scripts/bench_cascade.py --images data/val/images --fast models/fast.pt
+    python scripts/bench_cascade.py --images data/val/images --labels data/val/labels \\
+        --fast models/fast.pt --bands "0.2,0.6;0.25,0.7;0.3,0.8" --json cascade.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import utils, yolo_infer  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+def load_label_classes(labels_dir: Optional[Path], image_path: Path) -> Optional[Set[int]]:
+    """Class IDs in the YOLO label file for an image (None without labels)."""
+    if labels_dir is None:
+        return None
+    label_path = labels_dir / f"{image_path.stem}.txt"
+    if not label_path.exists():
+        return set()
+    return {int(line.split()[0]) for line in label_path.read_text().splitlines() if line.strip()}
+
+
+def class_set(result: Dict) -> Set[int]:
+    return {d['class_id'] for d in result['detections']}
+
+
+def run_mode(images, infer) -> Dict:
+    """Run infer over all images, returning per-frame answers and timing."""
+    answers = []
+    escalated = 0
+    start = time.perf_counter()
+    for image in images:
+        result = infer(image)
+        answers.append(class_set(result))
+        escalated += int(result.get('cascade', {}).get('escalated', True))
+    elapsed = time.perf_counter() - start
+    return {
+        'answers': answers,
+        'elapsed_s': elapsed,
+        'throughput_fps': len(images) / elapsed if elapsed else 0.0,
+        'escalation_rate': escalated / len(images) if images else 0.0
+    }
+
+
+def accuracy(answers: List[Set[int]], labels: List[Optional[Set[int]]]) -> Optional[float]:
+    labeled = [(a, l) for a, l in zip(answers, labels) if l is not None]
+    if not labeled:
+        return None
+    return sum(a == l for a, l in labeled) / len(labeled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade vs full-model throughput and agreement")
+    parser.add_argument('--images', required=True, help='Folder of sample images')
+    parser.add_argument('--labels', help='YOLO label folder (same stems as images)')
+    parser.add_argument('--fast', required=True, help='Fast model weights')
+    parser.add_argument('--full', default=str(BASE_DIR / "models" / "best.pt"), help='Full model weights')
+    parser.add_argument('--bands', default='0.25,0.7', help='Semicolon-separated low,high bands')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--limit', type=int, default=0, help='Use at most this many images')
+    parser.add_argument('--json', help='Write report as JSON to this path')
+    args = parser.parse_args()
+
+    image_paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if args.limit:
+        image_paths = image_paths[:args.limit]
+    if not image_paths:
+        raise SystemExit(f"No images found in {args.images}")
+    labels_dir = Path(args.labels) if args.labels else None
+    # Decode up front so only inference is timed
+    images = [utils.decode_image_bytes(p.read_bytes()) for p in image_paths]
+    labels = [load_label_classes(labels_dir, p) for p in image_paths]
+    bands = [tuple(float(v) for v in band.split(',')) for band in args.bands.split(';') if band.strip()]
+
+    detector = yolo_infer.get_detector()
+    detector.load_model(args.full, name='full', activate=True)
+    detector.load_model(args.fast, name='fast', activate=False)
+    detector.warmup([args.imgsz], 2, 'full')
+    detector.warmup([args.imgsz], 2, 'fast')
+
+    common = {'imgsz': args.imgsz, 'enable_filtering': True, 'min_green_ratio': 0.15, 'annotate': False}
+    print(f"{len(images)} image(s){' with labels' if labels_dir else ''}")
+
+    full = run_mode(images, lambda img: detector.run_inference(img, model_name='full', **common))
+    fast = run_mode(images, lambda img: detector.run_inference(img, model_name='fast', **common))
+    report = {
+        'images': len(images),
+        'full': {'throughput_fps': full['throughput_fps'], 'accuracy': accuracy(full['answers'], labels)},
+        'fast_only': {
+            'throughput_fps': fast['throughput_fps'],
+            'accuracy': accuracy(fast['answers'], labels),
+            'disagreement_with_full': sum(a != b for a, b in zip(fast['answers'], full['answers'])) / len(images)
+        },
+        'cascade': []
+    }
+    print(f"full       {full['throughput_fps']:7.2f} fps")
+    print(f"fast only  {fast['throughput_fps']:7.2f} fps  "
+          f"disagrees with full on {report['fast_only']['disagreement_with_full']:.1%} of frames")
+
+    for band in bands:
+        cascade = run_mode(images, lambda img: detector.run_cascade_inference(
+            img, fast_model='fast', full_model='full', uncertain_band=band,
+            endpoint=f"bench {band[0]}-{band[1]}", **common))
+        disagreement = sum(a != b for a, b in zip(cascade['answers'], full['answers'])) / len(images)
+        entry = {
+            'band': band,
+            'throughput_fps': cascade['throughput_fps'],
+            'speedup': cascade['throughput_fps'] / full['throughput_fps'] if full['throughput_fps'] else 0.0,
+            'escalation_rate': cascade['escalation_rate'],
+            'disagreement_with_full': disagreement,
+            'accuracy': accuracy(cascade['answers'], labels)
+        }
+        report['cascade'].append(entry)
+        print(f"cascade {band[0]:.2f}-{band[1]:.2f}  {entry['throughput_fps']:7.2f} fps  "
+              f"x{entry['speedup']:.2f}  escalated {entry['escalation_rate']:.1%}  "
+              f"disagrees with full on {disagreement:.1%}")
+
+    if labels_dir:
+        print("\nFrame accuracy vs labels:")
+        print(f"  full      {report['full']['accuracy']:.1%}")
+        print(f"  fast only {report['fast_only']['accuracy']:.1%}")
+        for entry in report['cascade']:
+            print(f"  cascade {entry['band'][0]:.2f}-{entry['band'][1]:.2f}  {entry['accuracy']:.1%}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
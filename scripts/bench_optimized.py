@@ -0,0 +1,132 @@
+"""
+Parity and latency check for the optimized CPU execution path.
+
+Loads the same weights twice, once on the model.predict() path and once
+with the optimized runner (and optionally torch.compile), runs every
+sample frame through both at a fixed imgsz, and checks that detections
+match: same count and classes, boxes within --box-tol pixels and
+confidences within --conf-tol. Then times end-to-end run_inference()
+for each path.
+
+Exits non-zero if parity fails, so it can gate a model or dependency
+upgrade.
+
+Usage:
+    python scripts/bench_optimized.py --frames samples/
+    python scripts/bench_optimized.py --frames samples/ --imgsz 512 --compile --json optimized.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import utils, yolo_infer  # noqa: E402
+from scripts.loadtest import load_frames, percentile  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def compare(reference: List[Dict], candidate: List[Dict]) -> Dict:
+    """Largest box and confidence differences between two detection lists."""
+    if len(reference) != len(candidate):
+        return {'count_mismatch': True, 'class_mismatch': False, 'box_diff': 0.0, 'conf_diff': 0.0}
+    # NMS order can swap near-equal confidences; compare in a stable order
+    key = lambda d: (d['class_id'], round(d['bbox_xyxy'][0]), round(d['bbox_xyxy'][1]))  # noqa: E731
+    box_diff = conf_diff = 0.0
+    class_mismatch = False
+    for ref, cand in zip(sorted(reference, key=key), sorted(candidate, key=key)):
+        class_mismatch |= ref['class_id'] != cand['class_id']
+        box_diff = max(box_diff, max(abs(a - b) for a, b in zip(ref['bbox_xyxy'], cand['bbox_xyxy'])))
+        conf_diff = max(conf_diff, abs(ref['confidence'] - cand['confidence']))
+    return {'count_mismatch': False, 'class_mismatch': class_mismatch, 'box_diff': box_diff, 'conf_diff': conf_diff}
+
+
+def time_path(detector, images, name: str, args) -> Dict:
+    latencies = []
+    forward = []
+    for i in range(args.iterations):
+        image = images[i % len(images)]
+        start = time.perf_counter()
+        result = detector.run_inference(image, conf_threshold=args.conf, imgsz=args.imgsz,
+                                        model_name=name, annotate=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        forward.append(result['inference_time_ms'])
+    return {
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95)
+        },
+        'forward_ms_mean': sum(forward) / len(forward)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimized CPU path: parity and latency vs model.predict()")
+    parser.add_argument('--frames', required=True, help='Folder of sample .jpg/.png frames')
+    parser.add_argument('--model', default=str(BASE_DIR / "models" / "best.pt"))
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=None, help='Confidence threshold (default: model)')
+    parser.add_argument('--compile', action='store_true', help='Also measure the torch.compile variant')
+    parser.add_argument('--iterations', type=int, default=100, help='Timed runs per path')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--box-tol', type=float, default=1.0, help='Max box difference in pixels')
+    parser.add_argument('--conf-tol', type=float, default=1e-3, help='Max confidence difference')
+    parser.add_argument('--json', help='Write report as JSON to this path')
+    args = parser.parse_args()
+
+    images = [utils.decode_image_bytes(frame) for frame in load_frames(args.frames)]
+    detector = yolo_infer.get_detector()
+    paths = {'predict': {}, 'optimized': {'optimize': True}}
+    if args.compile:
+        paths['compiled'] = {'optimize': True, 'compile_model': True}
+    for name, options in paths.items():
+        detector.load_model(args.model, name=name, activate=name == 'predict', **options)
+        detector.warmup([args.imgsz], args.warmup, name)
+
+    report = {'frames': len(images), 'imgsz': args.imgsz, 'parity': {}, 'latency': {}}
+    failed = False
+    for name in paths:
+        if name == 'predict':
+            continue
+        worst = {'frames_failed': 0, 'box_diff': 0.0, 'conf_diff': 0.0}
+        for image in images:
+            reference = detector.run_inference(image, conf_threshold=args.conf, imgsz=args.imgsz,
+                                               model_name='predict', annotate=False)['raw_detections']
+            candidate = detector.run_inference(image, conf_threshold=args.conf, imgsz=args.imgsz,
+                                               model_name=name, annotate=False)['raw_detections']
+            diff = compare(reference, candidate)
+            worst['box_diff'] = max(worst['box_diff'], diff['box_diff'])
+            worst['conf_diff'] = max(worst['conf_diff'], diff['conf_diff'])
+            if (diff['count_mismatch'] or diff['class_mismatch']
+                    or diff['box_diff'] > args.box_tol or diff['conf_diff'] > args.conf_tol):
+                worst['frames_failed'] += 1
+        report['parity'][name] = worst
+        failed |= worst['frames_failed'] > 0
+        print(f"Parity {name:<9}: {len(images) - worst['frames_failed']}/{len(images)} frames match, "
+              f"max box diff {worst['box_diff']:.3f} px, max conf diff {worst['conf_diff']:.2e}")
+
+    print(f"\nLatency over {args.iterations} run(s) at imgsz {args.imgsz} (end-to-end run_inference):")
+    for name in paths:
+        stats = time_path(detector, images, name, args)
+        report['latency'][name] = stats
+        lat = stats['latency_ms']
+        print(f"  {name:<9} mean {lat['mean']:7.1f} ms  p50 {lat['p50']:7.1f} ms  p95 {lat['p95']:7.1f} ms  "
+              f"forward {stats['forward_ms_mean']:7.1f} ms")
+    baseline = report['latency']['predict']['latency_ms']['mean']
+    for name in paths:
+        if name != 'predict':
+            print(f"  {name} speedup: x{baseline / report['latency'][name]['latency_ms']['mean']:.2f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if failed:
+        raise SystemExit("Parity check failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark /detect response serialization.
+Compares payload bytes and encode time for stdlib JSON, orjson and
+MessagePack, with the full payload and with the live-loop field selection.
+
+Usage:
+    python scripts/bench_serialization.py --image test_image.jpg --iterations 2000
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import feedback, serialization, utils  # noqa: E402
+
+# Fields the live loop in app.js actually renders
+LIVE_LOOP_FIELDS = "detections,feedback,annotated_jpeg_base64,inference_time_ms,quality_metrics"
+
+
+def build_payload(image_bgr: np.ndarray, full_feedback: bool, binary_image: bool) -> dict:
+    """Build a /detect-shaped payload with representative detections."""
+    h, w = image_bgr.shape[:2]
+    detections = [
+        {
+            'class_id': i,
+            'class_name': name,
+            'confidence': 0.9 - i * 0.15,
+            'bbox_xyxy': [w * 0.1 * (i + 1), h * 0.1, w * 0.1 * (i + 4), h * 0.5],
+            'green_ratio': 0.62,
+            'area_ratio': 0.12
+        }
+        for i, name in enumerate(['tomato_early_blight_leaf', 'tomato_leaf', 'corn_rust_leaf'])
+    ]
+    quality_metrics = utils.compute_image_quality_metrics(image_bgr)
+    feedback_result = feedback.generate_feedback(
+        detections, quality_metrics, w, h, compact=not full_feedback)
+    jpeg = utils.encode_image_to_jpeg(image_bgr, quality=85)
+
+    payload = {
+        'success': True,
+        'detections': detections,
+        'feedback': feedback_result,
+        'inference_time_ms': 42.0,
+        'quality_metrics': quality_metrics,
+        'filtering_stats': {'raw_count': 4, 'filtered_count': 3, 'removed_count': 1},
+        'model_name': 'best',
+        'timestamp': datetime.now().isoformat()
+    }
+    if binary_image:
+        payload['annotated_jpeg'] = jpeg
+    else:
+        payload['annotated_jpeg_base64'] = base64.b64encode(jpeg).decode('utf-8')
+    return payload
+
+
+def time_encoder(encode, payload: dict, iterations: int):
+    """Return (bytes, mean microseconds per encode)."""
+    data = encode(payload)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(payload)
+    elapsed = time.perf_counter() - start
+    return len(data), elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--image', help='Sample frame (default: synthetic 720x1280 frame)')
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.image:
+        image_bgr = cv2.imread(args.image)
+        if image_bgr is None:
+            parser.error(f"Cannot read image: {args.image}")
+    else:
+        image_bgr = np.random.randint(0, 255, (1280, 720, 3), dtype=np.uint8)
+        image_bgr = cv2.GaussianBlur(image_bgr, (15, 15), 0)
+
+    live_fields = serialization.parse_fields(LIVE_LOOP_FIELDS)
+    cases = []
+
+    def stdlib_json(p):
+        return json.dumps(p).encode('utf-8')
+
+    for label, full_feedback in (('full feedback', True), ('compact feedback', False)):
+        payload = build_payload(image_bgr, full_feedback, binary_image=False)
+        cases.append((f"stdlib json, {label}", stdlib_json, payload))
+        cases.append((f"fast json, {label}", serialization.encode_json, payload))
+        live = serialization.select_fields(payload, live_fields)
+        cases.append((f"fast json, {label}, live fields", serialization.encode_json, live))
+        no_image = serialization.select_fields(payload, live_fields - {'annotated_jpeg_base64'})
+        cases.append((f"fast json, {label}, no image", serialization.encode_json, no_image))
+
+        if serialization.msgpack is not None:
+            binary = build_payload(image_bgr, full_feedback, binary_image=True)
+            cases.append((f"msgpack, {label}", serialization.encode_msgpack, binary))
+            live_binary = serialization.select_fields(binary, live_fields | {'annotated_jpeg'})
+            cases.append((f"msgpack, {label}, live fields", serialization.encode_msgpack, live_binary))
+
+    print(f"JSON encoder: {'orjson' if serialization.orjson is not None else 'stdlib (orjson not installed)'}")
+    if serialization.msgpack is None:
+        print("msgpack not installed; skipping MessagePack cases")
+    print(f"{'case':<48} {'bytes':>10} {'us/encode':>10}")
+    for label, encode, payload in cases:
+        size, us = time_encoder(encode, payload, args.iterations)
+        print(f"{label:<48} {size:>10} {us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark frame upload overhead: multipart UploadFile vs raw image/jpeg
+body read into a pooled buffer (app.raw_upload).
+
+Both paths run as FastAPI endpoints called in-process through ASGI, with
+the body delivered in 64 KB chunks the way uvicorn does, so the numbers
+are the server's per-request cost without network or inference. Each
+endpoint reads the upload and (unless --no-decode) decodes it exactly
+like /detect. Reported per request:
+
+- time: mean and p50 wall time
+- peak: tracemalloc peak above baseline (body copies, multipart parser
+  and spooled file buffers, decoded image)
+
+Usage:
+    python scripts/bench_upload.py --frames samples/ --requests 500
+    python scripts/bench_upload.py --no-decode --json upload.json
+    # End to end against a server: compare loadtest.py with and without --raw
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import utils  # noqa: E402
+from app.raw_upload import RawBody, RawBodyPool  # noqa: E402
+from scripts.loadtest import encode_multipart, load_frames  # noqa: E402
+
+CHUNK_BYTES = 65536
+
+
+def build_app(decode: bool) -> FastAPI:
+    bench_app = FastAPI()
+    pool = RawBodyPool(10 * 2**20, 4)
+
+    async def raw_body(request: Request):
+        try:
+            body = await pool.read(request)
+        except OverflowError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        try:
+            yield body
+        finally:
+            pool.release(body)
+
+    @bench_app.post("/multipart")
+    async def multipart(file: UploadFile = File(...)):
+        image_bytes = await file.read()
+        if decode:
+            utils.decode_image_bytes(image_bytes)
+        return {'size': len(image_bytes)}
+
+    @bench_app.post("/raw")
+    async def raw(body: RawBody = Depends(raw_body)):
+        image_bytes = body.data
+        if decode:
+            utils.decode_image_bytes(image_bytes)
+        return {'size': len(image_bytes)}
+
+    return bench_app
+
+
+async def call(app: FastAPI, path: str, body: bytes, content_type: str) -> int:
+    """One POST through the ASGI interface; returns the status code."""
+    chunks = [body[i:i + CHUNK_BYTES] for i in range(0, len(body), CHUNK_BYTES)] or [b'']
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'bench'), (b'content-type', content_type.encode()),
+                    (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 1), 'server': ('bench', 80)
+    }
+    index = 0
+    status = {}
+
+    async def receive():
+        nonlocal index
+        if index < len(chunks):
+            index += 1
+            return {'type': 'http.request', 'body': chunks[index - 1], 'more_body': index < len(chunks)}
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    await app(scope, receive, send)
+    return status['code']
+
+
+def request_body(mode: str, frame: bytes):
+    if mode == 'raw':
+        return frame, 'image/jpeg'
+    return encode_multipart(frame)
+
+
+async def measure(app: FastAPI, mode: str, frames: List[bytes], requests: int) -> Dict:
+    bodies = [request_body(mode, frame) for frame in frames]
+    path = f"/{mode}"
+    for body, content_type in bodies:
+        if await call(app, path, body, content_type) != 200:
+            raise SystemExit(f"{mode} request failed")
+
+    times = []
+    for i in range(requests):
+        body, content_type = bodies[i % len(bodies)]
+        start = time.perf_counter()
+        await call(app, path, body, content_type)
+        times.append((time.perf_counter() - start) * 1e6)
+
+    # Allocations measured separately: tracing slows every allocation
+    peaks = []
+    tracemalloc.start()
+    for i in range(min(requests, 50)):
+        body, content_type = bodies[i % len(bodies)]
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await call(app, path, body, content_type)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        'mean_us': statistics.fmean(times),
+        'p50_us': statistics.median(times),
+        'peak_kb': statistics.fmean(peaks) / 1024
+    }
+
+
+def synthetic_frames() -> List[bytes]:
+    """Smooth 1280x720 gradients; compress like camera frames rather than noise."""
+    y, x = np.mgrid[0:720, 0:1280]
+    frames = []
+    for shift in range(4):
+        image = np.dstack([(x + shift * 40) % 256, (y + shift * 20) % 256, (x + y) % 256]).astype(np.uint8)
+        frames.append(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes())
+    return frames
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Multipart vs raw-body upload overhead per request")
+    parser.add_argument('--frames', help='Folder of sample frames (default: synthetic 1280x720 JPEGs)')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--no-decode', action='store_true', help='Measure reading the upload only')
+    parser.add_argument('--json', help='Write results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames()
+    app = build_app(decode=not args.no_decode)
+    results = {mode: asyncio.run(measure(app, mode, frames, args.requests)) for mode in ('multipart', 'raw')}
+
+    mean_kb = sum(len(frame) for frame in frames) / len(frames) / 1024
+    print(f"{len(frames)} frame(s), mean {mean_kb:.0f} KB, {args.requests} request(s) per mode, "
+          f"decode {'off' if args.no_decode else 'on'}")
+    print(f"{'mode':<10} {'mean us':>9} {'p50 us':>9} {'peak KB':>9}")
+    for mode, result in results.items():
+        print(f"{mode:<10} {result['mean_us']:9.0f} {result['p50_us']:9.0f} {result['peak_kb']:9.0f}")
+    saved = results['multipart']['mean_us'] - results['raw']['mean_us']
+    print(f"Raw body saves {saved:.0f} us and "
+          f"{results['multipart']['peak_kb'] - results['raw']['peak_kb']:.0f} KB peak per request")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'frame_kb': mean_kb, 'decode': not args.no_decode, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
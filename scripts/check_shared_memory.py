@@ -0,0 +1,164 @@
+"""
+Per-worker memory check for preload mode (MODEL_PRELOAD=1 with gunicorn --preload).
+
+Forks N workers the way gunicorn does and measures each worker's unique
+memory (USS: private pages, freed if the worker exits) and shared pages
+after it has served some inferences, in two setups:
+
+- preload: the model is loaded and warmed up in the parent through
+  app.preload, then workers fork and share its weights
+- separate: workers fork first and each loads its own copy (what
+  gunicorn without --preload, or uvicorn --workers, does)
+
+Exits non-zero if preloading doesn't cut per-worker unique memory by at
+least half the model's weight bytes, so it can gate changes to loading.
+The --master-pid mode reports the same numbers for a running gunicorn.
+
+Usage:
+    python scripts/check_shared_memory.py --frames samples/ --workers 4
+    python scripts/check_shared_memory.py --model models/best.pt --workers 2 --json shared.json
+    python scripts/check_shared_memory.py --master-pid $(pgrep -f "gunicorn: master")
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import preload, utils, yolo_infer  # noqa: E402
+from app.memory_diagnostics import memory_sharing  # noqa: E402
+from scripts.loadtest import load_frames  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MB = 2 ** 20
+
+
+def load_and_warmup(args):
+    yolo_infer.detector.load_model(args.model, optimize=not args.no_optimize)
+    yolo_infer.detector.warmup([args.imgsz], 2)
+
+
+def serve(images: List[np.ndarray], args) -> Dict:
+    """Worker body: run inferences, then report this process's memory."""
+    for i in range(args.requests):
+        yolo_infer.run_inference(images[i % len(images)], imgsz=args.imgsz)
+    return {
+        **memory_sharing(),
+        'model_bytes': yolo_infer.detector.list_models()[0]['memory_bytes']
+    }
+
+
+def run_workers(mode: str, images: List[np.ndarray], args) -> List[Dict]:
+    """Fork workers (after loading in preload mode) and collect their reports."""
+    if mode == 'preload':
+        preload.preload_model(lambda: load_and_warmup(args))
+    children = []
+    for _ in range(args.workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = 0
+            try:
+                if mode == 'preload':
+                    preload.after_fork()
+                else:
+                    load_and_warmup(args)
+                report = serve(images, args)
+            except Exception as e:
+                report = {'error': str(e)}
+                status = 1
+            with os.fdopen(write_fd, 'w') as f:
+                json.dump(report, f)
+            os._exit(status)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    reports = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd, 'r') as f:
+            reports.append(json.load(f))
+        os.waitpid(pid, 0)
+    return reports
+
+
+def summarize(reports: List[Dict]) -> Dict:
+    unique = [r['unique_bytes'] for r in reports]
+    return {
+        'workers': reports,
+        'unique_mb_mean': sum(unique) / len(unique) / MB,
+        'pss_mb_total': sum(r['pss_bytes'] for r in reports) / MB
+    }
+
+
+def inspect_master(master_pid: int):
+    """Print unique/shared memory of a running gunicorn master and its workers."""
+    try:
+        import psutil
+    except ImportError:
+        raise SystemExit("--master-pid needs psutil (pip install psutil)")
+    master = psutil.Process(master_pid)
+    print(f"{'pid':>8} {'role':<7} {'rss MB':>8} {'unique MB':>10} {'shared MB':>10} {'pss MB':>8}")
+    for role, proc in [('master', master)] + [('worker', child) for child in master.children()]:
+        info = memory_sharing(str(proc.pid))
+        print(f"{proc.pid:>8} {role:<7} {info['rss_bytes'] / MB:8.1f} {info['unique_bytes'] / MB:10.1f} "
+              f"{info['shared_bytes'] / MB:10.1f} {info['pss_bytes'] / MB:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker unique memory with and without model preloading")
+    parser.add_argument('--model', default=str(BASE_DIR / "models" / "best.pt"))
+    parser.add_argument('--frames', help='Folder of sample frames (default: synthetic frames)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=20, help='Inferences per worker before measuring')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--no-optimize', action='store_true', help='Load without the optimized CPU path')
+    parser.add_argument('--master-pid', type=int, help='Only inspect a running gunicorn master and its workers')
+    parser.add_argument('--json', help='Write report as JSON to this path')
+    args = parser.parse_args()
+
+    if args.master_pid:
+        inspect_master(args.master_pid)
+        return
+
+    if args.frames:
+        images = [utils.decode_image_bytes(frame) for frame in load_frames(args.frames)]
+    else:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(4)]
+
+    # Separate runs first: the preload run leaves the model in this process
+    report = {'workers': args.workers, 'requests': args.requests}
+    for mode in ('separate', 'preload'):
+        reports = run_workers(mode, images, args)
+        errors = [r['error'] for r in reports if 'error' in r]
+        if errors:
+            raise SystemExit(f"{mode} worker failed: {errors[0]}")
+        report[mode] = summarize(reports)
+
+    model_mb = report['preload']['workers'][0]['model_bytes'] / MB
+    saved = report['separate']['unique_mb_mean'] - report['preload']['unique_mb_mean']
+    report['model_mb'] = model_mb
+    report['unique_mb_saved_per_worker'] = saved
+
+    print(f"{args.workers} worker(s), {args.requests} inference(s) each, model weights {model_mb:.1f} MB")
+    print(f"{'mode':<9} {'unique MB/worker':>17} {'shared MB/worker':>17} {'PSS MB total':>13}")
+    for mode in ('separate', 'preload'):
+        workers = report[mode]['workers']
+        shared = sum(w['shared_bytes'] for w in workers) / len(workers) / MB
+        print(f"{mode:<9} {report[mode]['unique_mb_mean']:17.1f} {shared:17.1f} {report[mode]['pss_mb_total']:13.1f}")
+    print(f"Preload saves {saved:.1f} MB of unique memory per worker")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if saved < model_mb / 2:
+        raise SystemExit("Preloaded workers do not share the model weights")
+
+
+if __name__ == '__main__':
+    main()
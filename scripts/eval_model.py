@@ -0,0 +1,315 @@
+"""
+Offline accuracy and throughput evaluation for model weights.
+
+Runs YOLODetector over a YOLO-format labeled folder and reports, in one
+run:
+- per-class precision/recall at the serving confidence threshold and
+  AP@0.5 / AP@0.5:0.95 (from a low-confidence pass), with and without
+  the green/size filter, so the filter's effect is visible
+- filter rejection statistics: how many boxes each rule removed and how
+  many of them were true positives (IoU >= 0.5 with a label)
+- latency and frames per second of the serving configuration
+
+Folder layout: DATA/images + DATA/labels, or images and .txt labels side
+by side in DATA. Label class IDs must follow the model's class order.
+
+Usage:
+    python scripts/eval_model.py --data datasets/val --model models/best.pt --json eval_best.json
+    python scripts/eval_model.py --data datasets/val --model models/best_v2.pt --json eval_v2.json \\
+        --baseline eval_best.json
+    python scripts/eval_model.py --data datasets/val --min-green-ratio 0.1 --conf 0.3
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import utils, yolo_infer  # noqa: E402
+from scripts.loadtest import percentile  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# np.trapz was renamed in NumPy 2.0
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+
+def find_samples(data_dir: Path) -> List[Tuple[Path, Path]]:
+    """(image, label) path pairs; missing labels mean no objects."""
+    images_dir = data_dir / "images" if (data_dir / "images").is_dir() else data_dir
+    labels_dir = data_dir / "labels" if (data_dir / "labels").is_dir() else images_dir
+    images = sorted(p for p in images_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return [(p, labels_dir / f"{p.stem}.txt") for p in images]
+
+
+def load_labels(label_path: Path, width: int, height: int) -> np.ndarray:
+    """YOLO (class cx cy w h, normalized) to N x 5 array of class, x1, y1, x2, y2 in pixels."""
+    rows = []
+    if label_path.exists():
+        for line in label_path.read_text().splitlines():
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+            rows.append([cls, (cx - w / 2) * width, (cy - h / 2) * height,
+                         (cx + w / 2) * width, (cy + h / 2) * height])
+    return np.array(rows, dtype=float).reshape(-1, 5)
+
+
+def box_iou(box: List[float], boxes: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def match_detections(detections: List[Dict], labels: np.ndarray) -> np.ndarray:
+    """
+    Greedy matching by confidence, separately per IoU threshold.
+
+    Returns:
+        len(detections) x len(IOU_THRESHOLDS) boolean true-positive matrix
+    """
+    tp = np.zeros((len(detections), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(labels):
+        return tp
+    order = sorted(range(len(detections)), key=lambda i: -detections[i]['confidence'])
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        used = np.zeros(len(labels), dtype=bool)
+        for i in order:
+            det = detections[i]
+            ious = box_iou(det['bbox_xyxy'], labels[:, 1:])
+            ious[(labels[:, 0] != det['class_id']) | used] = 0
+            best = int(np.argmax(ious))
+            if ious[best] >= threshold:
+                used[best] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """Area under the interpolated precision-recall curve (101-point, COCO style)."""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    return float(_trapezoid(np.interp(x, mrec, mpre), x))
+
+
+def class_metrics(records: List[Tuple[float, np.ndarray]], n_labels: int, conf: float) -> Dict:
+    """
+    Precision/recall at conf and AP at each IoU threshold for one class.
+
+    Args:
+        records: (confidence, true-positive row) per detection of this class
+        n_labels: Labeled objects of this class
+        conf: Serving confidence threshold
+    """
+    if not records:
+        return {'labels': n_labels, 'detections': 0, 'true_positives': 0,
+                'precision': 0.0, 'recall': 0.0, 'ap50': 0.0, 'ap50_95': 0.0}
+    records = sorted(records, key=lambda r: -r[0])
+    confs = np.array([r[0] for r in records])
+    tp = np.array([r[1] for r in records])
+    tp_cum = np.cumsum(tp, axis=0)
+    fp_cum = np.cumsum(~tp, axis=0)
+    recall = tp_cum / max(n_labels, 1)
+    precision = tp_cum / (tp_cum + fp_cum)
+    aps = [average_precision(recall[:, t], precision[:, t]) for t in range(len(IOU_THRESHOLDS))]
+
+    served = confs >= conf
+    tp_served = int(tp[served, 0].sum())
+    return {
+        'labels': n_labels,
+        'detections': int(served.sum()),
+        'true_positives': tp_served,
+        'precision': tp_served / served.sum() if served.any() else 0.0,
+        'recall': tp_served / n_labels if n_labels else 0.0,
+        'ap50': aps[0],
+        'ap50_95': float(np.mean(aps))
+    }
+
+
+def summarize(records: Dict[int, List], label_counts: Dict[int, int], names: Dict, conf: float) -> Dict:
+    per_class = {
+        names.get(cls, str(cls)): class_metrics(records.get(cls, []), label_counts.get(cls, 0), conf)
+        for cls in sorted(set(records) | set(label_counts))
+    }
+    # mAP over classes that have labels, as the ultralytics validator
+    labeled = [m for m in per_class.values() if m['labels']]
+    total_tp = sum(m['true_positives'] for m in per_class.values())
+    total_dets = sum(m['detections'] for m in per_class.values())
+    total_labels = sum(m['labels'] for m in labeled)
+    return {
+        'map50': float(np.mean([m['ap50'] for m in labeled])) if labeled else 0.0,
+        'map50_95': float(np.mean([m['ap50_95'] for m in labeled])) if labeled else 0.0,
+        'precision': total_tp / total_dets if total_dets else 0.0,
+        'recall': total_tp / total_labels if total_labels else 0.0,
+        'per_class': per_class
+    }
+
+
+def evaluate(args, samples, detector) -> Dict:
+    """Low-confidence pass: accuracy with/without filter and rejection stats."""
+    names = detector.get_class_names()
+    filtered_records, raw_records = {}, {}
+    label_counts = {}
+    rejections = {'total': 0, 'green': 0, 'area': 0, 'true_positive': 0, 'false_positive': 0, 'per_class': {}}
+
+    for image_path, label_path in samples:
+        image_bgr = utils.decode_image_bytes(image_path.read_bytes())
+        height, width = image_bgr.shape[:2]
+        labels = load_labels(label_path, width, height)
+        for cls in labels[:, 0].astype(int):
+            label_counts[cls] = label_counts.get(cls, 0) + 1
+
+        result = detector.run_inference(
+            image_bgr, conf_threshold=args.map_conf, imgsz=args.imgsz,
+            enable_filtering=not args.no_filter, min_green_ratio=args.min_green_ratio,
+            min_area_ratio=args.min_area_ratio, max_area_ratio=args.max_area_ratio, annotate=False)
+        raw = result['raw_detections']
+        kept = {id(d) for d in result['detections']}
+        raw_tp = match_detections(raw, labels)
+        filtered = [d for d in raw if id(d) in kept]
+        filtered_tp = match_detections(filtered, labels)
+
+        for det, row in zip(raw, raw_tp):
+            raw_records.setdefault(det['class_id'], []).append((det['confidence'], row))
+        for det, row in zip(filtered, filtered_tp):
+            filtered_records.setdefault(det['class_id'], []).append((det['confidence'], row))
+
+        # Rejections among boxes that would have been served
+        for det, row in zip(raw, raw_tp):
+            if id(det) in kept or det['confidence'] < args.conf:
+                continue
+            rejections['total'] += 1
+            green = detector.calculate_green_ratio(image_bgr, det['bbox_xyxy'])
+            area = detector.calculate_box_area_ratio(det['bbox_xyxy'], (height, width))
+            if green < args.min_green_ratio:
+                rejections['green'] += 1
+            if not args.min_area_ratio <= area <= args.max_area_ratio:
+                rejections['area'] += 1
+            rejections['true_positive' if row[0] else 'false_positive'] += 1
+            class_name = names.get(det['class_id'], str(det['class_id']))
+            per_class = rejections['per_class'].setdefault(class_name, {'total': 0, 'true_positive': 0})
+            per_class['total'] += 1
+            per_class['true_positive'] += int(row[0])
+
+    return {
+        'filtered': summarize(filtered_records, label_counts, names, args.conf),
+        'unfiltered': summarize(raw_records, label_counts, names, args.conf),
+        'filter_rejections': rejections
+    }
+
+
+def measure_latency(args, samples, detector) -> Dict:
+    """Serving configuration timing: decode + inference + filtering per image."""
+    latencies, inference = [], []
+    for i in range(args.latency_runs):
+        image_path = samples[i % len(samples)][0]
+        data = image_path.read_bytes()
+        start = time.perf_counter()
+        image_bgr = utils.decode_image_bytes(data)
+        result = detector.run_inference(
+            image_bgr, conf_threshold=args.conf, imgsz=args.imgsz,
+            enable_filtering=not args.no_filter, min_green_ratio=args.min_green_ratio,
+            min_area_ratio=args.min_area_ratio, max_area_ratio=args.max_area_ratio, annotate=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        inference.append(result['inference_time_ms'])
+    mean = sum(latencies) / len(latencies)
+    return {
+        'runs': len(latencies),
+        'fps': 1000 / mean if mean else 0.0,
+        'latency_ms': {'mean': mean, 'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95)},
+        'inference_ms_mean': sum(inference) / len(inference)
+    }
+
+
+def print_report(report: Dict, baseline: Optional[Dict]):
+    filtered, unfiltered = report['filtered'], report['unfiltered']
+    print(f"\n{'class':<32} {'labels':>6} {'dets':>5} {'P':>6} {'R':>6} {'AP50':>6} {'AP50-95':>8}")
+    for name, m in filtered['per_class'].items():
+        print(f"{name[:32]:<32} {m['labels']:6d} {m['detections']:5d} {m['precision']:6.3f} "
+              f"{m['recall']:6.3f} {m['ap50']:6.3f} {m['ap50_95']:8.3f}")
+    for label, summary in (('all (filtered)', filtered), ('all (no filter)', unfiltered)):
+        print(f"{label:<32} {'':>6} {'':>5} {summary['precision']:6.3f} {summary['recall']:6.3f} "
+              f"{summary['map50']:6.3f} {summary['map50_95']:8.3f}")
+
+    rej = report['filter_rejections']
+    print(f"\nFilter removed {rej['total']} served box(es): green {rej['green']}, size {rej['area']}; "
+          f"{rej['true_positive']} true positive(s), {rej['false_positive']} false positive(s)")
+    lat = report['latency']
+    print(f"Latency: {lat['fps']:.2f} fps, mean {lat['latency_ms']['mean']:.1f} ms, "
+          f"p95 {lat['latency_ms']['p95']:.1f} ms (inference {lat['inference_ms_mean']:.1f} ms)")
+
+    if baseline:
+        print(f"\nVs baseline {baseline['model']}:")
+        for label, new, old in (
+            ('mAP50', filtered['map50'], baseline['filtered']['map50']),
+            ('mAP50-95', filtered['map50_95'], baseline['filtered']['map50_95']),
+            ('precision', filtered['precision'], baseline['filtered']['precision']),
+            ('recall', filtered['recall'], baseline['filtered']['recall']),
+            ('fps', lat['fps'], baseline['latency']['fps'])
+        ):
+            print(f"  {label:<10} {old:8.3f} -> {new:8.3f}  ({new - old:+.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate accuracy, filter effect and speed on a labeled folder")
+    parser.add_argument('--data', required=True, help='YOLO-format folder (images/ + labels/)')
+    parser.add_argument('--model', default=str(BASE_DIR / "models" / "best.pt"))
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.35, help='Serving confidence threshold')
+    parser.add_argument('--map-conf', type=float, default=0.001, help='Confidence floor for the AP pass')
+    parser.add_argument('--min-green-ratio', type=float, default=0.15)
+    parser.add_argument('--min-area-ratio', type=float, default=0.001)
+    parser.add_argument('--max-area-ratio', type=float, default=0.95)
+    parser.add_argument('--no-filter', action='store_true', help='Serve without green/size filtering')
+    parser.add_argument('--no-optimize', action='store_true', help='Use model.predict() instead of the optimized path')
+    parser.add_argument('--latency-runs', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=0, help='Use at most this many images')
+    parser.add_argument('--json', help='Write report as JSON to this path')
+    parser.add_argument('--baseline', help='Earlier --json report to compare against')
+    args = parser.parse_args()
+
+    samples = find_samples(Path(args.data))
+    if args.limit:
+        samples = samples[:args.limit]
+    if not samples:
+        raise SystemExit(f"No images found in {args.data}")
+
+    detector = yolo_infer.get_detector()
+    detector.load_model(args.model, conf_threshold=args.conf, optimize=not args.no_optimize)
+    detector.warmup([args.imgsz], 2)
+
+    print(f"Evaluating {Path(args.model).name} on {len(samples)} image(s)")
+    report = {
+        'model': Path(args.model).name,
+        'images': len(samples),
+        'settings': {
+            'imgsz': args.imgsz, 'conf': args.conf, 'map_conf': args.map_conf,
+            'filtering': not args.no_filter, 'min_green_ratio': args.min_green_ratio,
+            'min_area_ratio': args.min_area_ratio, 'max_area_ratio': args.max_area_ratio
+        },
+        **evaluate(args, samples, detector),
+        'latency': measure_latency(args, samples, detector)
+    }
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_report(report, baseline)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Export captures as a YOLO dataset archive (ZIP or tar) for retraining
+with yolov8_plantvillage_training.ipynb.
+
+The archive is written capture by capture to a file or stdout, so memory
+stays flat for any number of captures. Same output as GET /admin/export.
+
+Usage:
+    python scripts/export_dataset.py -o dataset.zip
+    python scripts/export_dataset.py -o dataset.tar --start 2024-05-01 --max-side 640 --quality 90
+    python scripts/export_dataset.py --format tar --class-name "Tomato Late blight" -o - | ssh host "tar x -C data/"
+"""
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.dataset_export import FORMATS, DatasetExporter, select_captures  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def model_class_names(model_path: str) -> dict:
+    from ultralytics import YOLO
+    return YOLO(model_path).names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export captures as a YOLO dataset archive")
+    parser.add_argument('-o', '--output', required=True, help='Archive path, or - for stdout')
+    parser.add_argument('--format', choices=FORMATS, help='Archive format (default: from the output extension, else zip)')
+    parser.add_argument('--captures-dir', default=str(BASE_DIR / "captures"))
+    parser.add_argument('--start', type=date.fromisoformat, help='First capture day, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, help='Last capture day, YYYY-MM-DD')
+    parser.add_argument('--class-name', action='append', help='Only captures with this class (repeatable)')
+    parser.add_argument('--min-confidence', type=float, default=0.0, help='Drop detections below this confidence')
+    parser.add_argument('--no-empty', action='store_true', help='Skip captures without detections')
+    parser.add_argument('--limit', type=int, default=0, help='Maximum number of captures (0: all)')
+    parser.add_argument('--max-side', type=int, default=0, help='Downscale to this longer side (0: original size)')
+    parser.add_argument('--quality', type=int, default=0, help='Re-encode as JPEG at this quality (0: stored file)')
+    parser.add_argument('--val-fraction', type=float, default=0.1)
+    parser.add_argument('--model', help='Take class names for data.yaml from this model')
+    args = parser.parse_args()
+
+    captures_dir = Path(args.captures_dir)
+    if not captures_dir.is_dir():
+        raise SystemExit(f"Not a directory: {captures_dir}")
+    fmt = args.format or ('tar' if args.output.endswith('.tar') else 'zip')
+
+    try:
+        exporter = DatasetExporter(
+            captures_dir, fmt=fmt, max_side=args.max_side, quality=args.quality,
+            val_fraction=args.val_fraction,
+            class_names=model_class_names(args.model) if args.model else None
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    captures = select_captures(
+        captures_dir, args.start, args.end,
+        set(args.class_name) if args.class_name else None,
+        args.min_confidence, not args.no_empty, args.limit
+    )
+
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in exporter.stream(captures):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    stats = exporter.stats
+    print(f"Exported {stats['captures']} capture(s), {stats['labels']} label(s), "
+          f"{stats['bytes'] / 2**20:.1f} MB; skipped {stats['skipped']} unreadable", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
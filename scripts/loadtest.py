@@ -0,0 +1,320 @@
+"""
+Load generator that simulates many camera clients against /detect.
+
+Each simulated client replays frames from a folder. In "poll" mode it
+follows the app.js live loop: send a frame, wait for the response, sleep
+for the cadence, repeat. In "stream" mode it pushes frames at a fixed rate
+without waiting for responses (up to --max-inflight per client), the way
+a streaming source would.
+
+The script can start a local uvicorn instance with the real model or a
+stub detector, and samples server CPU and RSS while the test runs.
+
+Usage:
+    # 20 phones at the app.js cadence against a stub server
+    python scripts/loadtest.py --frames samples/ --clients 20 --cadence-ms 500 --server stub
+
+    # Real model, fast cadence, fail if p99 > 800 ms
+    python scripts/loadtest.py --frames samples/ --clients 8 --cadence-ms 200 --server real --slo-ms 800
+
+    # Existing server
+    python scripts/loadtest.py --frames samples/ --url http://192.168.1.100:8000 --server-pid 12345
+"""
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+def load_frames(frames_dir: str) -> List[bytes]:
+    """Read all sample frames into memory so disk I/O isn't measured."""
+    paths = sorted(p for p in Path(frames_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise SystemExit(f"No .jpg/.png frames found in {frames_dir}")
+    return [p.read_bytes() for p in paths]
+
+
+def encode_multipart(frame: bytes) -> Tuple[bytes, str]:
+    """Build a multipart body equivalent to app.js FormData('file', blob)."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="file"; filename="frame.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+    ).encode('utf-8') + frame + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Stats:
+    """Thread-safe collection of per-request outcomes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies_ms = []
+        self.status_counts = {}
+        self.errors = 0
+
+    def record(self, status: Optional[int], latency_ms: float):
+        with self.lock:
+            if status is None:
+                self.errors += 1
+                return
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status == 200:
+                self.latencies_ms.append(latency_ms)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def send_frame(conn: http.client.HTTPConnection, path: str, frame: bytes, raw: bool,
+               client_id: Optional[str] = None):
+    """POST one frame and return the status code."""
+    if raw:
+        body, content_type = frame, 'image/jpeg'
+    else:
+        body, content_type = encode_multipart(frame)
+    headers = {'Content-Type': content_type}
+    if client_id:
+        # Every simulated client comes from 127.0.0.1; keep their admission state apart
+        headers['X-Client-Id'] = client_id
+    conn.request('POST', path, body=body, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def poll_client(client_id: int, args, frames: List[bytes], stats: Stats, stop: threading.Event):
+    """Closed loop matching app.js: send, wait for response, sleep cadence."""
+    url = urlsplit(args.url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=args.timeout)
+    i = client_id
+    while not stop.is_set():
+        frame = frames[i % len(frames)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status = send_frame(conn, args.path, frame, args.raw, f'loadtest-{client_id}')
+        except (OSError, http.client.HTTPException):
+            status = None
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=args.timeout)
+        stats.record(status, (time.perf_counter() - start) * 1000)
+        stop.wait(args.cadence_ms / 1000)
+    conn.close()
+
+
+def stream_client(client_id: int, args, frames: List[bytes], stats: Stats, stop: threading.Event):
+    """Open loop: push a frame every cadence regardless of pending responses."""
+    inflight = threading.Semaphore(args.max_inflight)
+    workers = []
+
+    def _one(frame):
+        url = urlsplit(args.url)
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=args.timeout)
+        start = time.perf_counter()
+        try:
+            status = send_frame(conn, args.path, frame, args.raw, f'loadtest-{client_id}')
+        except (OSError, http.client.HTTPException):
+            status = None
+        finally:
+            conn.close()
+            inflight.release()
+        stats.record(status, (time.perf_counter() - start) * 1000)
+
+    i = client_id
+    next_send = time.perf_counter()
+    while not stop.is_set():
+        if inflight.acquire(blocking=False):
+            t = threading.Thread(target=_one, args=(frames[i % len(frames)],), daemon=True)
+            t.start()
+            workers.append(t)
+        else:
+            # Source produced a frame the client couldn't send: count as dropped
+            stats.record(0, 0.0)
+        i += 1
+        next_send += args.cadence_ms / 1000
+        stop.wait(max(0.0, next_send - time.perf_counter()))
+    for t in workers:
+        t.join(args.timeout)
+
+
+def sample_server(pid: int, interval: float, samples: List[Dict], stop: threading.Event):
+    """Record server (and worker children) CPU percent and RSS."""
+    proc = psutil.Process(pid)
+    procs = {}
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            current = [proc] + proc.children(recursive=True)
+        except psutil.NoSuchProcess:
+            break
+        cpu = 0.0
+        rss = 0
+        for p in current:
+            try:
+                tracked = procs.setdefault(p.pid, p)
+                cpu += tracked.cpu_percent(None)
+                rss += tracked.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+        samples.append({'t_s': round(time.perf_counter() - start, 2), 'cpu_percent': cpu, 'rss_mb': rss / 2**20})
+        stop.wait(interval)
+
+
+def start_server(kind: str, port: int, workers: int) -> subprocess.Popen:
+    """Start uvicorn with the stub or real app and wait for /ready."""
+    target = 'scripts.loadtest_stub_app:app' if kind == 'stub' else 'app.main:app'
+    cmd = [sys.executable, '-m', 'uvicorn', target, '--host', '127.0.0.1',
+           '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    server = subprocess.Popen(cmd, cwd=str(BASE_DIR))
+
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/ready')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise SystemExit("Server did not become ready within 300 s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate camera clients against /detect")
+    parser.add_argument('--frames', required=True, help='Folder of sample .jpg/.png frames')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=60, help='Test length in seconds')
+    parser.add_argument('--cadence-ms', type=float, default=500,
+                        help='Delay between frames (app.js uses 500, or 200 on fast links)')
+    parser.add_argument('--mode', choices=['poll', 'stream'], default='poll')
+    parser.add_argument('--max-inflight', type=int, default=2, help='Stream mode: pending frames per client')
+    parser.add_argument('--path', default='/detect', help='Endpoint path, including query string')
+    parser.add_argument('--raw', action='store_true', help='Send raw image/jpeg bodies instead of multipart')
+    parser.add_argument('--url', default=None, help='Existing server (default: start one)')
+    parser.add_argument('--server', choices=['stub', 'real'], default='stub',
+                        help='Server to start when --url is not given')
+    parser.add_argument('--server-workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--server-pid', type=int, help='PID to sample when using --url')
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--slo-ms', type=float, help='Exit non-zero if p99 latency exceeds this')
+    parser.add_argument('--json', help='Write full report as JSON to this path')
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    server = None
+    server_pid = args.server_pid
+    if args.url is None:
+        server = start_server(args.server, args.port, args.server_workers)
+        args.url = f'http://127.0.0.1:{args.port}'
+        server_pid = server.pid
+
+    stats = Stats()
+    stop = threading.Event()
+    samples = []
+    sampler = None
+    if server_pid and psutil is not None:
+        sampler = threading.Thread(target=sample_server, args=(server_pid, args.sample_interval, samples, stop))
+        sampler.start()
+    elif server_pid:
+        print("psutil not installed; server CPU/RSS will not be sampled")
+
+    client_fn = poll_client if args.mode == 'poll' else stream_client
+    threads = [
+        threading.Thread(target=client_fn, args=(i, args, frames, stats, stop), daemon=True)
+        for i in range(args.clients)
+    ]
+    print(f"Running {args.clients} {args.mode} client(s) at {args.cadence_ms:.0f} ms cadence "
+          f"for {args.duration:.0f} s against {args.url}{args.path}")
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    try:
+        time.sleep(args.duration)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(args.timeout)
+        elapsed = time.perf_counter() - start
+        if sampler:
+            sampler.join()
+        if server:
+            server.terminate()
+            server.wait(10)
+
+    dropped = stats.status_counts.pop(0, 0)
+    total = sum(stats.status_counts.values()) + stats.errors
+    ok = stats.status_counts.get(200, 0)
+    throttled = stats.status_counts.get(429, 0)
+    lat = stats.latencies_ms
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'frames': len(frames),
+        'elapsed_s': elapsed,
+        'requests': total,
+        'throughput_rps': ok / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': sum(lat) / len(lat) if lat else 0.0,
+            'p50': percentile(lat, 50),
+            'p90': percentile(lat, 90),
+            'p95': percentile(lat, 95),
+            'p99': percentile(lat, 99),
+            'max': max(lat, default=0.0)
+        },
+        'status_counts': stats.status_counts,
+        'error_rate': (total - ok - throttled) / total if total else 0.0,
+        'throttle_rate': throttled / total if total else 0.0,
+        'client_dropped_frames': dropped,
+        'server_samples': samples
+    }
+
+    print(f"\nRequests: {total}  OK: {ok}  429: {throttled}  errors: {total - ok - throttled}"
+          f"  dropped (client-side): {dropped}")
+    print(f"Throughput: {report['throughput_rps']:.2f} frames/s")
+    print("Latency ms: " + "  ".join(f"{k}={v:.1f}" for k, v in report['latency_ms'].items()))
+    print(f"Error rate: {report['error_rate']:.2%}  429 rate: {report['throttle_rate']:.2%}")
+    if samples:
+        cpu = [s['cpu_percent'] for s in samples]
+        rss = [s['rss_mb'] for s in samples]
+        print(f"Server CPU %: mean={sum(cpu) / len(cpu):.0f} max={max(cpu):.0f}  "
+              f"RSS MB: start={rss[0]:.0f} max={max(rss):.0f} end={rss[-1]:.0f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.json}")
+
+    if args.slo_ms is not None and report['latency_ms']['p99'] > args.slo_ms:
+        print(f"FAIL: p99 {report['latency_ms']['p99']:.1f} ms exceeds SLO {args.slo_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+ASGI app for load tests: the real app.main with a stub detector.
+The stub sleeps for a fixed inference time and returns no boxes, so the
+HTTP, decoding, feedback and encoding path is measured without weights.
+
+Usage:
+    STUB_INFERENCE_MS=40 python -m uvicorn scripts.loadtest_stub_app:app --port 8001
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import main, yolo_infer  # noqa: E402
+
+STUB_INFERENCE_MS = float(os.environ.get("STUB_INFERENCE_MS", "40"))
+
+
+class _StubResult:
+    boxes = None
+
+    def __init__(self, inference_ms: float):
+        self.speed = {'preprocess': 0.0, 'inference': inference_ms, 'postprocess': 0.0}
+
+
+class StubModel:
+    """Stand-in for ultralytics.YOLO with a fixed inference delay."""
+
+    names = {0: 'tomato_leaf'}
+
+    def predict(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        time.sleep(STUB_INFERENCE_MS / 1000 * len(frames))
+        return [_StubResult(STUB_INFERENCE_MS) for _ in frames]
+
+
+def _install_stub():
+    detector = yolo_infer.detector
+    with detector._lock:
+        detector._models['stub'] = {
+            'name': 'stub',
+            'path': '<stub>',
+            'model': StubModel(),
+            'conf_threshold': 0.35,
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'file_bytes': 0,
+            'memory_bytes': 0,
+            'warm': True
+        }
+    detector.activate_model('stub')
+    print(f"Stub detector installed ({STUB_INFERENCE_MS:.0f} ms per frame)")
+
+
+# Replace weight loading at startup with the stub
+main._load_and_warmup = _install_stub
+app = main.app
@@ -0,0 +1,80 @@
+"""
+Remove redundant annotated images from capture directories.
+Annotated images are now rendered on demand from the original and the
+detection JSON, so stored *_detected.jpg files can be deleted whenever
+both of those exist.
+
+Usage:
+    python scripts/migrate_captures.py                  # dry run on captures/
+    python scripts/migrate_captures.py --apply
+    python scripts/migrate_captures.py --captures-dir /data/captures --apply
+"""
+import argparse
+import json
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ANNOTATED_SUFFIX = "_detected.jpg"
+
+
+def migrate(captures_dir: Path, apply: bool) -> dict:
+    """
+    Delete annotated images that can be re-rendered.
+
+    Args:
+        captures_dir: Capture directory to migrate
+        apply: Actually delete files (otherwise only report)
+
+    Returns:
+        Summary with counts and reclaimed bytes
+    """
+    summary = {'removable': 0, 'kept': 0, 'bytes': 0}
+
+    for annotated in sorted(captures_dir.glob(f"capture_*{ANNOTATED_SUFFIX}")):
+        capture_id = annotated.name[:-len(ANNOTATED_SUFFIX)]
+        data = captures_dir / f"{capture_id}_data.json"
+
+        # Only delete if the image can be rebuilt from original + detections;
+        # retention may have replaced the original with a recompressed file
+        try:
+            capture_data = json.loads(data.read_text())
+            original = captures_dir / capture_data.get('original_image', f"{capture_id}_original.jpg")
+            renderable = original.exists() and 'detections' in capture_data
+        except (OSError, ValueError):
+            renderable = False
+
+        if not renderable:
+            summary['kept'] += 1
+            print(f"keep   {annotated.name} (missing original or detection data)")
+            continue
+
+        size = annotated.stat().st_size
+        summary['removable'] += 1
+        summary['bytes'] += size
+        if apply:
+            annotated.unlink()
+        print(f"{'delete' if apply else 'would delete'} {annotated.name} ({size / 1024:.0f} KB)")
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove redundant annotated capture images")
+    parser.add_argument('--captures-dir', default=str(BASE_DIR / "captures"))
+    parser.add_argument('--apply', action='store_true', help='Delete files (default is a dry run)')
+    args = parser.parse_args()
+
+    captures_dir = Path(args.captures_dir)
+    if not captures_dir.is_dir():
+        raise SystemExit(f"Not a directory: {captures_dir}")
+
+    summary = migrate(captures_dir, args.apply)
+    action = "Reclaimed" if args.apply else "Would reclaim"
+    print(f"\n{action} {summary['bytes'] / 2**20:.1f} MB from {summary['removable']} file(s); "
+          f"kept {summary['kept']}")
+    if not args.apply and summary['removable']:
+        print("Run again with --apply to delete")
+
+
+if __name__ == '__main__':
+    main()
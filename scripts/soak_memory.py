@@ -0,0 +1,180 @@
+"""
+Memory soak test for /detect.
+
+Starts a server with MEMORY_DIAGNOSTICS=1 (or uses --url), warms it up,
+resets the diagnostics baseline, then sends N requests while recording
+server RSS and traced Python memory from /admin/memory. Exits non-zero if
+memory after the run grew beyond the tolerance, so it can gate CI or a
+release.
+
+Usage:
+    # 5000 requests against a stub server, fail on >32 MB RSS growth
+    python scripts/soak_memory.py --frames samples/ --requests 5000
+
+    # Real model, 20000 requests, 4 concurrent clients
+    python scripts/soak_memory.py --frames samples/ --server real --requests 20000 --concurrency 4
+
+    # Existing server started with MEMORY_DIAGNOSTICS=1 and ADMIN_TOKEN
+    python scripts/soak_memory.py --frames samples/ --url http://127.0.0.1:8000 --admin-token secret
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.loadtest import load_frames, send_frame, start_server  # noqa: E402
+
+
+def admin_request(url: str, method: str, path: str, token: str) -> dict:
+    """Call an admin endpoint and return its JSON body."""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+    headers = {'X-Admin-Token': token} if token else {}
+    conn.request(method, path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    if response.status != 200:
+        raise SystemExit(f"{method} {path} returned {response.status}: {body[:200]!r}")
+    return json.loads(body)
+
+
+def send_requests(args, frames, count: int, errors: list):
+    """Send count frames split across --concurrency closed-loop clients."""
+    parts = urlsplit(args.url)
+    counter = iter(range(count))
+    lock = threading.Lock()
+
+    def _client(client_id: str):
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            try:
+                status = send_frame(conn, args.path, frames[i % len(frames)], raw=False, client_id=client_id)
+            except (OSError, http.client.HTTPException) as e:
+                status = str(e)
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+            if status != 200:
+                errors.append(status)
+        conn.close()
+
+    threads = [
+        threading.Thread(target=_client, args=(f'soak-{n}',), daemon=True)
+        for n in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if /detect memory grows over many requests")
+    parser.add_argument('--frames', required=True, help='Folder of sample .jpg/.png frames')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=200, help='Requests before the baseline')
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--checkpoints', type=int, default=10, help='Memory readings during the run')
+    parser.add_argument('--path', default='/detect')
+    parser.add_argument('--tolerance-mb', type=float, default=32,
+                        help='Allowed RSS growth after warmup')
+    parser.add_argument('--traced-tolerance-mb', type=float, default=8,
+                        help='Allowed growth of live Python allocations (tracemalloc)')
+    parser.add_argument('--url', default=None, help='Existing server (default: start one)')
+    parser.add_argument('--server', choices=['stub', 'real'], default='stub')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--admin-token', default=os.environ.get('ADMIN_TOKEN'))
+    parser.add_argument('--json', help='Write report as JSON to this path')
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    server = None
+    if args.url is None:
+        os.environ['MEMORY_DIAGNOSTICS'] = '1'
+        # Closed-loop clients send back to back; don't let admission control throttle them
+        os.environ.setdefault('ADMISSION_RATE_FPS', '1000')
+        os.environ.setdefault('ADMISSION_BURST', '1000')
+        server = start_server(args.server, args.port, 1)
+        args.url = f'http://127.0.0.1:{args.port}'
+
+    try:
+        admin_request(args.url, 'POST', '/admin/memory/enable', args.admin_token)
+        errors = []
+        print(f"Warmup: {args.warmup} request(s)")
+        send_requests(args, frames, args.warmup, errors)
+        admin_request(args.url, 'POST', '/admin/memory/reset', args.admin_token)
+
+        checkpoints = []
+        per_checkpoint = max(1, args.requests // args.checkpoints)
+        sent = 0
+        start = time.perf_counter()
+        while sent < args.requests:
+            batch = min(per_checkpoint, args.requests - sent)
+            send_requests(args, frames, batch, errors)
+            sent += batch
+            report = admin_request(args.url, 'GET', '/admin/memory?snapshots=0', args.admin_token)
+            checkpoints.append({
+                'requests': sent,
+                'rss_mb': report['current']['rss_bytes'] / 2**20,
+                'rss_growth_mb': report['rss_growth_bytes'] / 2**20,
+                'traced_growth_mb': report['traced_growth_bytes'] / 2**20,
+                'request_peak_p95_mb': report['requests']['peak_bytes_p95'] / 2**20
+            })
+            c = checkpoints[-1]
+            print(f"{sent:>7} req  rss {c['rss_mb']:.1f} MB  growth {c['rss_growth_mb']:+.1f} MB  "
+                  f"traced {c['traced_growth_mb']:+.2f} MB  peak/req p95 {c['request_peak_p95_mb']:.1f} MB")
+        elapsed = time.perf_counter() - start
+
+        final = admin_request(args.url, 'GET', '/admin/memory?top=10&snapshots=0', args.admin_token)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(10)
+
+    rss_growth = final['rss_growth_bytes'] / 2**20
+    traced_growth = final['traced_growth_bytes'] / 2**20
+    failures = []
+    if rss_growth > args.tolerance_mb:
+        failures.append(f"RSS grew {rss_growth:.1f} MB (> {args.tolerance_mb} MB)")
+    if traced_growth > args.traced_tolerance_mb:
+        failures.append(f"traced memory grew {traced_growth:.1f} MB (> {args.traced_tolerance_mb} MB)")
+    if errors:
+        failures.append(f"{len(errors)} request(s) failed")
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('json', 'admin_token')},
+        'elapsed_s': elapsed,
+        'rss_growth_mb': rss_growth,
+        'traced_growth_mb': traced_growth,
+        'checkpoints': checkpoints,
+        'stages': final['stages'],
+        'top_allocations': final.get('top_allocations', []),
+        'failures': failures
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    print(f"\n{args.requests} request(s) in {elapsed:.0f} s: RSS {rss_growth:+.1f} MB, "
+          f"traced {traced_growth:+.2f} MB")
+    if failures:
+        print("Largest live allocation sites:")
+        for site in report['top_allocations']:
+            print(f"  {site['size_bytes'] / 2**20:8.2f} MB  {site['location']}")
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == '__main__':
+    main()